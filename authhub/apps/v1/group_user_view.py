@@ -11,7 +11,8 @@
 from rest_framework import viewsets
 from commutils.log import log as logging
 from authhub.common.misc import json_response, get_request_data,\
-    check_needed_params, func_action_name
+    check_needed_params, func_action_name, get_pagination_params,\
+    paged_json_response
 from authhub.resources.group import group_user_list, group_user_add,\
     group_user_delete
 from authhub.policy.policy_tools import policy_protected
@@ -27,14 +28,17 @@ class GroupUserViewSet(viewsets.ViewSet):
         '''list users of existing group
         :param METHOD: GET
         :param URLPATH: /v1/groups/{group_id}/users/
+        :param QUERY: limit=PAGE_SIZE&marker=MARKER, newest first, marker
+            of next page is in X-Next-Marker header unless it is last page
         :return groups's user list:
             ::
 
                 [{'id': '22', 'username': 'user1'}, ...]
 
         '''
-        result = group_user_list(group_pk)
-        return json_response(result)
+        limit, marker = get_pagination_params(request)
+        result, next_marker = group_user_list(group_pk, limit, marker)
+        return paged_json_response(result, next_marker)
 
     @policy_protected
     @func_action_name("group_user_add")
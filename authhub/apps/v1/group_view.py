@@ -11,9 +11,10 @@
 from rest_framework import viewsets
 from commutils.log import log as logging
 from authhub.common.misc import json_response, get_request_data,\
-    func_action_name
+    func_action_name, get_pagination_params, paged_json_response,\
+    is_stream_request, streaming_json_response, get_fields_param
 from authhub.resources.group import group_create, group_list,\
-    group_delete, get_group_by_id, group_update
+    group_list_stream, group_delete, get_group_by_id, group_update
 from authhub.policy.policy_tools import policy_protected
 
 LOG = logging.getLogger(__name__)
@@ -27,6 +28,11 @@ class GroupViewSet(viewsets.ViewSet):
         '''list of all existing groups
         :param METHOD: GET
         :param URLPATH: /v1/groups/
+        :param QUERY: limit=PAGE_SIZE&marker=MARKER, newest first, marker
+            of next page is in X-Next-Marker header unless it is last page
+        :param QUERY: stream=true, all selected results without paging, they
+            are read and sent in chunks
+        :param QUERY: fields=FIELD,FIELD..., fields of groups to return
 
         :returns list:
             ::
@@ -47,8 +53,13 @@ class GroupViewSet(viewsets.ViewSet):
 
         '''
         reqparams = get_request_data(request)
-        result = group_list(reqparams)
-        return json_response(result)
+        fields = get_fields_param(request)
+        if is_stream_request(request):
+            return streaming_json_response(
+                group_list_stream(reqparams, fields))
+        limit, marker = get_pagination_params(request)
+        result, next_marker = group_list(reqparams, limit, marker, fields)
+        return paged_json_response(result, next_marker)
 
     @policy_protected
     @func_action_name("group_create")
@@ -84,6 +95,7 @@ class GroupViewSet(viewsets.ViewSet):
         '''get group details
         :param METHOD: GET
         :param URLPATH: /v1/groups/{group_id}/
+        :param QUERY: fields=FIELD,FIELD..., fields to return
         :returns:
             ::
 
@@ -99,7 +111,8 @@ class GroupViewSet(viewsets.ViewSet):
 
         '''
         group_id = pk
-        result = get_group_by_id(group_id)
+        result = get_group_by_id(group_id, get_fields_param(request),
+                                 use_slave=True)
         return json_response(result)
 
     @policy_protected
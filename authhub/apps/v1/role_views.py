@@ -11,9 +11,10 @@
 from rest_framework import viewsets
 from commutils.log import log as logging
 from authhub.common.misc import json_response, get_request_data,\
-    func_action_name
+    func_action_name, get_pagination_params, paged_json_response,\
+    is_stream_request, streaming_json_response, get_fields_param
 from authhub.resources.role import role_create, role_list,\
-    role_delete, get_role_by_id, role_update
+    role_list_stream, role_delete, get_role_by_id, role_update
 from authhub.policy.policy_tools import policy_protected
 
 LOG = logging.getLogger(__name__)
@@ -27,6 +28,11 @@ class RoleViewSet(viewsets.ViewSet):
         '''list of all existing roles
         :param METHOD: GET
         :param URLPATH: /v1/roles/
+        :param QUERY: limit=PAGE_SIZE&marker=MARKER, newest first, marker
+            of next page is in X-Next-Marker header unless it is last page
+        :param QUERY: stream=true, all selected results without paging, they
+            are read and sent in chunks
+        :param QUERY: fields=FIELD,FIELD..., fields of roles to return
 
         :returns list:
             ::
@@ -47,8 +53,13 @@ class RoleViewSet(viewsets.ViewSet):
 
         '''
         reqparams = get_request_data(request)
-        result = role_list(reqparams)
-        return json_response(result)
+        fields = get_fields_param(request)
+        if is_stream_request(request):
+            return streaming_json_response(
+                role_list_stream(reqparams, fields))
+        limit, marker = get_pagination_params(request)
+        result, next_marker = role_list(reqparams, limit, marker, fields)
+        return paged_json_response(result, next_marker)
 
     @policy_protected
     @func_action_name("role_create")
@@ -83,6 +94,7 @@ class RoleViewSet(viewsets.ViewSet):
         '''get role details
         :param METHOD: GET
         :param URLPATH: /v1/roles/{role_id}/
+        :param QUERY: fields=FIELD,FIELD..., fields to return
         :returns:
             ::
 
@@ -96,7 +108,8 @@ class RoleViewSet(viewsets.ViewSet):
 
         '''
         role_id = pk
-        result = get_role_by_id(role_id)
+        result = get_role_by_id(role_id, get_fields_param(request),
+                                use_slave=True)
         return json_response(result)
 
     @policy_protected
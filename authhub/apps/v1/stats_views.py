@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+from rest_framework import viewsets
+from commutils.log import log as logging
+from commutils.utils import metrics
+from authhub.common.misc import json_response, func_action_name
+from authhub.policy.policy_tools import policy_protected
+
+LOG = logging.getLogger(__name__)
+
+
+class StatsViewSet(viewsets.ViewSet):
+
+    @policy_protected
+    @func_action_name("stats_list")
+    def list(self, request):
+        '''runtime statistics of current authhub process
+        :param METHOD: GET
+        :param URLPATH: /v1/stats/
+        :return dict:
+            ::
+
+                {
+                    "token.renew": COUNT,
+                    "token.renew_skipped": COUNT,
+                    ......
+                }
+
+        '''
+        return json_response(metrics.get_stats())
@@ -11,18 +11,24 @@
 
 from commutils.log import log as logging
 from authhub.common.misc import json_response, get_request_data,\
-    check_needed_params, func_action_name
+    check_needed_params, func_action_name, get_request_source_ip
 from rest_framework import viewsets
-from authhub.resources.token import token_create, token_check, token_revoke
-from authhub.resources.user import get_user_by_username, user_password_validate,\
-    user_role_list
-from authhub.common.exception import ActionPermissionDenied, DBEntryNotExist,\
-    IncorrectUserOrPasswd, InternalServerFailure
+from rest_framework.decorators import list_route
+from authhub.resources.token import token_create, token_check, token_revoke,\
+    token_check_multi
+from authhub.resources.user import user_authenticate
+from authhub.common.exception import InternalServerFailure,\
+    InvalidRequestFormat
 from authhub.policy.policy_tools import policy_protected
 LOG = logging.getLogger(__name__)
 
+# max number of tokens can be validated in one request
+MAX_VALIDATE_TOKENS = 1000
+
 
 class TokenViewSet(viewsets.ViewSet):
+    # signed token is in format "<payload>.<signature>"
+    lookup_value_regex = '[^/]+'
 
     @policy_protected
     @func_action_name("token_create")
@@ -50,32 +56,17 @@ class TokenViewSet(viewsets.ViewSet):
         # 1) check all needed parameters are provided
         request_params = get_request_data(request)
         check_needed_params(request_params, ['username', 'password'])    
-        # 2) check user exists
-        try:
-            api_reply = get_user_by_username(request_params['username'])
-        except DBEntryNotExist:
-            raise IncorrectUserOrPasswd()
-        # 3) check user status
-        if api_reply['status'] != 'ACTIVE':
-            raise ActionPermissionDenied('user has been disabled')
-        # 4) check password correct
-        user_password_validate(api_reply['id'], request_params['password'])
-        # 5) create token and save token,user_info to memcache
-        user_roles = [ r['name'] for r in user_role_list(api_reply['id'])]
-        user_info = {
-            "id": api_reply['id'],
-            "username": api_reply['username'],
-            "type": api_reply['type'],
-            "role": user_roles,
-            "email": api_reply['email'],
-            "description": api_reply['description'],
-        }
-        
+        # 2) check user exists, is active and password is correct, user
+        #    and roles are read with one query
+        user_info = user_authenticate(request_params['username'],
+                                      request_params['password'],
+                                      get_request_source_ip(request))
+        # 3) create token and save token,user_info to memcache
         token_id = token_create(user_info)
         if not token_id:
             raise InternalServerFailure("Failed to create token for user <%s>"
                                         % user_info['id'])
-        # 6) return token_id and user_id
+        # 4) return token_id and user_id
         result = {'token_id': token_id, 'user_id': user_info['id']}
         return json_response(result)
 
@@ -119,3 +110,46 @@ class TokenViewSet(viewsets.ViewSet):
             raise InternalServerFailure(message=("Failed to delete token %s" % token_id))
 
         return json_response(None)
+
+    @policy_protected
+    @func_action_name("token_validate")
+    @list_route(methods=['post'])
+    def validate(self, request):
+        '''check a batch of tokens in one request
+        :param METHOD: POST
+        :param URLPATH: /v1/tokens/validate/
+        :param dict:
+            ::
+
+                {
+                    'token_ids': [TOKEN_ID, TOKEN_ID, ...]
+                }
+
+        :return: user info of each token, null if token has expired
+            ::
+
+                {
+                    TOKEN_ID: {
+                        "id": USER_ID,
+                        "username": USER_NAME,
+                        "type": USER_TYPE,
+                        "role": USER_ROLES_LIST,
+                        "email": USER_EMAIL,
+                        "description": USER_DESCRIPTION,
+                    },
+                    TOKEN_ID: null,
+                    ......
+                }
+
+        '''
+        request_params = get_request_data(request)
+        check_needed_params(request_params, ['token_ids'])
+        token_ids = request_params['token_ids']
+        if not isinstance(token_ids, list) or \
+                not all(isinstance(t, basestring) for t in token_ids):
+            raise InvalidRequestFormat('token_ids must be a list of token id')
+        if len(token_ids) > MAX_VALIDATE_TOKENS:
+            raise InvalidRequestFormat('at most %s tokens can be validated '
+                                       'in one request' % MAX_VALIDATE_TOKENS)
+        result = token_check_multi(token_ids)
+        return json_response(result)
@@ -21,6 +21,7 @@ from authhub.apps.v1.token_views import TokenViewSet
 from authhub.apps.v1.user_views import UserViewSet
 from authhub.apps.v1.user_role_views import UserRoleViewSet
 from authhub.apps.v1.role_views import RoleViewSet
+from authhub.apps.v1.stats_views import StatsViewSet
 from rest_framework_nested import routers as NestedRouters
 from django.conf.urls import patterns, include, url
 
@@ -29,6 +30,7 @@ router.register(r'tokens', TokenViewSet, 'token')
 router.register(r'users', UserViewSet, 'user')
 router.register(r'groups', GroupViewSet, 'group')
 router.register(r'roles', RoleViewSet, 'role')
+router.register(r'stats', StatsViewSet, 'stats')
 
 #register nested routers roles for user
 user_role_router = NestedRouters.NestedSimpleRouter(router, r'users', lookup='user')
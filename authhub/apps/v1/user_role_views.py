@@ -33,7 +33,7 @@ class UserRoleViewSet(viewsets.ViewSet):
                 ['role1', 'role2', ...]
 
         '''
-        result = user_role_list(user_pk)
+        result = user_role_list(user_pk, use_slave=True)
         return json_response(result)
 
     @policy_protected
@@ -10,12 +10,18 @@
 
 from rest_framework import viewsets
 from commutils.log import log as logging
-from rest_framework.decorators import detail_route
+from rest_framework.decorators import detail_route, list_route
 from authhub.common.misc import json_response, get_request_data,\
-    func_action_name
-from authhub.resources.user import user_create, user_list,\
+    func_action_name, check_needed_params, get_pagination_params,\
+    paged_json_response, is_stream_request, streaming_json_response,\
+    get_fields_param
+from authhub.resources.user_import import user_import, IMPORT_FORMAT_CSV,\
+    IMPORT_FORMAT_JSONL
+from commutils.conf.gconf import get_user_import_conf
+from authhub.resources.user import user_create, user_list, user_list_stream,\
     user_delete, user_basic_update, user_password_update, \
-    get_user_by_id
+    get_user_by_id, user_status_update
+from authhub.resources.token import user_token_list
 from authhub.policy.policy_tools import policy_protected
 
 LOG = logging.getLogger(__name__)
@@ -29,6 +35,11 @@ class UserViewSet(viewsets.ViewSet):
         '''list of all existing users
         :param METHOD: GET
         :param URLPATH: /v1/users/
+        :param QUERY: limit=PAGE_SIZE&marker=MARKER, newest first, marker
+            of next page is in X-Next-Marker header unless it is last page
+        :param QUERY: stream=true, all selected results without paging, they
+            are read and sent in chunks
+        :param QUERY: fields=FIELD,FIELD..., fields of users to return
         :return list:
             ::
 
@@ -52,8 +63,13 @@ class UserViewSet(viewsets.ViewSet):
 
         '''
         reqparams = get_request_data(request)
-        result = user_list(reqparams)
-        return json_response(result)
+        fields = get_fields_param(request)
+        if is_stream_request(request):
+            return streaming_json_response(
+                user_list_stream(reqparams, fields))
+        limit, marker = get_pagination_params(request)
+        result, next_marker = user_list(reqparams, limit, marker, fields)
+        return paged_json_response(result, next_marker)
 
     @policy_protected
     @func_action_name("user_create")
@@ -98,12 +114,59 @@ class UserViewSet(viewsets.ViewSet):
 
         return json_response(result)
 
+    @policy_protected
+    @func_action_name("user_import")
+    @list_route(methods=['post'], url_path='import')
+    def import_users(self, request):
+        '''create users in bulk from request body, which is JSON lines or
+        CSV with a header when content type is text/csv
+        :param METHOD: POST
+        :param URLPATH: /v1/users/import/
+        :param body:
+            ::
+
+                {"username": USER_NAME, "password": PASSWORD, "type": USER_TYPE}
+                {"username": USER_NAME, "password": PASSWORD, "type": USER_TYPE,
+                 "email": USER_EMAIL, "description": USER_DESCRIPTION}
+                ......
+
+        :return: result of each row, a failed row does not abort others
+            ::
+
+                {
+                    "created": CREATED_COUNT,
+                    "failed": FAILED_COUNT,
+                    "results": [
+                        {"line": LINE_NO, "username": USER_NAME,
+                         "id": USER_ID},
+                        {"line": LINE_NO, "username": USER_NAME,
+                         "error_code": ERROR_CODE, "error": ERROR_MESSAGE},
+                        ......
+                    ]
+                }
+
+        '''
+        fmt = IMPORT_FORMAT_CSV \
+            if request.content_type.startswith('text/csv') \
+            else IMPORT_FORMAT_JSONL
+        # stream is None when body is empty
+        results = list(user_import(request.stream or [], fmt,
+                                   get_user_import_conf()['max_api_rows']))
+        failed = len([r for r in results if 'error' in r])
+        result = {
+            'created': len(results) - failed,
+            'failed': failed,
+            'results': results,
+        }
+        return json_response(result)
+
     @policy_protected
     @func_action_name("user_detail")
     def retrieve(self, request, pk=None):
         '''get user details
         :param METHOD: GET
         :param URLPATH: /v1/users/{user_id}/
+        :param QUERY: fields=FIELD,FIELD..., fields to return
 
         :return:
             ::
@@ -124,7 +187,8 @@ class UserViewSet(viewsets.ViewSet):
 
         '''
         user_id = pk
-        result = get_user_by_id(user_id)
+        result = get_user_by_id(user_id, get_fields_param(request),
+                                use_slave=True)
         return json_response(result)
 
     @policy_protected
@@ -186,6 +250,59 @@ class UserViewSet(viewsets.ViewSet):
         result = user_password_update(user_id, reqparams.get('password'))
         return json_response(result)
 
+    @policy_protected
+    @func_action_name("user_status_update")
+    @detail_route(methods=['put'])
+    def status(self, request, pk=None):
+        '''enable or disable user, all tokens of user are revoked when
+        user is disabled
+        :param METHOD: PUT
+        :param URLPATH: /v1/users/{user_id}/status/
+        :param dict:
+            ::
+
+                {
+                    'status': ACTIVE or DISABLED
+                }
+
+        :return:
+            ::
+
+                {
+                    "id": USER_ID,
+                    "username": USER_NAME,
+                    "updated_at": USER_UPDATE_TIME
+                }
+
+        '''
+        reqparams = get_request_data(request)
+        check_needed_params(reqparams, ['status'])
+        result = user_status_update(pk, reqparams['status'])
+        return json_response(result)
+
+    @policy_protected
+    @func_action_name("user_session_list")
+    @detail_route(methods=['get'])
+    def sessions(self, request, pk=None):
+        '''list active sessions(tokens) of user
+        :param METHOD: GET
+        :param URLPATH: /v1/users/{user_id}/sessions/
+        :return list:
+            ::
+
+                [
+                    {
+                        "session_id": SESSION_ID,
+                        "created_at": SESSION_CREATE_TIMESTAMP,
+                        "expires_at": SESSION_EXPIRE_TIMESTAMP
+                    },
+                    ......
+                ]
+
+        '''
+        result = user_token_list(pk)
+        return json_response(result)
+
     @policy_protected
     @func_action_name("user_delete")
     def destroy(self, request, pk=None):
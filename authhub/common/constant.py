@@ -22,3 +22,6 @@ RESOURCE_USER_ROLE = "user_role"
 USER_TYPE_SUPERVISOR = 'supervisor'
 USER_TYPE_P2P = 'p2p'
 USER_TYPE_BANK = 'bank'
+
+USER_STATUS_ACTIVE = 'ACTIVE'
+USER_STATUS_DISABLED = 'DISABLED'
@@ -10,6 +10,7 @@
 from commutils.exception import ZenException
 from authhub.common.misc import json_response
 from authhub.common.error_code import INTERNAL_SERVER_FAILURE
+from authhub.db.api import reset_read_your_writes
 
 '''
     writing customized django middle ware here
@@ -29,6 +30,9 @@ class AuthHubMiddleware(object):
                 session expired
                 return None if session info exists
         '''
+        # request threads are reused, reads of a new request may go to
+        # replicas until it writes
+        reset_read_your_writes()
         return None
 
     def process_reponse(self, request, response):
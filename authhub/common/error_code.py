@@ -20,3 +20,5 @@ USER_TOKEN_EXPIRED = 1006
 USER_OR_PASSWD_INCORRECT = 1007
 ACTION_PERMISSION_DENIED = 1008
 PASSWD_TOO_WEAK = 1009
+PASSWD_HASH_BUSY = 1010
+LOGIN_LOCKED = 1011
@@ -82,3 +82,17 @@ class DBReferenceFailure(ZenException):
     '''
     msg_fmt = u"db reference error met"
     error_code = ErrCode.DB_REFERENCE_FAILURE
+
+
+class PasswdHashBusy(ZenException):
+    '''too many password hash requests are waiting for hash processes
+    '''
+    msg_fmt = u"server is busy with password requests, please retry later"
+    error_code = ErrCode.PASSWD_HASH_BUSY
+
+
+class LoginLocked(ZenException):
+    '''too many failed logins of the user or from the source address
+    '''
+    msg_fmt = u"too many failed logins, please retry in %(retry_after)s seconds"
+    error_code = ErrCode.LOGIN_LOCKED
@@ -12,8 +12,9 @@
 from django.conf import settings
 from commutils.log import log as logging
 from commutils.utils import jsonutils
-from django.http.response import HttpResponse
+from django.http.response import HttpResponse, StreamingHttpResponse
 from authhub.common.exception import InvalidRequestFormat
+from commutils.conf.gconf import get_pagination_conf, get_login_throttle_conf
 
 LOG = logging.getLogger(__name__)
 
@@ -55,6 +56,91 @@ def json_response(result, retcode=0):
     return httpresponse
 
 
+def streaming_json_response(items):
+    '''translate an iterator of api results into a json list as retbody of
+    a StreamingHttpResponse, items are serialized and sent
+    pagination.stream_chunk_size at a time, so memory does not grow with
+    their count. first item is read before response starts, so errors of
+    query are returned as usual
+    :param items: iterator of api results
+    :return: StreamingHttpResponse in Json format
+    '''
+    items = iter(items)
+    try:
+        first = next(items)
+    except StopIteration:
+        return json_response([])
+    chunk_size = get_pagination_conf()['stream_chunk_size']
+
+    def generate():
+        # same envelope as build_reply
+        yield '{"retcode": 0, "retbody": [' + jsonutils.dumps(first)
+        chunk = []
+        for item in items:
+            chunk.append(jsonutils.dumps(item))
+            if len(chunk) >= chunk_size:
+                yield ', ' + ', '.join(chunk)
+                chunk = []
+        if chunk:
+            yield ', ' + ', '.join(chunk)
+        yield ']}'
+
+    httpresponse = StreamingHttpResponse(generate(),
+                                         content_type="application/json")
+    if settings.DEBUG:
+        httpresponse['Cache-Control'] = 'no-cache'
+    httpresponse["Server"] = "authhub"
+    return httpresponse
+
+
+def get_fields_param(httprequest):
+    '''get fields to return from fields= of query string, like
+    fields=id,status
+    :return: list of field names, None if fields are not given
+    '''
+    fields = httprequest.query_params.get('fields')
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(',') if f.strip()] or None
+
+
+def is_stream_request(httprequest):
+    '''whether list request asks for all results streamed instead of a page
+    '''
+    return httprequest.query_params.get('stream', '').lower() in \
+        ('1', 'true', 'yes')
+
+
+def paged_json_response(result, next_marker):
+    '''json_response of a page of list, marker of next page is returned in
+    X-Next-Marker header, which is missing on last page
+    '''
+    httpresponse = json_response(result)
+    if next_marker:
+        httpresponse['X-Next-Marker'] = next_marker
+    return httpresponse
+
+
+def get_pagination_params(httprequest):
+    '''get limit and marker from query string of list request
+    :return: (page size, marker or None)
+    '''
+    conf = get_pagination_conf()
+    limit = httprequest.query_params.get('limit')
+    if limit is None:
+        limit = conf['default_limit']
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            raise InvalidRequestFormat('limit must be a positive integer')
+    limit = min(limit, conf['max_limit'])
+    marker = httprequest.query_params.get('marker') or None
+    return limit, marker
+
+
 def purify_request_params(request_params, valid_params):
     '''choose valid param options from request_params
     :param request_params dict: api request parameters
@@ -90,3 +176,24 @@ def get_request_headers(httprequest):
         "token_id": authhub_token
     }
     return headers
+
+
+def get_request_source_ip(httprequest):
+    ''' get address of the client sending httprequest. when the peer is
+        one of login_throttle.trusted_proxies, like the load balancer,
+        X-Forwarded-For is read from right to left and the first address
+        which is not a trusted proxy is the client. the header is ignored
+        for other peers, since clients can forge it
+        @param : Django HttpRequest Object
+    '''
+    peer = httprequest.META.get('REMOTE_ADDR')
+    trusted = get_login_throttle_conf()['trusted_proxies']
+    if peer not in trusted:
+        return peer
+    forwarded = httprequest.META.get('HTTP_X_FORWARDED_FOR', '')
+    addrs = [a.strip() for a in forwarded.split(',') if a.strip()]
+    for addr in reversed(addrs):
+        if addr not in trusted:
+            return addr
+    # every hop is a trusted proxy, the first one is nearest to client
+    return addrs[0] if addrs else peer
@@ -10,10 +10,13 @@
 #
 
 import datetime
+import threading
 from commutils.log import log as logging
 from commutils.cache import mcmodel
+from commutils.cache import mem_model
 from authhub.db import api as db_api
-from commutils.conf.gconf import get_memcahce_conf
+from commutils.conf.gconf import get_memcahce_conf, get_memcache_options,\
+    get_redis_conf, get_memstore_conf, get_token_conf
 from authhub.policy.policy import ZenPolicy
 LOG = logging.getLogger(__name__)
 
@@ -61,7 +64,41 @@ class Context(ContextBase):
         super(Context, self).__init__(*args, **kwargs)
         self._session = None
         self.policyChecker = ZenPolicy()
-        self.memclient = mcmodel.McModel(get_memcahce_conf())
+        self._memclient = None
+        self._memclient_lock = threading.Lock()
+        self._codecs = {}
+
+    @property
+    def memclient(self):
+        '''cache model tokens are stored in, selected by token.store and
+        created on first use
+        '''
+        if self._memclient is None:
+            with self._memclient_lock:
+                if self._memclient is None:
+                    memclient = self._token_store()
+                    for prefix, codec in self._codecs.items():
+                        memclient.register_codec(prefix, codec)
+                    self._memclient = memclient
+        return self._memclient
+
+    def register_codec(self, prefix, codec):
+        '''register value codec of prefix without creating memclient
+        '''
+        with self._memclient_lock:
+            self._codecs[prefix] = codec
+            if self._memclient is not None:
+                self._memclient.register_codec(prefix, codec)
+
+    def _token_store(self):
+        store = get_token_conf()['store']
+        if store == 'redis':
+            # redis is an optional dependency, only needed by this backend
+            from commutils.cache import redis_model
+            return redis_model.RedisModel(get_redis_conf())
+        if store == 'memory':
+            return mem_model.MemModel(get_memstore_conf())
+        return mcmodel.McModel(get_memcahce_conf(), get_memcache_options())
 
     @property
     def session(self):
@@ -9,8 +9,14 @@
 #
 #
 
+import base64
 import copy
+import datetime
+import itertools
 import threading
+from sqlalchemy import and_, bindparam, event, text
+from sqlalchemy import DateTime
+from sqlalchemy.ext import baked
 from sqlalchemy.orm import joinedload
 
 from oslo_db.sqlalchemy import utils as sqlalchemyutils
@@ -18,19 +24,28 @@ from oslo_db.sqlalchemy import utils as sqlalchemyutils
 from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import session as db_session
 from authhub.db.models.authmodel import Users, Roles, UserRole, Groups, GroupUser
+from authhub.db.pool_metrics import instrument_pool
 from commutils.log import log as logging
-from commutils.conf.gconf import get_pg_conf
+from commutils.conf.gconf import get_pg_conf, get_pagination_conf
+from commutils.utils import metrics
+from commutils.utils import jsonutils
 from authhub.common.exception import DBReferenceFailure, DBEntryAleadyExist,\
-    DBEntryNotExist
+    DBEntryNotExist, InvalidRequestFormat
 from authhub.common.constant import RESOURCE_USER, RESOURCE_ROLE,\
     RESOURCE_USER_ROLE, RESOURCE_GROUP, RESOURCE_GROUP_USER
 from authhub.db.query_filter import process_sort_params, exact_query_filter,\
     logic_query_filter, regex_query_filter, regex_or_query_filter,\
-    read_deleted_filter
+    read_deleted_filter, keyset_query_filter, FilterSpec
 
 
 _ENGINE_FACADE = None
+_REPLICA_FACADES = None
 _LOCK = threading.Lock()
+# replica of next read
+_replica_counter = itertools.count()
+_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+# per thread state of read-your-writes
+_db_local = threading.local()
 
 LOG = logging.getLogger(__name__)
 
@@ -44,32 +59,56 @@ RES_MODEL_MAP = {
     RESOURCE_USER_ROLE: UserRole
 }
 
-def _create_facade(conf):
-    '''create database facade
+# keys of keyset pagination, newest first, the last one breaks ties of
+# created_at, each has an index on deleted followed by them
+PAGE_SORT_KEYS = {
+    RESOURCE_USER: ['created_at', 'id'],
+    RESOURCE_GROUP: ['created_at', 'id'],
+    RESOURCE_ROLE: ['created_at', 'id'],
+    RESOURCE_GROUP_USER: ['created_at', 'user_id']
+}
+_MARKER_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+# cache of built and compiled queries, only bind parameters vary per call
+_bakery = baked.bakery()
+
+def _sql_connection(host, port):
+    return 'postgresql://%s:%s@%s:%s/%s' % (db_config['db_user'],
+                                           db_config['db_passwd'],
+                                           host, port,
+                                           db_config['db_name'])
+
+
+def _create_facade(conf, host=None, port=None, pool_name='db.pool'):
+    '''create database facade, pool size, overflow, checkout timeout and
+    connection recycle time are taken from postgres section of config
+    @param host, port: database server, primary one if not given
     '''
 
-    sql_connection = 'postgresql://%s:%s@%s:%s/%s' % (db_config['db_user'],
-                                                      db_config['db_passwd'],
-                                                      db_config['db_host'],
-                                                      db_config['db_port'],
-                                                      db_config['db_name'])
-    return db_session.EngineFacade(
+    sql_connection = _sql_connection(host or db_config['db_host'],
+                                     port or db_config['db_port'])
+    # connections are pinged when they are checked out, connections idle
+    # longer than connection_recycle_time are reopened instead, since
+    # firewalls and pgbouncer drop them silently
+    facade = db_session.EngineFacade(
         sql_connection=sql_connection,
-        slave_connection=db_config['db_slave_connection'],
+        slave_connection=None,
         #sqlite_fk=db_config['db_sqlite_fk'],
         #autocommit=db_config['db_autocommit'],
         #expire_on_commit=db_config['db_expire_on_commit'],
         #mysql_sql_mode=db_config['db_mysql_sql_mode'],
-        #idle_timeout=db_config['db_idle_timeout'],
+        connection_recycle_time=db_config['db_idle_timeout'],
         #connection_debug=db_config['db_connection_debug'],
-        #max_pool_size=conf.max_pool_size,
-        #max_overflow=conf.max_overflow,
-        #pool_timeout=conf.pool_timeout,
+        max_pool_size=db_config['db_max_pool_size'],
+        max_overflow=db_config['db_max_overflow'],
+        pool_timeout=db_config['db_pool_timeout'],
         #sqlite_synchronous=conf.sqlite_synchronous,
         #connection_trace=conf.connection_trace,
-        #max_retries=conf.max_retries,
-        #retry_interval=db_config['db_retry_interval']
+        max_retries=db_config['db_max_retries'],
+        retry_interval=db_config['db_retry_interval']
         )
+    instrument_pool(facade.get_engine(), pool_name)
+    return facade
 
 
 def _create_facade_lazily():
@@ -77,17 +116,61 @@ def _create_facade_lazily():
     if _ENGINE_FACADE is None:
         with _LOCK:
             if _ENGINE_FACADE is None:
-                _ENGINE_FACADE = _create_facade(db_config)
+                facade = _create_facade(db_config)
+                event.listen(facade.get_engine(), 'before_cursor_execute',
+                             _record_write)
+                _ENGINE_FACADE = facade
     return _ENGINE_FACADE
 
 
+def _replica_facades_lazily():
+    '''
+        @return: list of facades of replicas, empty if there is no replica
+    '''
+    global _REPLICA_FACADES
+    if _REPLICA_FACADES is None:
+        with _LOCK:
+            if _REPLICA_FACADES is None:
+                _REPLICA_FACADES = [
+                    _create_facade(db_config, host, port,
+                                   'db.replica.%s.pool' % host)
+                    for host, port in db_config['db_replicas']]
+    return _REPLICA_FACADES
+
+
+def _record_write(conn, cursor, statement, parameters, context,
+                  executemany):
+    # remember this thread has written, so its later reads see the writes
+    if statement.lstrip()[:6].upper() in _WRITE_STATEMENTS:
+        _db_local.wrote = True
+
+
+def reset_read_your_writes():
+    '''forget writes of current thread, called when a request starts, so
+    reads of the request may go to replicas until it writes
+    '''
+    _db_local.wrote = False
+
+
 def get_engine():
     facade = _create_facade_lazily()
     return facade.get_engine()
 
 
-def get_session(autocommit=True, expire_on_commit=False):
-    facade = _create_facade_lazily()
+def get_session(autocommit=True, expire_on_commit=False, use_slave=False):
+    '''
+        @param use_slave: read from replicas in round robin if there are
+                          replicas and current thread has not written in
+                          this request, otherwise from primary
+    '''
+    facade = None
+    if use_slave and not getattr(_db_local, 'wrote', False):
+        replicas = _replica_facades_lazily()
+        if replicas:
+            facade = replicas[next(_replica_counter) % len(replicas)]
+            metrics.incr('db.replica_reads')
+    if facade is None:
+        facade = _create_facade_lazily()
     return facade.get_session(autocommit=autocommit,
                               expire_on_commit=expire_on_commit)
 
@@ -147,7 +230,15 @@ def get_by_all_filters(resource,
                        read_deleted = None,
                        regex_or_match_filter_names=[],
                        only_check_count=False,
-                       distinct_column=None):
+                       distinct_column=None,
+                       columns=None,
+                       filter_spec=None):
+    '''
+        @param columns: names of columns to select, rows are returned as
+                        named tuples of them instead of model objects
+        @param filter_spec: FilterSpec of filters, it replaces the match
+                            filter names and rejects unknown filters
+    '''
 
     query_prefix = get_queryobj_by_all_filters(resource,
                                                filters,
@@ -162,7 +253,9 @@ def get_by_all_filters(resource,
                                                use_slave,
                                                read_deleted,
                                                regex_or_match_filter_names,
-                                               distinct_column)
+                                               distinct_column,
+                                               columns,
+                                               filter_spec)
     if only_check_count:
         return query_prefix.count()
     else:
@@ -182,35 +275,79 @@ def get_queryobj_by_all_filters(resource,
                                 use_slave=False,
                                 read_deleted = None,
                                 regex_or_match_filter_names=[],
-                                distinct_column=None):
+                                distinct_column=None,
+                                columns=None,
+                                filter_spec=None):
 
     dbmodel = RES_MODEL_MAP[resource]
-    # Filter empty parameter
-    for search_key in copy.deepcopy(filters):
-        if not filters[search_key] and filters[search_key] != 0:
-            del filters[search_key]
     # If the limit is 0 there is no point in even going
     # to the database since nothing is going to be returned anyway.
     if limit == 0:
         return []
 
-    # Make a copy of the filters dictionary to use going forward, as we'll
-    # be modifying it and we shouldn't affect the caller's use of it.
-    filters = filters.copy()
+    if read_deleted is None:
+        read_deleted = 'no'
+    if filter_spec is not None:
+        # filters are checked and their clauses built before any query
+        filter_clauses = filter_spec.clauses(filters, read_deleted)
+    else:
+        # Filter empty parameter
+        for search_key in copy.deepcopy(filters):
+            if not filters[search_key] and filters[search_key] != 0:
+                del filters[search_key]
+
+        # Make a copy of the filters dictionary to use going forward, as
+        # we'll be modifying it and we shouldn't affect the caller's use
+        # of it.
+        filters = filters.copy()
 
     sort_keys, sort_dirs = process_sort_params(sort_keys,
                                                       sort_dirs,
                                                       default_dir='desc')
     
-    session = get_session()
+    session = get_session(use_slave=use_slave)
+    # selecting only needed columns skips loading and tracking model objects
+    if columns:
+        entities = [getattr(dbmodel, column) for column in columns]
+    else:
+        entities = [dbmodel]
     # SELECT DISTINCT [COLUMN] FROM [TABLE] WHERE [COLOMN] = [VALUE]
     if distinct_column:
-        query_prefix = session.query(dbmodel).distinct(distinct_column).order_by(distinct_column)
+        query_prefix = session.query(*entities).distinct(distinct_column).order_by(distinct_column)
     else:
-        query_prefix = session.query(dbmodel)
+        query_prefix = session.query(*entities)
     for column in columns_to_join:
         query_prefix = query_prefix.options(joinedload(column))
 
+    if filter_spec is not None:
+        query_prefix = query_prefix.filter(*filter_clauses)
+    else:
+        query_prefix = _match_filters(dbmodel, query_prefix, filters,
+                                      exact_match_filter_names,
+                                      logic_match_filter_names,
+                                      regex_or_match_filter_names,
+                                      read_deleted)
+
+    # marker is a dict of sort key values of last row of previous page
+    if marker is not None:
+        query_prefix = keyset_query_filter(dbmodel, query_prefix,
+                                           sort_keys, sort_dirs, marker)
+
+    try:
+        query_prefix = sqlalchemyutils.paginate_query(query_prefix,
+                               dbmodel, limit,
+                               sort_keys,
+                               sort_dirs=sort_dirs)
+    except db_exc.InvalidSortKey, e:
+        LOG.exception(e)
+        raise Exception.InvalidSortKey()
+
+    return query_prefix
+
+
+def _match_filters(dbmodel, query_prefix, filters, exact_match_filter_names,
+                   logic_match_filter_names, regex_or_match_filter_names,
+                   read_deleted):
     # exact the query
     query_prefix = exact_query_filter(dbmodel, query_prefix,
                                 filters, exact_match_filter_names)
@@ -227,9 +364,6 @@ def get_queryobj_by_all_filters(resource,
 
 
     # whether read deleted value or not
-    if read_deleted is None:
-        read_deleted = 'no'
-
     deleted_filters = {}
     if 'no' == read_deleted:
         deleted_filters['deleted'] = False
@@ -241,20 +375,102 @@ def get_queryobj_by_all_filters(resource,
         raise ValueError("Unrecognized read_deleted value '%s'"
                          % read_deleted)
 
-    query_prefix = read_deleted_filter(dbmodel, query_prefix, deleted_filters)
+    return read_deleted_filter(dbmodel, query_prefix, deleted_filters)
 
-    try:
-        query_prefix = sqlalchemyutils.paginate_query(query_prefix,
-                               dbmodel, limit,
-                               sort_keys,
-                               marker=marker,
-                               sort_dirs=sort_dirs)
-    except db_exc.InvalidSortKey, e:
-        LOG.exception(e)
-        raise Exception.InvalidSortKey()
 
-    return query_prefix
+def compile_filter_spec(resource, spec):
+    '''
+        @param spec: dict of filter name to match type, see FilterSpec
+        @return: FilterSpec of resource, create it once at import
+    '''
+    return FilterSpec(RES_MODEL_MAP[resource], spec)
+
+
+def encode_page_marker(resource, row):
+    '''
+        @return: opaque marker of the page after row
+    '''
+    values = []
+    for key in PAGE_SORT_KEYS[resource]:
+        value = getattr(row, key)
+        if isinstance(value, datetime.datetime):
+            value = value.strftime(_MARKER_TIME_FORMAT)
+        values.append(value)
+    return base64.urlsafe_b64encode(jsonutils.dumps(values)).rstrip('=')
+
 
+def decode_page_marker(resource, marker):
+    '''
+        @return: dict of sort key values encoded in marker
+    '''
+    dbmodel = RES_MODEL_MAP[resource]
+    sort_keys = PAGE_SORT_KEYS[resource]
+    try:
+        values = jsonutils.loads(base64.urlsafe_b64decode(
+            str(marker) + '=' * (-len(marker) % 4)))
+        if not isinstance(values, list) or len(values) != len(sort_keys):
+            raise ValueError(marker)
+        ret = {}
+        for key, value in zip(sort_keys, values):
+            if isinstance(getattr(dbmodel, key).type, DateTime):
+                value = datetime.datetime.strptime(value, _MARKER_TIME_FORMAT)
+            elif not isinstance(value, (int, long)):
+                raise ValueError(value)
+            ret[key] = value
+        return ret
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidRequestFormat('invalid marker')
+
+
+def get_page_by_all_filters(resource, filters, limit, marker=None,
+                            columns=None, **kwargs):
+    '''get a page of rows newest first with keyset pagination, so later
+    pages cost the same as the first one
+    @param limit: page size
+    @param marker: opaque marker returned with previous page
+    @param columns: names of columns to select, model objects if not given
+    @param kwargs: other args of get_by_all_filters
+    @return: (rows, marker of next page or None if it is the last page)
+    '''
+    sort_keys = PAGE_SORT_KEYS[resource]
+    if marker is not None:
+        marker = decode_page_marker(resource, marker)
+    if columns:
+        # marker of next page is made of sort keys of last row
+        columns = list(columns) + [k for k in sort_keys if k not in columns]
+    # one more row tells whether there is a next page
+    rows = get_by_all_filters(resource, filters,
+                              sort_keys=sort_keys,
+                              sort_dirs=['desc'] * len(sort_keys),
+                              limit=limit + 1,
+                              marker=marker,
+                              columns=columns,
+                              **kwargs)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_page_marker(resource, rows[-1])
+
+
+def iter_by_all_filters(resource, filters, chunk_size=None, **kwargs):
+    '''iterate rows newest first without loading them at once, rows are
+    fetched from a server side cursor chunk_size at a time
+    @param chunk_size: rows fetched at a time, pagination.stream_chunk_size
+                       if not given
+    @param kwargs: other args of get_by_all_filters, columns_to_join must
+                   not load collections
+    @return: iterator of rows
+    '''
+    if chunk_size is None:
+        chunk_size = get_pagination_conf()['stream_chunk_size']
+    sort_keys = PAGE_SORT_KEYS[resource]
+    query = get_queryobj_by_all_filters(resource, filters,
+                                        sort_keys=sort_keys,
+                                        sort_dirs=['desc'] * len(sort_keys),
+                                        **kwargs)
+    # stream_results makes psycopg2 use a named cursor, otherwise whole
+    # result is buffered by driver even if yield_per is used
+    return query.execution_options(stream_results=True).yield_per(chunk_size)
 
 
 # ----------------------------------------------------------------------------
@@ -278,16 +494,31 @@ def resource_create(resource_name, values):
     return resoruce_db_ref
 
 
-def get_resource_by_exact_filter(resource_name, exact_filter, session= None, use_slave=False, join_column=''):
+def get_resource_by_exact_filter(resource_name, exact_filter, session= None, use_slave=False, join_column='', columns=None):
     '''get resource ref according to resource id
+    @param columns: names of columns to select, a named tuple of them is
+                    returned instead of model object
     '''
-    session = get_session()
+    session = get_session(use_slave=use_slave)
     resource_dbmodel = get_dbmodel_for_resource(resource_name)
-    query = model_query(resource_dbmodel, session=session,
-                        use_slave=use_slave).filter_by(**exact_filter)
-    if(join_column):
-        query = query.options(joinedload(join_column)) 
-    result = query.first()
+    keys = tuple(sorted(exact_filter))
+    columns = tuple(columns or ())
+
+    def build_query(session):
+        args = None
+        if columns:
+            args = [getattr(resource_dbmodel, column) for column in columns]
+        query = model_query(resource_dbmodel, session=session, args=args)
+        query = query.filter(and_(*[getattr(resource_dbmodel, key) ==
+                                    bindparam(key) for key in keys]))
+        if join_column:
+            query = query.options(joinedload(join_column))
+        return query
+
+    # query of same resource, filter keys, columns and join is built once
+    query = _bakery(build_query, resource_dbmodel, keys, columns,
+                    join_column)
+    result = query(session).params(**exact_filter).first()
 
     if result is None:
         raise DBEntryNotExist(u'%s does not exist' % resource_name)
@@ -386,19 +617,127 @@ def get_dbmodel_for_resource(resource_name):
     return resource_dbmodel
 
 
-def db_get_user_role_list(user_id):
+def db_get_user_role_list(user_id, use_slave=False):
     ret = get_by_all_filters(RESOURCE_USER_ROLE,
                              {'user_id': user_id},
                              sort_keys= ['created_at'],
                              exact_match_filter_names=['user_id'],
-                             columns_to_join=['role'])
+                             columns_to_join=['role'],
+                             use_slave=use_slave)
     return ret
 
 
-def db_get_group_user_list(group_id):
-    ret = get_by_all_filters(RESOURCE_GROUP_USER,
-                             {'group_id': group_id},
-                             sort_keys= ['created_at'],
-                             exact_match_filter_names=['group_id'],
-                             columns_to_join=['user'])
-    return ret
+def db_get_user_auth_info(username):
+    '''get what login needs with one query: the user row, with password
+    hash, status and profile fields, joined with names of user's roles
+    :return: (Users, [role name]) with roles in the order they are granted
+    :raise DBEntryNotExist: if user does not exist
+    '''
+    def build_query(session):
+        return model_query(Users, session=session,
+                           args=(Users, Roles.name)).\
+            outerjoin(UserRole, and_(UserRole.user_id == Users.id,
+                                     UserRole.deleted == 0)).\
+            outerjoin(Roles, Roles.id == UserRole.role_id).\
+            filter(Users.username == bindparam('username')).\
+            order_by(UserRole.created_at, UserRole.role_id)
+
+    session = get_session()
+    rows = _bakery(build_query)(session).params(username=username).all()
+    if not rows:
+        raise DBEntryNotExist(u'%s does not exist' % RESOURCE_USER)
+    return rows[0][0], [name for _, name in rows if name is not None]
+
+
+def db_get_group_user_list(group_id, limit, marker=None, use_slave=False):
+    '''
+        @return: (page of group users, marker of next page or None)
+    '''
+    return get_page_by_all_filters(RESOURCE_GROUP_USER,
+                                   {'group_id': group_id},
+                                   limit,
+                                   marker,
+                                   exact_match_filter_names=['group_id'],
+                                   columns_to_join=['user'],
+                                   use_slave=use_slave)
+
+
+def db_users_last_login_time_update(login_times):
+    '''update last_login_time of many users with one UPDATE statement
+    :param login_times dict: {user_id: last_login_time}
+    '''
+    if not login_times:
+        return
+    params = {}
+    values = []
+    for i, (user_id, login_time) in enumerate(login_times.items()):
+        values.append('(CAST(:id%d AS INTEGER), CAST(:time%d AS TIMESTAMP))'
+                      % (i, i))
+        params['id%d' % i] = user_id
+        params['time%d' % i] = login_time
+    sql = ('UPDATE users SET last_login_time = v.login_time '
+           'FROM (VALUES %s) AS v (id, login_time) '
+           'WHERE users.id = v.id' % ', '.join(values))
+    session = get_session()
+    with session.begin():
+        session.execute(text(sql), params)
+
+
+def db_user_password_rehash(user_id, old_password, new_password):
+    '''replace user's password hash only if it is still old_password, so a
+    password changed meanwhile is not overwritten
+    :return: True if password hash is replaced
+    '''
+    sql = ('UPDATE users SET password = :new_password '
+           'WHERE id = :id AND password = :old_password')
+    session = get_session()
+    with session.begin():
+        result = session.execute(text(sql), {'id': user_id,
+                                             'old_password': old_password,
+                                             'new_password': new_password})
+    return result.rowcount > 0
+
+
+def db_get_user_ids_by_names(usernames):
+    '''get ids of existing users with one query
+    :return: {username: id} of users found
+    '''
+    if not usernames:
+        return {}
+    session = get_session()
+    query = model_query(Users, session=session,
+                        args=(Users.username, Users.id)).\
+        filter(Users.username.in_(usernames))
+    return dict(query.all())
+
+
+def db_users_bulk_create(users):
+    '''insert users with one multi-row INSERT statement
+    :param users list: column values of each user, users missing optional
+                       columns get their defaults
+    :return: {username: id} of inserted users
+    :raise DBEntryAleadyExist: if any username exists, no user is inserted
+    '''
+    if not users:
+        return {}
+    # every row of a multi-row INSERT has the same columns
+    columns = set()
+    for values in users:
+        columns.update(values.keys())
+    defaults = {}
+    for c in columns:
+        default = Users.__table__.c[c].default
+        defaults[c] = default.arg if default is not None and \
+            default.is_scalar else None
+    rows = []
+    for values in users:
+        row = dict(defaults)
+        row.update(values)
+        rows.append(row)
+    session = get_session()
+    try:
+        with session.begin():
+            session.execute(Users.__table__.insert().values(rows))
+    except db_exc.DBDuplicateEntry:
+        raise DBEntryAleadyExist(message='%s already exists' % RESOURCE_USER)
+    return db_get_user_ids_by_names([values['username'] for values in users])
@@ -0,0 +1,58 @@
+# Copyright 2026 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""search indexes of username and groupname
+
+Revision ID: 47777bbe1c17
+Revises: None
+Create Date: 2026-10-18 19:28:12
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '47777bbe1c17'
+down_revision = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# tables are created by the init revision autogenerated on each database.
+# on a new database this revision runs first, only the extension is created
+# and the init revision creates these indexes from the models
+_INDEXES = [
+    ('user_username_pattern_index', 'users', 'username',
+     {'postgresql_ops': {'username': 'text_pattern_ops'}}),
+    ('user_username_trgm_index', 'users', 'username',
+     {'postgresql_using': 'gin',
+      'postgresql_ops': {'username': 'gin_trgm_ops'}}),
+    ('group_groupname_pattern_index', 'groups', 'groupname',
+     {'postgresql_ops': {'groupname': 'text_pattern_ops'}}),
+    ('group_groupname_trgm_index', 'groups', 'groupname',
+     {'postgresql_using': 'gin',
+      'postgresql_ops': {'groupname': 'gin_trgm_ops'}}),
+]
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    for name, table, column, kwargs in _INDEXES:
+        if table not in tables:
+            continue
+        if name in [i['name'] for i in inspector.get_indexes(table)]:
+            continue
+        op.create_index(name, table, [column], **kwargs)
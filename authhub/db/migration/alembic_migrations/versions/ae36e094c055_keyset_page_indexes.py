@@ -0,0 +1,51 @@
+# Copyright 2026 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""keyset page indexes of user, group, group user and role lists
+
+Revision ID: ae36e094c055
+Revises: 47777bbe1c17
+Create Date: 2026-10-18 19:38:49
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'ae36e094c055'
+down_revision = '47777bbe1c17'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# like 47777bbe1c17, indexes are only added to existing tables, the init
+# revision of a new database creates them from the models
+_INDEXES = [
+    ('user_created_index', 'users', ['deleted', 'created_at', 'id']),
+    ('group_created_index', 'groups', ['deleted', 'created_at', 'id']),
+    ('group_user_created_index', 'group_user',
+     ['group_id', 'deleted', 'created_at', 'user_id']),
+    ('role_created_index', 'roles', ['deleted', 'created_at', 'id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    for name, table, columns in _INDEXES:
+        if table not in tables:
+            continue
+        if name in [i['name'] for i in inspector.get_indexes(table)]:
+            continue
+        op.create_index(name, table, columns)
@@ -22,6 +22,13 @@ class Users(model_base.BASE, model_base.HasId):
         sa.Index('user_deleted_index', 'deleted'),
         sa.Index('user_email_index', 'email'),
         sa.Index('user_status_index', 'status'),
+        sa.Index('user_created_index', 'deleted', 'created_at', 'id'),
+        # prefix and substring search of username, pg_trgm is needed
+        sa.Index('user_username_pattern_index', 'username',
+                 postgresql_ops={'username': 'text_pattern_ops'}),
+        sa.Index('user_username_trgm_index', 'username',
+                 postgresql_using='gin',
+                 postgresql_ops={'username': 'gin_trgm_ops'}),
     )
     username = sa.Column(sa.String(20), nullable=False)
     password = sa.Column(sa.String(255), nullable=False)
@@ -41,6 +48,13 @@ class Groups(model_base.BASE, model_base.HasId):
         sa.schema.UniqueConstraint("groupname", "deleted", name="group_deleted"),
         sa.Index('group_deleted_index', 'deleted'),
         sa.Index('group_status_index', 'status'),
+        sa.Index('group_created_index', 'deleted', 'created_at', 'id'),
+        # prefix and substring search of groupname, pg_trgm is needed
+        sa.Index('group_groupname_pattern_index', 'groupname',
+                 postgresql_ops={'groupname': 'text_pattern_ops'}),
+        sa.Index('group_groupname_trgm_index', 'groupname',
+                 postgresql_using='gin',
+                 postgresql_ops={'groupname': 'gin_trgm_ops'}),
     )
     groupname = sa.Column(sa.String(255), nullable=False)
     type = sa.Column(sa.String(60), nullable=False) # type of group
@@ -52,6 +66,8 @@ class GroupUser(model_base.BASE):
     __tablename__ = 'group_user'
     __table_args__ = (
         sa.schema.PrimaryKeyConstraint("user_id", "group_id", name="pk_group_user"),
+        sa.Index('group_user_created_index', 'group_id', 'deleted',
+                 'created_at', 'user_id'),
     )
     user_id = sa.Column(sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'))
     group_id = sa.Column(sa.Integer, sa.ForeignKey('groups.id', ondelete='CASCADE'))
@@ -64,6 +80,7 @@ class Roles(model_base.BASE, model_base.HasId):
     __tablename__ = 'roles'
     __table_args__ = (
         sa.schema.UniqueConstraint("name", "deleted", name="role_deleted"),
+        sa.Index('role_created_index', 'deleted', 'created_at', 'id'),
     )
     name = sa.Column(sa.String(20), nullable=False)
     description = sa.Column(sa.String(255), default='')
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''connection pool statistics of database engine, they are listed in
+/v1/stats/ with other runtime counters
+'''
+
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy import exc as sqla_exc
+from sqlalchemy.pool import QueuePool
+from commutils.utils import metrics
+
+# upper bounds of checkout wait time histogram
+POOL_WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class _TimedQueuePool(QueuePool):
+    '''QueuePool recording time to get a connection from pool, time to
+    open a new connection is recorded apart and not counted as wait.
+    recreate keeps class of pool, so pools recreated when engine is
+    disposed or connections are invalidated are recorded as well
+    '''
+
+    metrics_name = 'db.pool'
+    # seconds spent opening new connections in current _do_get
+    _local = threading.local()
+
+    def _do_get(self):
+        self._local.connect_time = 0
+        start = time.time()
+        try:
+            return QueuePool._do_get(self)
+        except sqla_exc.TimeoutError:
+            metrics.incr(self.metrics_name + '.timeouts')
+            raise
+        finally:
+            wait = time.time() - start - self._local.connect_time
+            metrics.observe_histogram(self.metrics_name + '.wait_ms',
+                                      int(wait * 1000), POOL_WAIT_BUCKETS_MS)
+
+    def _create_connection(self):
+        start = time.time()
+        try:
+            return QueuePool._create_connection(self)
+        finally:
+            elapsed = time.time() - start
+            self._local.connect_time = \
+                getattr(self._local, 'connect_time', 0) + elapsed
+            metrics.observe_histogram(self.metrics_name + '.connect_ms',
+                                      int(elapsed * 1000),
+                                      POOL_WAIT_BUCKETS_MS)
+
+
+def instrument_pool(engine, name='db.pool'):
+    '''record usage of engine pool in metrics:
+        <name>.size, <name>.checked_out, <name>.overflow: current values
+        <name>.wait_ms: histogram of time waiting for a pooled connection
+        <name>.connect_ms: histogram of time to open a new connection
+        <name>.timeouts: checkouts failed after pool_timeout
+        <name>.invalidated: connections dropped since they are found stale
+    '''
+    pool = engine.pool
+    # only QueuePool has size and overflow and waits for connections,
+    # sqlite uses other pools
+    if type(pool) is QueuePool:
+        pool.__class__ = type('TimedQueuePool', (_TimedQueuePool, ),
+                              {'metrics_name': name})
+        # engine replaces its pool with a recreated one on dispose
+        metrics.register_gauge(name + '.size', lambda: engine.pool.size())
+        metrics.register_gauge(name + '.checked_out',
+                               lambda: engine.pool.checkedout())
+        # overflow is negative until pool is full
+        metrics.register_gauge(name + '.overflow',
+                               lambda: max(engine.pool.overflow(), 0))
+
+    def count_invalidated(*args):
+        metrics.incr(name + '.invalidated')
+    # listeners are passed to recreated pools
+    event.listen(pool, 'invalidate', count_invalidated)
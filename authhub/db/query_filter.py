@@ -1,5 +1,8 @@
-from sqlalchemy import or_
+import operator
+import re
+from sqlalchemy import and_, or_, tuple_
 from oslo_db import exception
+from authhub.common.exception import InvalidRequestFormat
 
 
 LOGIN_QUERY_OPERATOR = {
@@ -13,6 +16,23 @@ LOGIN_QUERY_OPERATOR = {
 }
 
 
+# match types of filters in filter specs
+FILTER_EXACT = 'exact'
+FILTER_REGEX = 'regex'
+FILTER_LOGIC = 'logic'
+FILTER_SEARCH = 'search'
+
+_LOGIC_OPERATORS = {
+    LOGIN_QUERY_OPERATOR['OPERATOR_GE']: operator.ge,
+    LOGIN_QUERY_OPERATOR['OPERATOR_GT']: operator.gt,
+    LOGIN_QUERY_OPERATOR['OPERATOR_LE']: operator.le,
+    LOGIN_QUERY_OPERATOR['OPERATOR_LT']: operator.lt,
+    LOGIN_QUERY_OPERATOR['OPERATOR_NE']: operator.ne,
+    LOGIN_QUERY_OPERATOR['OPERATOR_BETWEEN']:
+        lambda column, low, high: column.between(low, high),
+}
+
+
 def _get_regexp_op_for_connection(dbtype):
     regexp_op_map = {
         'postgresql': '~',
@@ -22,6 +42,36 @@ def _get_regexp_op_for_connection(dbtype):
     return regexp_op_map.get(dbtype, 'LIKE')
 
 
+# a regular expression without these is a literal string
+_REGEX_SPECIAL = re.compile(r'[\\.^$*+?()\[\]{}|]')
+
+
+def _like_escape(value):
+    # backslash is the default escape character of LIKE in postgresql
+    return value.replace('\\', '\\\\').replace('%', '\\%').\
+        replace('_', '\\_')
+
+
+def _anchored_regex_clause(column_attr, pattern):
+    """Rewrites an anchored literal pattern to a predicate indexes can serve.
+
+    ^abc$ is rewritten to == and ^abc to LIKE 'abc%', which text_pattern_ops
+    indexes serve by range scan. Returns None for other patterns, they are
+    matched with ~, which pg_trgm indexes serve if there are trigrams.
+    """
+    if not pattern.startswith(u'^'):
+        return None
+    literal = pattern[1:]
+    exact = literal.endswith(u'$')
+    if exact:
+        literal = literal[:-1]
+    if not literal or _REGEX_SPECIAL.search(literal):
+        return None
+    if exact:
+        return column_attr == literal
+    return column_attr.like(_like_escape(literal) + u'%')
+
+
 def exact_query_filter(model, query, filters, legal_keys):
     """Applies exact match filtering to an model query.
 
@@ -86,8 +136,11 @@ def regex_query_filter(model, query, filters):
             query = query.filter(column_attr.op(db_regexp_op)(
                                  '%' + unicode(filters[filter_name]) + '%'))
         else:
-            query = query.filter(column_attr.op(db_regexp_op)(
-                                 unicode(filters[filter_name])))
+            pattern = unicode(filters[filter_name])
+            clause = _anchored_regex_clause(column_attr, pattern)
+            if clause is None:
+                clause = column_attr.op(db_regexp_op)(pattern)
+            query = query.filter(clause)
     return query
 
 
@@ -161,6 +214,167 @@ def logic_query_filter(model, query, filters, legal_keys):
     return query
 
 
+def keyset_query_filter(model, query, sort_keys, sort_dirs, marker):
+    """Applies keyset pagination filtering to an model query.
+
+    Returns the updated query which only selects rows after marker in the
+    order of sort_keys. Unlike offset, rows before marker are not scanned
+    when there is an index on sort_keys.
+
+    :param query: query to apply filters to
+    :param sort_keys: list of sort keys, last ones must be unique together
+    :param sort_dirs: list of sort directions of sort_keys
+    :param marker: dict of sort key values of last row of previous page
+    """
+    columns = [getattr(model, key) for key in sort_keys]
+    values = [marker[key] for key in sort_keys]
+    if len(set(sort_dirs)) == 1:
+        # (a, b) < (x, y) is an index range scan, expanded OR of it is not
+        if sort_dirs[0] == 'desc':
+            return query.filter(tuple_(*columns) < tuple_(*values))
+        return query.filter(tuple_(*columns) > tuple_(*values))
+
+    criteria = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        crit = [columns[j] == values[j] for j in range(i)]
+        if sort_dirs[i] == 'desc':
+            crit.append(column < value)
+        else:
+            crit.append(column > value)
+        criteria.append(and_(*crit))
+    return query.filter(or_(*criteria))
+
+
+class FilterSpec(object):
+    """Filters a resource can be listed by, compiled once.
+
+    Filter names, their columns and operators are checked and resolved
+    when the spec is created, so a request only validates its filter keys
+    and binds their values into prepared clause builders.
+
+    :param model: model of the resource
+    :param spec: dict of filter name (a column of model) to its match type:
+                 FILTER_EXACT, == or IN/NOT_IN for lists;
+                 FILTER_REGEX, regular expression match;
+                 (FILTER_LOGIC, [operator, ...]), comparisons by
+                 LOGIN_QUERY_OPERATOR values, value is [operator, value]
+                 or [between, low, high];
+                 (FILTER_SEARCH, column name), the filter name needs not
+                 be a column, value is a literal string matched as a
+                 substring of column, or as a prefix if it starts with ^
+    """
+
+    def __init__(self, model, spec):
+        if 'deleted' not in model.__table__.columns:
+            raise ValueError("There is no `deleted` column in `%s` table"
+                             % model.__name__)
+        self.model = model
+        self.names = sorted(spec)
+        self._builders = {}
+        for name, match in spec.items():
+            column_name = name
+            if isinstance(match, tuple) and match[0] == FILTER_SEARCH:
+                column_name = match[1]
+            if model.__table__.columns.get(column_name) is None:
+                raise ValueError("filter <%s> is not a column of %s"
+                                 % (column_name, model.__name__))
+            column = getattr(model, column_name)
+            if match == FILTER_EXACT:
+                builder = self._exact_builder(column)
+            elif match == FILTER_REGEX:
+                builder = self._regex_builder(column)
+            elif isinstance(match, tuple) and match[0] == FILTER_LOGIC:
+                builder = self._logic_builder(name, column, match[1])
+            elif isinstance(match, tuple) and match[0] == FILTER_SEARCH:
+                builder = self._search_builder(column)
+            else:
+                raise ValueError("unknown match type %s of filter <%s>"
+                                 % (match, name))
+            self._builders[name] = builder
+        default_deleted_value = model.__table__.c.deleted.default.arg
+        self._deleted_clauses = {
+            'no': [model.deleted == default_deleted_value],
+            'only': [model.deleted != default_deleted_value],
+            'yes': []
+        }
+
+    @staticmethod
+    def _exact_builder(column):
+        def build(value):
+            if isinstance(value, (list, tuple, set, frozenset)):
+                value = list(value)
+                if value and value[0] == LOGIN_QUERY_OPERATOR['NOT_IN']:
+                    return ~column.in_(value)
+                return column.in_(value)
+            return column == value
+        return build
+
+    @staticmethod
+    def _regex_builder(column):
+        regexp = column.op(_get_regexp_op_for_connection('postgresql'))
+
+        def build(value):
+            pattern = unicode(value)
+            clause = _anchored_regex_clause(column, pattern)
+            return regexp(pattern) if clause is None else clause
+        return build
+
+    @staticmethod
+    def _search_builder(column):
+        def build(value):
+            value = unicode(value)
+            if value.startswith(u'^'):
+                return column.like(_like_escape(value[1:]) + u'%')
+            return column.like(u'%' + _like_escape(value) + u'%')
+        return build
+
+    @staticmethod
+    def _logic_builder(name, column, operators):
+        funcs = {}
+        for op in operators:
+            if op not in _LOGIC_OPERATORS:
+                raise ValueError("unknown operator %s of filter <%s>"
+                                 % (op, name))
+            funcs[op] = _LOGIC_OPERATORS[op]
+
+        def build(value):
+            if not isinstance(value, (list, tuple)) or not value or \
+                    value[0] not in funcs:
+                raise InvalidRequestFormat(
+                    'filter <%s> must be [OPERATOR, VALUE...], operators '
+                    'are %s' % (name, ', '.join(sorted(funcs))))
+            try:
+                return funcs[value[0]](column, *value[1:])
+            except TypeError:
+                raise InvalidRequestFormat('wrong number of values of '
+                                           'filter <%s>' % name)
+        return build
+
+    def clauses(self, filters, read_deleted='no'):
+        """Returns list of where clauses of filters.
+
+        :param filters: dict of filter name to value, empty values are
+                        skipped
+        :param read_deleted: 'no', 'only' or 'yes', as read_deleted_filter
+        :raise InvalidRequestFormat: if a filter is not in spec
+        """
+        if read_deleted not in self._deleted_clauses:
+            raise ValueError("Unrecognized read_deleted value '%s'"
+                             % read_deleted)
+        ret = list(self._deleted_clauses[read_deleted])
+        for name in filters:
+            builder = self._builders.get(name)
+            if builder is None:
+                raise InvalidRequestFormat(
+                    'unknown filter <%s>, filters are %s'
+                    % (name, ', '.join(self.names)))
+            value = filters[name]
+            if not value and value != 0:
+                continue
+            ret.append(builder(value))
+        return ret
+
+
 def read_deleted_filter(db_model, query, deleted_filters):
     deleted = deleted_filters['deleted']
     if 'deleted' not in db_model.__table__.columns:
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+import atexit
+import threading
+from authhub.db import api as db_api
+from commutils.log import log as logging
+from commutils.conf.gconf import get_last_login_conf
+
+LOG = logging.getLogger(__name__)
+
+
+class LastLoginWriter(threading.Thread):
+    '''write-behind queue of users' last login time, login times are
+    coalesced per user and flushed to database with one UPDATE
+    '''
+    def __init__(self, flush_interval, flush_max_entries):
+        threading.Thread.__init__(self)
+        self.flush_interval = flush_interval
+        self.flush_max_entries = flush_max_entries
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+    def record(self, user_id, login_time):
+        '''record login time of user, only the latest one is kept
+        '''
+        with self._lock:
+            self._pending[user_id] = login_time
+            pending_count = len(self._pending)
+        if pending_count >= self.flush_max_entries:
+            self._wakeup.set()
+
+    def run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        '''write all pending login times to database
+        '''
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            db_api.db_users_last_login_time_update(pending)
+        except Exception, e:
+            LOG.error("failed to flush last login time of %s users with "
+                      "error: %s" % (len(pending), e))
+            # put them back unless a newer login is recorded
+            with self._lock:
+                for user_id, login_time in pending.items():
+                    self._pending.setdefault(user_id, login_time)
+
+    def stop(self):
+        '''stop flush thread and flush pending login times
+        '''
+        self._stopped = True
+        self._wakeup.set()
+        if self.is_alive():
+            self.join(self.flush_interval)
+        self.flush()
+
+
+_LOCK = threading.Lock()
+_last_login_writer = None
+
+
+def get_last_login_writer():
+    '''get process wide last login writer, it is started on first use and
+    flushed when process exits
+    '''
+    global _last_login_writer
+    if _last_login_writer is None:
+        with _LOCK:
+            if _last_login_writer is None:
+                conf = get_last_login_conf()
+                writer = LastLoginWriter(conf['flush_interval_ms'] / 1000.0,
+                                         conf['flush_max_entries'])
+                writer.setDaemon(True)
+                writer.start()
+                atexit.register(writer.stop)
+                _last_login_writer = writer
+    return _last_login_writer
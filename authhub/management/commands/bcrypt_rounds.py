@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+from django.core.management.base import BaseCommand
+from commutils.utils.hashpool import calibrate_rounds
+
+
+class Command(BaseCommand):
+    help = ('print the highest bcrypt cost factor whose hash time on this '
+            'host does not exceed target, configure it as passwd_hash.rounds')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rounds = calibrate_rounds(options['target_ms'], options['repeat'])
+        self.stdout.write(str(rounds))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+import sys
+from django.core.management.base import BaseCommand
+from authhub.resources.user_import import user_import, IMPORT_FORMATS,\
+    IMPORT_FORMAT_JSONL
+from commutils.utils import jsonutils
+
+
+class Command(BaseCommand):
+    help = ('import users from a JSON lines or CSV file, result of each row '
+            'is printed as a JSON line')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="file of users, '-' for stdin")
+        parser.add_argument('--format', choices=IMPORT_FORMATS,
+                            default=IMPORT_FORMAT_JSONL)
+
+    def handle(self, *args, **options):
+        stream = sys.stdin if options['file'] == '-' else \
+            open(options['file'], 'rb')
+        created = failed = 0
+        try:
+            for result in user_import(stream, options['format']):
+                if 'error' in result:
+                    failed += 1
+                else:
+                    created += 1
+                self.stdout.write(jsonutils.dumps(result))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stderr.write('%s users created, %s failed' % (created, failed))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''sparse fieldsets, a client lists fields it wants in fields= parameter,
+only their columns are selected and relations not listed are not loaded
+'''
+
+from authhub.common.exception import InvalidRequestFormat
+from commutils.utils.timeutils import strtime_utc_to_local
+
+
+def select_fields(fields, valid_fields, default_fields):
+    '''
+        @param fields: list of fields requested, None for default_fields
+        @param valid_fields: list of fields that can be requested
+        @return: list of requested fields without duplicates
+    '''
+    if not fields:
+        return list(default_fields)
+    selected = []
+    for field in fields:
+        if field not in valid_fields:
+            raise InvalidRequestFormat('unknown field <%s>, fields are %s'
+                                       % (field, ', '.join(valid_fields)))
+        if field not in selected:
+            selected.append(field)
+    return selected
+
+
+def fields_to_columns(fields, relations=(), needed=()):
+    '''
+        @param relations: fields which are not columns
+        @param needed: columns to select even if they are not requested
+        @return: list of column names to select
+    '''
+    columns = [f for f in fields if f not in relations]
+    return columns + [c for c in needed if c not in columns]
+
+
+def row_to_dict(row, fields, time_fields=()):
+    '''
+        @param row: model object or named tuple of selected columns
+        @param time_fields: fields converted to local time strings
+        @return: dict of fields of row
+    '''
+    ret = {}
+    for field in fields:
+        value = getattr(row, field)
+        if field in time_fields:
+            value = strtime_utc_to_local(value)
+        ret[field] = value
+    return ret
@@ -16,6 +16,8 @@ from commutils.utils.timeutils import strtime_utc_to_local
 from authhub.common.constant import RESOURCE_GROUP, RESOURCE_GROUP_USER
 from authhub.common.misc import purify_request_params, check_needed_params
 from authhub.db.api import resource_delete_by_exact_filter, db_get_group_user_list
+from authhub.db.query_filter import FILTER_EXACT, FILTER_REGEX, FILTER_SEARCH
+from authhub.resources.fields import select_fields, row_to_dict
 from oslo_db.exception import DBReferenceError
 LOG = logging.getLogger(__name__)
 
@@ -38,38 +40,73 @@ def group_create(group_info):
     return result
 
 
-def group_list(group_filter):
-    '''list all groups
-    :returns: selected group info
+# filters lists can be selected by, unknown filters are rejected
+_GROUP_LIST_FILTERS = db_api.compile_filter_spec(RESOURCE_GROUP, {
+    'type': FILTER_EXACT,
+    'groupname': FILTER_REGEX,
+    'search': (FILTER_SEARCH, 'groupname'),
+})
+# fields which can be requested, they are columns of groups
+_GROUP_FIELDS = ['id', 'groupname', 'type', 'status', 'description',
+                 'created_at', 'updated_at']
+_GROUP_TIME_FIELDS = ['created_at', 'updated_at']
+_GROUP_LIST_FIELDS = ['id', 'groupname', 'created_at']
+_GROUP_DETAIL_FIELDS = ['id', 'groupname', 'status', 'description',
+                        'created_at', 'updated_at']
+
+
+def group_list(group_filter, limit, marker=None, fields=None):
+    '''list groups newest first, a page at a time
+    :param limit int: page size
+    :param marker str: marker of previous page, None for first page
+    :param fields list: fields of groups to return, id, groupname and
+                        created_at if not given
+    :returns: (selected group info, marker of next page or None)
     '''
-    rlist_ret = []
-    purify_request_params(group_filter, ['type', 'groupname'])
-    exact_match_filter_names = ['type']
-
-    ret = db_api.get_by_all_filters(RESOURCE_GROUP,
-                                    group_filter,
-                                    exact_match_filter_names = exact_match_filter_names)
-
-    for rinfo in ret:
-        gitem = {
-            'id': rinfo.id,
-            'groupname': rinfo.groupname,
-            'created_at': strtime_utc_to_local(rinfo.created_at)
-        }
-        rlist_ret.append(gitem)
-
-    return rlist_ret
+    fields = select_fields(fields, _GROUP_FIELDS, _GROUP_LIST_FIELDS)
+
+    ret, next_marker = db_api.get_page_by_all_filters(
+        RESOURCE_GROUP,
+        group_filter,
+        limit,
+        marker,
+        filter_spec=_GROUP_LIST_FILTERS,
+        columns=fields,
+        use_slave=True)
+
+    return ([row_to_dict(rinfo, fields, _GROUP_TIME_FIELDS) for rinfo in ret],
+            next_marker)
+
+
+def group_list_stream(group_filter, fields=None):
+    '''list all selected groups newest first, they are read from database
+    in chunks while result is iterated
+    :param fields list: fields of groups to return, as group_list
+    :returns: iterator of selected group info
+    '''
+    fields = select_fields(fields, _GROUP_FIELDS, _GROUP_LIST_FIELDS)
+    ret = db_api.iter_by_all_filters(
+        RESOURCE_GROUP,
+        group_filter,
+        filter_spec=_GROUP_LIST_FILTERS,
+        columns=fields,
+        use_slave=True)
+    return (row_to_dict(rinfo, fields, _GROUP_TIME_FIELDS) for rinfo in ret)
 
 
-def get_group_by_id(group_id):
+def get_group_by_id(group_id, fields=None, use_slave=False):
     '''get group detailed info by group_id
     '''
-    return _group_detail(group_id)
+    return _group_detail(group_id, fields=fields, use_slave=use_slave)
 
 
-def _group_detail(query_obj, query_type='id'):
+def _group_detail(query_obj, query_type='id', fields=None, use_slave=False):
     '''get group detailed information
     :param query_obj str: either id or groupname
+    :param fields list: fields of group to return, all but type if not
+                        given
+    :param use_slave bool: read from replicas, only when no write depends
+                           on the result
     '''
     query_filter = {}
     # we can get group by id or groupname
@@ -78,21 +115,16 @@ def _group_detail(query_obj, query_type='id'):
     else:
         return None
 
+    fields = select_fields(fields, _GROUP_FIELDS, _GROUP_DETAIL_FIELDS)
     try:
         ret = db_api.get_resource_by_exact_filter(RESOURCE_GROUP,
-                                                  query_filter)
+                                                  query_filter,
+                                                  use_slave=use_slave,
+                                                  columns=fields)
     except DBEntryNotExist:
         raise DBEntryNotExist('the group you queried does not exist')
 
-    group_info = {
-        "id": ret.id,
-        "groupname": ret.groupname,
-        "status": ret.status,
-        "description": ret.description,
-        "created_at": strtime_utc_to_local(ret.created_at),
-        "updated_at": strtime_utc_to_local(ret.updated_at)
-    }
-    return group_info
+    return row_to_dict(ret, fields, _GROUP_TIME_FIELDS)
 
 
 def group_update(group_id, group_info, valid_params=None):
@@ -152,9 +184,11 @@ def group_user_delete(group_id, user_id):
                                     )
 
 
-def group_user_list(group_id):
-    '''return group's user list
+def group_user_list(group_id, limit, marker=None):
+    '''return a page of group's user list, newest members first
+    :returns: (group's user list, marker of next page or None)
     '''
-    ret = db_get_group_user_list(group_id)
+    ret, next_marker = db_get_group_user_list(group_id, limit, marker,
+                                              use_slave=True)
     group_user_list = [ {'id': r['user'].id, 'username': r['user'].username} for r in ret]
-    return group_user_list
+    return group_user_list, next_marker
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''throttle failed logins of each username and source ip with counters in
+token store, so logins locked out are rejected before password hashing
+'''
+
+import hashlib
+import time
+from authhub.context import g_context
+from authhub.common.exception import LoginLocked
+from commutils.cache.constants import LOGIN_FAILURE_PREFIX_MEMCACHE,\
+    LOGIN_LOCKOUT_PREFIX_MEMCACHE
+from commutils.conf.gconf import get_login_throttle_conf
+from commutils.log import log as logging
+from commutils.utils import metrics
+
+LOG = logging.getLogger(__name__)
+
+throttle_conf = get_login_throttle_conf()
+
+
+def _throttle_keys(username, source_ip):
+    '''
+        @return: list of (key, max failures) of username and source ip,
+                 username is hashed since it is not checked before login
+    '''
+    if isinstance(username, unicode):
+        username = username.encode('utf-8')
+    keys = [('user.%s' % hashlib.sha1(username).hexdigest(),
+             throttle_conf['user_max_failures'])]
+    if source_ip:
+        keys.append(('ip.%s' % source_ip, throttle_conf['ip_max_failures']))
+    return keys
+
+
+def login_throttle_check(username, source_ip):
+    '''check whether username or source ip is locked out, it is allowed if
+    token store fails
+    @raise LoginLocked: if either of them is locked out
+    '''
+    if not throttle_conf['enabled']:
+        return
+    keys = [key for key, _ in _throttle_keys(username, source_ip)]
+    lockouts = g_context.memclient.get_multi(LOGIN_LOCKOUT_PREFIX_MEMCACHE,
+                                             keys)
+    if not lockouts:
+        return
+    remaining = max(lockouts.values()) - time.time()
+    if remaining > 0:
+        metrics.incr('login_throttle.hashes_avoided')
+        raise LoginLocked(retry_after=int(remaining) + 1)
+
+
+def login_failure_record(username, source_ip):
+    '''count a failed login of username and source ip, either of them is
+    locked out once its failures reach the limit, lockout doubles with
+    each further failure
+    '''
+    if not throttle_conf['enabled']:
+        return
+    now = time.time()
+    for key, max_failures in _throttle_keys(username, source_ip):
+        failures = g_context.memclient.incr(LOGIN_FAILURE_PREFIX_MEMCACHE,
+                                            key, 1, throttle_conf['window'])
+        if failures is None or failures < max_failures:
+            continue
+        # exponent is capped so lockout does not overflow before limit
+        lockout = min(throttle_conf['lockout_base'] *
+                      2 ** min(failures - max_failures, 30),
+                      throttle_conf['lockout_max'])
+        g_context.memclient.set(LOGIN_LOCKOUT_PREFIX_MEMCACHE, key,
+                                int(now + lockout), lockout)
+        metrics.incr('login_throttle.lockouts')
+        LOG.warning("login of %s is locked out for %ss after %s failures"
+                    % (key, lockout, failures))
+
+
+def login_success_record(username):
+    '''clear failed logins of username, failures of source ip are kept so
+    one valid account does not reset them
+    '''
+    if not throttle_conf['enabled']:
+        return
+    key, _ = _throttle_keys(username, None)[0]
+    g_context.memclient.delete(LOGIN_FAILURE_PREFIX_MEMCACHE, key)
@@ -15,6 +15,8 @@ from authhub.common.exception import DBEntryNotExist
 from commutils.utils.timeutils import strtime_utc_to_local
 from authhub.common.constant import RESOURCE_ROLE
 from authhub.common.misc import purify_request_params, check_needed_params
+from authhub.db.query_filter import FILTER_EXACT
+from authhub.resources.fields import select_fields, row_to_dict
 LOG = logging.getLogger(__name__)
 
 
@@ -35,44 +37,74 @@ def role_create(role_info):
     return result
 
 
-def role_list(role_filter):
-    '''list all roles
-    :returns: selected role info
-    '''
-    rlist_ret = []
-    purify_request_params(role_filter, ['name'])
-    exact_match_filter_names = ['name']
-
-    ret = db_api.get_by_all_filters(RESOURCE_ROLE,
-                                    role_filter,
-                                    exact_match_filter_names = exact_match_filter_names)
+# filters lists can be selected by, unknown filters are rejected
+_ROLE_LIST_FILTERS = db_api.compile_filter_spec(RESOURCE_ROLE, {
+    'name': FILTER_EXACT,
+})
+# fields which can be requested, they are columns of roles
+_ROLE_FIELDS = ['id', 'name', 'description', 'created_at', 'updated_at']
+_ROLE_TIME_FIELDS = ['created_at', 'updated_at']
+_ROLE_LIST_FIELDS = ['id', 'name', 'created_at']
 
-    for rinfo in ret:
-        uitem = {
-            'id': rinfo.id,
-            'name': rinfo.name,
-            'created_at': strtime_utc_to_local(rinfo.created_at)
-        }
-        rlist_ret.append(uitem)
 
-    return rlist_ret
+def role_list(role_filter, limit, marker=None, fields=None):
+    '''list roles newest first, a page at a time
+    :param limit int: page size
+    :param marker str: marker of previous page, None for first page
+    :param fields list: fields of roles to return, id, name and created_at
+                        if not given
+    :returns: (selected role info, marker of next page or None)
+    '''
+    fields = select_fields(fields, _ROLE_FIELDS, _ROLE_LIST_FIELDS)
+
+    ret, next_marker = db_api.get_page_by_all_filters(
+        RESOURCE_ROLE,
+        role_filter,
+        limit,
+        marker,
+        filter_spec=_ROLE_LIST_FILTERS,
+        columns=fields,
+        use_slave=True)
+
+    return ([row_to_dict(rinfo, fields, _ROLE_TIME_FIELDS) for rinfo in ret],
+            next_marker)
+
+
+def role_list_stream(role_filter, fields=None):
+    '''list all selected roles newest first, they are read from database
+    in chunks while result is iterated
+    :param fields list: fields of roles to return, as role_list
+    :returns: iterator of selected role info
+    '''
+    fields = select_fields(fields, _ROLE_FIELDS, _ROLE_LIST_FIELDS)
+    ret = db_api.iter_by_all_filters(
+        RESOURCE_ROLE,
+        role_filter,
+        filter_spec=_ROLE_LIST_FILTERS,
+        columns=fields,
+        use_slave=True)
+    return (row_to_dict(rinfo, fields, _ROLE_TIME_FIELDS) for rinfo in ret)
 
 
-def get_role_by_rolename(role_name):
+def get_role_by_rolename(role_name, fields=None, use_slave=False):
     '''get role detailed info by role_name
     '''
-    return _role_detail(role_name, query_type='name')
+    return _role_detail(role_name, query_type='name', fields=fields,
+                        use_slave=use_slave)
 
 
-def get_role_by_id(role_id):
+def get_role_by_id(role_id, fields=None, use_slave=False):
     '''get role detailed info by role_id
     '''
-    return _role_detail(role_id)
+    return _role_detail(role_id, fields=fields, use_slave=use_slave)
 
 
-def _role_detail(query_obj, query_type='id'):
+def _role_detail(query_obj, query_type='id', fields=None, use_slave=False):
     '''get role detailed information
     :param query_obj str: either id or rolename
+    :param fields list: fields of role to return, all if not given
+    :param use_slave bool: read from replicas, only when no write depends
+                           on the result, a new role may be missing there
     '''
     query_filter = {}
     # we can get role by id or rolename
@@ -83,20 +115,16 @@ def _role_detail(query_obj, query_type='id'):
     else:
         return None
 
+    fields = select_fields(fields, _ROLE_FIELDS, _ROLE_FIELDS)
     try:
         ret = db_api.get_resource_by_exact_filter(RESOURCE_ROLE,
-                                                  query_filter)
+                                                  query_filter,
+                                                  use_slave=use_slave,
+                                                  columns=fields)
     except DBEntryNotExist:
         raise DBEntryNotExist('the role you queried does not exist')
 
-    role_info = {
-        "id": ret.id,
-        "name": ret.name,
-        "description": ret.description,
-        "created_at": strtime_utc_to_local(ret.created_at),
-        "updated_at": strtime_utc_to_local(ret.updated_at)
-    }
-    return role_info
+    return row_to_dict(ret, fields, _ROLE_TIME_FIELDS)
 
 
 def role_update(role_id, role_info, valid_params=None):
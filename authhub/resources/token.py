@@ -9,27 +9,96 @@
 #
 #
 
+import hashlib
+import time
 from commutils.log import log as logging
 from commutils.utils import uuidutils
+from commutils.utils import metrics
+from commutils.conf.gconf import get_token_conf
+from commutils.utils.secure import sign_payload, verify_signed_payload
+from commutils.cache.localcache import LocalCache
+from commutils.cache.codec import TokenCodec
 from authhub.common.exception import UserTokenExpired
-from commutils.cache.constants import USER_TOKEN_KEY_PREFIX_MEMCACHE
+from commutils.cache.constants import USER_TOKEN_KEY_PREFIX_MEMCACHE,\
+    REVOKED_TOKEN_SET_PREFIX_MEMCACHE, USER_TOKEN_INDEX_PREFIX_MEMCACHE,\
+    MEMCACHE_KEY_TIMEOUT
 from authhub.context import g_context
 from authhub.resources.user import user_lastlogin_time_update
 
 
 LOG = logging.getLogger(__name__)
 
+TOKEN_FORMAT_UUID = 'uuid'
+TOKEN_FORMAT_SIGNED = 'signed'
+
+TOKEN_RENEW_SET = 'set'
+TOKEN_RENEW_TOUCH = 'touch'
+
+TOKEN_CODEC_BINARY = 'binary'
+
+# all revoked signed tokens are stored in one memcache key as
+# {'tokens': {jti: exp}, 'users': {user_id: revoked_at}}
+_REVOKED_SET_KEY = 'all'
+
+# fields stored with uuid token for internal use, never returned to client
+_TOKEN_INTERNAL_FIELDS = ('renewed_at', 'created_at')
+
+# user token index is a string of comma terminated entries, entry is token id
+# for uuid token and "jti:iat:exp" for signed token
+_INDEX_ENTRY_SEP = ','
+_INDEX_SIGNED_SEP = ':'
+
+token_conf = get_token_conf()
+if token_conf['format'] == TOKEN_FORMAT_SIGNED and not token_conf['secret']:
+    LOG.error("secret is not configured for signed token, use uuid token")
+    token_conf['format'] = TOKEN_FORMAT_UUID
+
+# pickled tokens stored before codec is enabled are still readable
+if token_conf['codec'] == TOKEN_CODEC_BINARY:
+    g_context.register_codec(USER_TOKEN_KEY_PREFIX_MEMCACHE, TokenCodec())
+
+# process local copy of revoked signed tokens
+_revoked_cache = {'refresh_at': 0, 'revoked': {'tokens': {}, 'users': {}}}
+
+# process local cache of checked uuid tokens, a revoked token may still be
+# accepted by other processes within l1_cache_ttl seconds
+_token_cache = None
+if token_conf['l1_cache_ttl'] > 0:
+    _token_cache = LocalCache('token.l1',
+                              maxsize=token_conf['l1_cache_size'],
+                              ttl=token_conf['l1_cache_ttl'])
+
+# users whose token index is touched by this process lately, memcache append
+# never extends expire time of index, so it is touched when tokens in it are
+# renewed, at most once per token timeout
+_index_touched = LocalCache(
+    'token.index_touch', maxsize=token_conf['l1_cache_size'],
+    ttl=MEMCACHE_KEY_TIMEOUT[USER_TOKEN_KEY_PREFIX_MEMCACHE])
+
+
 def token_create(user_info):
     '''create token resource
     @param user_info: user_info that will be cached in memcache
     @return: token id if success else None
     '''
+    if token_conf['format'] == TOKEN_FORMAT_SIGNED:
+        token_id, payload = _signed_token_create(user_info)
+        _user_token_index_add(user_info['id'],
+                              _INDEX_SIGNED_SEP.join([payload['jti'],
+                                                      '%.3f' % payload['iat'],
+                                                      str(payload['exp'])]))
+        user_lastlogin_time_update(user_info['id'])
+        return token_id
+
+    now = int(time.time())
+    user_info = dict(user_info, renewed_at=now, created_at=now)
     retry_time = 0
     while retry_time < 5:
         token_id = uuidutils.generate_uuid()
         if g_context.memclient.set(USER_TOKEN_KEY_PREFIX_MEMCACHE,
                                    token_id,
                                    user_info):
+            _user_token_index_add(user_info['id'], token_id)
             user_lastlogin_time_update(user_info['id'])
             return token_id
         retry_time += 1
@@ -40,6 +109,10 @@ def token_revoke(token_id):
     '''delete token
     :return: True if success else False
     '''
+    if _is_signed_token(token_id):
+        return _signed_token_revoke(token_id)
+    if _token_cache is not None:
+        _token_cache.delete(token_id)
     return g_context.memclient.delete(USER_TOKEN_KEY_PREFIX_MEMCACHE,
                                       token_id)
 
@@ -49,24 +122,461 @@ def token_renew(token_id, user_info):
     :param user_info dict: user info that will be stored in cache
     :return: True if success else False
     '''
+    user_info['renewed_at'] = int(time.time())
     if g_context.memclient.set(USER_TOKEN_KEY_PREFIX_MEMCACHE,
                                token_id,
                                user_info):
         LOG.debug("Renew token for user <%s> with token id <%s>" % (user_info, token_id))
+        metrics.incr('token.renew')
+        _user_token_index_touch([user_info['id']])
         return True
     else:
         LOG.debug("Failed to renew token <%s> for user <%s>" % (token_id, user_info))
-        return False   
+        metrics.incr('token.renew_failed')
+        return False
+
+
+def _token_need_renew(token_info):
+    '''token is renewed only when renew_threshold of its timeout has elapsed
+    since it was created or renewed last time, tokens created without
+    renewed_at are always renewed
+    '''
+    timeout = MEMCACHE_KEY_TIMEOUT[USER_TOKEN_KEY_PREFIX_MEMCACHE]
+    elapsed = time.time() - token_info.get('renewed_at', 0)
+    return elapsed >= timeout * token_conf['renew_threshold']
 
 
 def token_check(token_id):
     '''check whether the token id still exists in cache
     :return: user id of this user if token not expired else None
     '''
+    if _is_signed_token(token_id):
+        return _signed_token_check(token_id)
+    if _token_cache is not None:
+        user_info = _token_cache.get(token_id)
+        if user_info is not None:
+            return _copy_user_info(user_info)
+
+    if token_conf['renew_mode'] == TOKEN_RENEW_TOUCH:
+        return _token_check_touch(token_id)
+
     token_info = g_context.memclient.get(USER_TOKEN_KEY_PREFIX_MEMCACHE, token_id)
     if token_info is None:
         LOG.error("token <%s> has expired" % token_id)
         raise UserTokenExpired(message='user token has expired')
     # renew token
-    token_renew(token_id, token_info)
-    return token_info
+    if _token_need_renew(token_info):
+        token_renew(token_id, token_info)
+    else:
+        metrics.incr('token.renew_skipped')
+    return _token_user_info(token_id, token_info)
+
+
+def _token_check_touch(token_id):
+    '''get token and reset its expire time in one round trip,
+    renewed_at stored with token is not updated
+    :return: user info of token
+    '''
+    token_info, touched = g_context.memclient.get_touch(
+        USER_TOKEN_KEY_PREFIX_MEMCACHE, token_id)
+    if token_info is None:
+        LOG.error("token <%s> has expired" % token_id)
+        raise UserTokenExpired(message='user token has expired')
+    metrics.incr('token.renew' if touched else 'token.renew_failed')
+    if touched:
+        _user_token_index_touch([token_info['id']])
+    return _token_user_info(token_id, token_info)
+
+
+def _token_check_multi_touch(token_ids):
+    '''get tokens and reset their expire time in one memcache round trip
+    :return: dict of {token_id: user_info}, user_info is None if expired
+    '''
+    pipe = g_context.memclient.pipeline()
+    for token_id in token_ids:
+        pipe.get(USER_TOKEN_KEY_PREFIX_MEMCACHE, token_id)
+        pipe.touch(USER_TOKEN_KEY_PREFIX_MEMCACHE, token_id)
+    replies = pipe.execute()
+    result = {}
+    touched_users = []
+    for i, token_id in enumerate(token_ids):
+        token_info, touched = replies[2 * i], replies[2 * i + 1]
+        if token_info is None:
+            result[token_id] = None
+            continue
+        metrics.incr('token.renew' if touched else 'token.renew_failed')
+        if touched:
+            touched_users.append(token_info['id'])
+        result[token_id] = _token_user_info(token_id, token_info)
+    _user_token_index_touch(touched_users)
+    return result
+
+
+def token_check_multi(token_ids):
+    '''check a batch of tokens, uuid tokens are fetched from memcache with
+    one get_multi and the ones need renew are renewed with one set_multi.
+    malformed uuid token ids are never sent to memcache, one of them would
+    fail the whole get_multi
+    :param token_ids list: token ids to check
+    :return: dict of {token_id: user_info}, user_info is None if expired
+             or malformed
+    '''
+    result = {}
+    unchecked = []
+    for token_id in token_ids:
+        if _is_signed_token(token_id):
+            try:
+                result[token_id] = _signed_token_check(token_id)
+            except UserTokenExpired:
+                result[token_id] = None
+            continue
+        if not uuidutils.is_uuid_like(token_id):
+            LOG.debug("malformed token <%r>" % token_id)
+            result[token_id] = None
+            continue
+        user_info = _token_cache.get(token_id) if _token_cache else None
+        if user_info is not None:
+            result[token_id] = _copy_user_info(user_info)
+        else:
+            unchecked.append(token_id)
+
+    if not unchecked:
+        return result
+    if token_conf['renew_mode'] == TOKEN_RENEW_TOUCH:
+        result.update(_token_check_multi_touch(unchecked))
+        return result
+
+    token_infos = g_context.memclient.get_multi(USER_TOKEN_KEY_PREFIX_MEMCACHE,
+                                                unchecked) or {}
+    renew_infos = {}
+    for token_id in unchecked:
+        token_info = token_infos.get(token_id)
+        if token_info is None:
+            result[token_id] = None
+            continue
+        if _token_need_renew(token_info):
+            token_info['renewed_at'] = int(time.time())
+            renew_infos[token_id] = token_info
+        else:
+            metrics.incr('token.renew_skipped')
+        result[token_id] = _token_user_info(token_id, token_info)
+
+    if renew_infos:
+        if g_context.memclient.set_multi(USER_TOKEN_KEY_PREFIX_MEMCACHE,
+                                         renew_infos):
+            metrics.incr('token.renew', len(renew_infos))
+            _user_token_index_touch([info['id']
+                                     for info in renew_infos.values()])
+        else:
+            LOG.debug("Failed to renew tokens <%s>" % renew_infos.keys())
+            metrics.incr('token.renew_failed', len(renew_infos))
+    return result
+
+
+def _token_user_info(token_id, token_info):
+    '''strip internal fields from token info and cache the result in process
+    :return: user info that can be returned to client
+    '''
+    user_info = dict((k, v) for k, v in token_info.items()
+                     if k not in _TOKEN_INTERNAL_FIELDS)
+    if _token_cache is not None:
+        _token_cache.set(token_id, user_info)
+    return _copy_user_info(user_info)
+
+
+def _copy_user_info(user_info):
+    '''copy user info cached in process with its role list, so a caller
+    changing the result does not change the cached entry
+    '''
+    ret = dict(user_info)
+    if isinstance(ret.get('role'), list):
+        ret['role'] = list(ret['role'])
+    return ret
+
+
+def _is_signed_token(token_id):
+    '''uuid token never contains ".", signed token is "<payload>.<signature>"
+    '''
+    return '.' in token_id
+
+
+def _signed_token_create(user_info):
+    '''create HMAC signed token that carries user info and expire time,
+    so it can be validated without accessing memcache
+    :return: (token_id, payload)
+    '''
+    # iat has sub-second precision, so a token issued right after all
+    # tokens of its user are revoked is not revoked in the same second
+    now = round(time.time(), 3)
+    payload = {
+        "id": user_info['id'],
+        "username": user_info['username'],
+        "type": user_info['type'],
+        "role": user_info['role'],
+        "iat": now,
+        "exp": int(now) + token_conf['signed_lifetime'],
+        "jti": uuidutils.generate_uuid(),
+    }
+    return sign_payload(payload, token_conf['secret']), payload
+
+
+def _signed_token_verify(token_id):
+    '''check signature and expire time of signed token
+    :return: token payload if token is valid else None
+    '''
+    if not token_conf['secret']:
+        return None
+    payload = verify_signed_payload(token_id, token_conf['secret'])
+    if payload is None or payload['exp'] <= time.time():
+        return None
+    return payload
+
+
+def _signed_token_revoked(jti, user_id, iat):
+    '''check whether signed token is revoked by itself or by revoking all
+    tokens of its user
+    '''
+    revoked = _get_revoked_tokens()
+    if jti in revoked['tokens']:
+        return True
+    user_revoked_at = revoked['users'].get(str(user_id))
+    return user_revoked_at is not None and iat <= user_revoked_at
+
+
+def _signed_token_check(token_id):
+    '''check signed token in process, memcache is only accessed when local
+    copy of revoked token set needs refresh
+    :return: user info carried by token
+    '''
+    payload = _signed_token_verify(token_id)
+    if payload is None or _signed_token_revoked(payload['jti'],
+                                                payload['id'],
+                                                payload['iat']):
+        LOG.error("token <%s> has expired" % token_id)
+        raise UserTokenExpired(message='user token has expired')
+    return {
+        "id": payload['id'],
+        "username": payload['username'],
+        "type": payload['type'],
+        "role": payload['role'],
+    }
+
+
+def _get_revoked_tokens():
+    '''get revoked signed tokens, the set is cached in process and reloaded
+    from memcache every revocation_refresh seconds
+    :return: {'tokens': {jti: exp}, 'users': {user_id: revoked_at}}
+    '''
+    now = time.time()
+    if _revoked_cache['refresh_at'] <= now:
+        revoked = g_context.memclient.get(REVOKED_TOKEN_SET_PREFIX_MEMCACHE,
+                                          _REVOKED_SET_KEY)
+        _revoked_cache['revoked'] = revoked or {'tokens': {}, 'users': {}}
+        _revoked_cache['refresh_at'] = now + token_conf['revocation_refresh']
+    return _revoked_cache['revoked']
+
+
+def _revoked_set_update(tokens=None, users=None):
+    '''add entries to revoked token set, entries of tokens that have
+    expired are removed from the set at the same time
+    :param tokens dict: {jti: exp}
+    :param users dict: {user_id: revoked_at}
+    :return: True if success else False
+    '''
+    def _update(revoked):
+        now = time.time()
+        revoked = revoked or {'tokens': {}, 'users': {}}
+        lifetime = token_conf['signed_lifetime']
+        new_revoked = {
+            'tokens': dict((jti, exp) for jti, exp in revoked['tokens'].items()
+                           if exp > now),
+            'users': dict((uid, ts) for uid, ts in revoked['users'].items()
+                          if ts + lifetime > now),
+        }
+        new_revoked['tokens'].update(tokens or {})
+        new_revoked['users'].update(users or {})
+        return new_revoked
+
+    revoked = g_context.memclient.cas_update(REVOKED_TOKEN_SET_PREFIX_MEMCACHE,
+                                             _REVOKED_SET_KEY,
+                                             _update,
+                                             token_conf['signed_lifetime'])
+    if revoked is None:
+        return False
+    _revoked_cache['revoked'] = revoked
+    _revoked_cache['refresh_at'] = time.time() + token_conf['revocation_refresh']
+    return True
+
+
+def _signed_token_revoke(token_id):
+    '''add signed token to revoked token set
+    :return: True if success else False
+    '''
+    payload = _signed_token_verify(token_id)
+    if payload is None:
+        return True
+    return _revoked_set_update(tokens={payload['jti']: payload['exp']})
+
+
+def _user_token_index_add(user_id, entry):
+    '''append token entry to user's token index
+    '''
+    entry += _INDEX_ENTRY_SEP
+    mc = g_context.memclient
+    if mc.append(USER_TOKEN_INDEX_PREFIX_MEMCACHE, user_id, entry):
+        # append keeps expire time of index, give it full timeout again
+        mc.touch(USER_TOKEN_INDEX_PREFIX_MEMCACHE, user_id)
+        _index_touched.set(user_id, True)
+        return
+    # index is too large, drop entries of expired tokens and retry
+    LOG.info("compact token index of user <%s>" % user_id)
+    if _user_token_index_compact(user_id, extra_entry=entry) is None:
+        LOG.error("Failed to add token to index of user <%s>" % user_id)
+
+
+def _user_token_index_touch(user_ids):
+    '''reset expire time of token indexes of users whose tokens are renewed,
+    so an index lives as long as tokens in it. indexes touched by this
+    process within token timeout are skipped, others are touched in one
+    round trip
+    '''
+    pipe = None
+    for user_id in set(user_ids):
+        if _index_touched.get(user_id) is not None:
+            continue
+        _index_touched.set(user_id, True)
+        if pipe is None:
+            pipe = g_context.memclient.pipeline()
+        pipe.touch(USER_TOKEN_INDEX_PREFIX_MEMCACHE, user_id)
+    if pipe is not None:
+        pipe.execute()
+
+
+def _user_token_index_entries(index):
+    '''split index value into entries, duplicated entries are removed
+    '''
+    entries = []
+    for entry in (index or '').split(_INDEX_ENTRY_SEP):
+        if entry and entry not in entries:
+            entries.append(entry)
+    return entries
+
+
+def _user_token_index_sessions(user_id, entries):
+    '''get sessions of alive tokens in index entries
+    :return: dict of {entry: session}
+    '''
+    sessions = {}
+    now = time.time()
+    uuid_entries = []
+    for entry in entries:
+        if _INDEX_SIGNED_SEP not in entry:
+            uuid_entries.append(entry)
+            continue
+        jti, iat, exp = entry.split(_INDEX_SIGNED_SEP)
+        iat, exp = float(iat), int(exp)
+        if exp > now and not _signed_token_revoked(jti, user_id, iat):
+            sessions[entry] = {
+                "session_id": jti,
+                "created_at": int(iat),
+                "expires_at": exp
+            }
+
+    if uuid_entries:
+        token_infos = g_context.memclient.get_multi(
+            USER_TOKEN_KEY_PREFIX_MEMCACHE, uuid_entries)
+        if token_infos is None:
+            # treat all tokens as alive when memcache fails
+            token_infos = dict((t, {}) for t in uuid_entries)
+        timeout = MEMCACHE_KEY_TIMEOUT[USER_TOKEN_KEY_PREFIX_MEMCACHE]
+        for token_id, token_info in token_infos.items():
+            # touched tokens do not record when they were renewed
+            renewed_at = None
+            if token_conf['renew_mode'] != TOKEN_RENEW_TOUCH:
+                renewed_at = token_info.get('renewed_at')
+            sessions[token_id] = {
+                # never expose uuid token itself
+                "session_id": hashlib.sha1(token_id).hexdigest(),
+                "created_at": token_info.get('created_at'),
+                "expires_at": renewed_at + timeout if renewed_at else None
+            }
+    return sessions
+
+
+def _user_token_index_compact(user_id, extra_entry=''):
+    '''remove entries of expired or revoked tokens from user's token index
+    :param extra_entry str: entry appended to index after compaction
+    :return: dict of {entry: session} for alive tokens, None if failed
+    '''
+    mc = g_context.memclient
+    # sessions are read before cas_update, whose callback must not use
+    # the store while the index is being updated
+    entries = _user_token_index_entries(
+        mc.get(USER_TOKEN_INDEX_PREFIX_MEMCACHE, user_id))
+    sessions = _user_token_index_sessions(user_id, entries)
+    dead = set(entries) - set(sessions)
+
+    def _compact(index):
+        # entries added after sessions are read are kept
+        return ''.join(entry + _INDEX_ENTRY_SEP
+                       for entry in _user_token_index_entries(index)
+                       if entry not in dead) + extra_entry
+
+    if mc.cas_update(USER_TOKEN_INDEX_PREFIX_MEMCACHE,
+                     user_id, _compact) is None:
+        return None
+    return sessions
+
+
+def user_token_list(user_id):
+    '''list sessions of user, the index is compacted when more than half of
+    its entries have expired
+    :return: list of {'session_id': '', 'created_at': '', 'expires_at': ''}
+    '''
+    index = g_context.memclient.get(USER_TOKEN_INDEX_PREFIX_MEMCACHE, user_id)
+    entries = _user_token_index_entries(index)
+    sessions = _user_token_index_sessions(user_id, entries)
+    if len(sessions) * 2 < len(entries):
+        sessions = _user_token_index_compact(user_id) or sessions
+    return sorted(sessions.values(), key=lambda s: s['created_at'])
+
+
+def user_token_revoke_all(user_id):
+    '''revoke all tokens of user, used when user is disabled or deleted or
+    password is reset.
+
+    uuid tokens in user's token index are deleted with one delete_multi,
+    signed tokens issued before now are revoked with one entry of revoked
+    token set.
+    :return: True if success else False
+    '''
+    mc = g_context.memclient
+    entries = _user_token_index_entries(
+        mc.get(USER_TOKEN_INDEX_PREFIX_MEMCACHE, user_id))
+    tokens = [e for e in entries if _INDEX_SIGNED_SEP not in e]
+    # tokens are deleted before cas_update, whose callback must not use
+    # the store while the index is being updated. index is kept if they
+    # are not deleted, so revoking again finds them
+    success = not tokens or mc.delete_multi(USER_TOKEN_KEY_PREFIX_MEMCACHE,
+                                            tokens)
+    if success:
+        cleared = set(entries)
+
+        def _clear(index):
+            # entries of tokens created after index is read are kept
+            return ''.join(entry + _INDEX_ENTRY_SEP
+                           for entry in _user_token_index_entries(index)
+                           if entry not in cleared)
+
+        success = mc.cas_update(USER_TOKEN_INDEX_PREFIX_MEMCACHE,
+                                user_id, _clear) is not None
+    else:
+        LOG.error("failed to delete tokens of user <%s>" % user_id)
+    if _token_cache is not None:
+        for token_id in tokens:
+            _token_cache.delete(token_id)
+    if token_conf['secret']:
+        success = _revoked_set_update(users={str(user_id): time.time()})\
+            and success
+    LOG.info("revoke %s tokens of user <%s>" % (len(tokens), user_id))
+    return success
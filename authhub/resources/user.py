@@ -10,19 +10,31 @@
 #
 
 import re
+import threading
 from authhub.db import api as db_api
 from commutils.log import log as logging
 from authhub.common.exception import DBEntryNotExist, IncorrectUserOrPasswd,\
     DBEntryAleadyExist
 from commutils.utils.timeutils import strtime_utc_to_local, utcnow
-from authhub.common.exception import InvalidRequestFormat
-from commutils.utils.secure import gen_hashed_password, validate_hashed_password
+from authhub.common.exception import InvalidRequestFormat,\
+    ActionPermissionDenied
+from commutils.utils.hashpool import gen_hashed_password,\
+    validate_hashed_password, hashed_password_outdated, rehash_password,\
+    get_passwd_hash_pool
+from commutils.utils import metrics
 from authhub.common.constant import RESOURCE_USER, RESOURCE_USER_ROLE,\
-    USER_TYPE_P2P, USER_TYPE_BANK, USER_TYPE_SUPERVISOR
+    USER_TYPE_P2P, USER_TYPE_BANK, USER_TYPE_SUPERVISOR, USER_STATUS_ACTIVE,\
+    USER_STATUS_DISABLED
 from authhub.common.misc import purify_request_params, check_needed_params
 from authhub.db.api import db_get_user_role_list,\
     resource_delete_by_exact_filter
 from authhub.resources.role import get_role_by_rolename
+from authhub.db.query_filter import FILTER_EXACT, FILTER_REGEX, FILTER_SEARCH
+from authhub.resources.fields import select_fields, fields_to_columns,\
+    row_to_dict
+from authhub.db.writebehind import get_last_login_writer
+from authhub.resources.login_throttle import login_throttle_check,\
+    login_failure_record, login_success_record
 from oslo_db.exception import DBReferenceError
 LOG = logging.getLogger(__name__)
 
@@ -32,6 +44,26 @@ def user_create(user_info):
     :param user_info: required user information for registration, dict
     :return: user info
     '''
+    create_params = user_create_params_check(user_info)
+    create_params['password'] = gen_hashed_password(user_info['password'])
+
+    ret = db_api.resource_create(RESOURCE_USER, create_params)
+
+    result = {
+        'id': ret['id'],
+        'username': ret['username'],
+        'type': ret['type'],
+        'status': ret['status']
+    }
+    return result
+
+
+def user_create_params_check(user_info):
+    '''check user information for registration
+    :param user_info: required user information for registration, dict
+    :return: columns of new user row except password hash
+    :raise InvalidRequestFormat: if user information is invalid
+    '''
     check_needed_params(user_info, ['username', 'password', 'type'])
 
     VALID_USER_TYPES = [USER_TYPE_P2P, USER_TYPE_BANK, USER_TYPE_SUPERVISOR]
@@ -41,7 +73,6 @@ def user_create(user_info):
 
     create_params = {
         "username": user_info['username'],
-        "password": gen_hashed_password(user_info['password']),
         "type": user_info['type']
     }
 
@@ -62,58 +93,83 @@ def user_create(user_info):
         raise InvalidRequestFormat("invalid username format, the first letter must be "
                                    "character, others can be either digit, character "
                                    "or underline")
-
-    ret = db_api.resource_create(RESOURCE_USER, create_params)
-
-    result = {
-        'id': ret['id'],
-        'username': ret['username'],
-        'type': ret['type'],
-        'status': ret['status']
-    }
-    return result
-
-
-def user_list(user_filter):
-    '''list all users
-    :returns: selected user info
+    return create_params
+
+
+# filters lists can be selected by, unknown filters are rejected
+_USER_LIST_FILTERS = db_api.compile_filter_spec(RESOURCE_USER, {
+    'username': FILTER_EXACT,
+    'email': FILTER_EXACT,
+    'phone': FILTER_REGEX,
+    'search': (FILTER_SEARCH, 'username'),
+})
+# fields which can be requested, they are columns of users
+_USER_FIELDS = ['id', 'username', 'type', 'privilege', 'phone', 'email',
+                'status', 'description', 'last_login_time', 'created_at',
+                'updated_at']
+_USER_TIME_FIELDS = ['last_login_time', 'created_at', 'updated_at']
+_USER_LIST_FIELDS = ['id', 'username', 'type', 'status', 'created_at']
+# role is read with another query, only if it is requested
+_USER_DETAIL_FIELDS = _USER_FIELDS + ['role']
+
+
+def user_list(user_filter, limit, marker=None, fields=None):
+    '''list users newest first, a page at a time
+    :param limit int: page size
+    :param marker str: marker of previous page, None for first page
+    :param fields list: fields of users to return, id, username, type,
+                        status and created_at if not given
+    :returns: (selected user info, marker of next page or None)
     '''
-    ulist_ret = []
-    purify_request_params(user_filter, ['username', 'role', 'phone', 'email'])
-    exact_match_filter_names = ['username', 'role', 'email']
-
-    ret = db_api.get_by_all_filters(RESOURCE_USER,
-                                    user_filter,
-                                    exact_match_filter_names = exact_match_filter_names)
-
-    for uinfo in ret:
-        uitem = {
-            'id': uinfo.id,
-            'username': uinfo.username,
-            'type': uinfo.type,
-            'status': uinfo.status,
-            'created_at': strtime_utc_to_local(uinfo.created_at)
-        }
-        ulist_ret.append(uitem)
-
-    return ulist_ret
+    fields = select_fields(fields, _USER_FIELDS, _USER_LIST_FIELDS)
+
+    ret, next_marker = db_api.get_page_by_all_filters(
+        RESOURCE_USER,
+        user_filter,
+        limit,
+        marker,
+        filter_spec=_USER_LIST_FILTERS,
+        columns=fields,
+        use_slave=True)
+
+    return ([row_to_dict(uinfo, fields, _USER_TIME_FIELDS) for uinfo in ret],
+            next_marker)
+
+
+def user_list_stream(user_filter, fields=None):
+    '''list all selected users newest first, they are read from database
+    in chunks while result is iterated
+    :param fields list: fields of users to return, as user_list
+    :returns: iterator of selected user info
+    '''
+    fields = select_fields(fields, _USER_FIELDS, _USER_LIST_FIELDS)
+    ret = db_api.iter_by_all_filters(
+        RESOURCE_USER,
+        user_filter,
+        filter_spec=_USER_LIST_FILTERS,
+        columns=fields,
+        use_slave=True)
+    return (row_to_dict(uinfo, fields, _USER_TIME_FIELDS) for uinfo in ret)
 
 
-def get_user_by_username(username):
+def get_user_by_username(username, fields=None, use_slave=False):
     '''get user detailed info by username
     '''
-    return _user_detail(username, 'username')
+    return _user_detail(username, 'username', fields, use_slave)
 
 
-def get_user_by_id(user_id):
+def get_user_by_id(user_id, fields=None, use_slave=False):
     '''get user detailed info by user_id
     '''
-    return _user_detail(user_id)
+    return _user_detail(user_id, fields=fields, use_slave=use_slave)
 
 
-def _user_detail(query_obj, query_type='id'):
+def _user_detail(query_obj, query_type='id', fields=None, use_slave=False):
     '''get user detailed information
     :param query_obj str: either id or username
+    :param fields list: fields of user to return, all if not given
+    :param use_slave bool: read from replicas, only when no write depends
+                           on the result
     '''
     query_filter = {}
     # we can get user by id or username
@@ -124,27 +180,22 @@ def _user_detail(query_obj, query_type='id'):
     else:
         return None
 
+    fields = select_fields(fields, _USER_DETAIL_FIELDS, _USER_DETAIL_FIELDS)
+    # roles are looked up by user id
+    columns = fields_to_columns(fields, relations=['role'],
+                                needed=['id'] if 'role' in fields else [])
     try:
         ret = db_api.get_resource_by_exact_filter(RESOURCE_USER,
-                                                  query_filter)
+                                                  query_filter,
+                                                  use_slave=use_slave,
+                                                  columns=columns)
     except DBEntryNotExist:
         raise DBEntryNotExist('the user you queried does not exist')
 
-    user_info = {
-        "id": ret.id,
-        "username": ret.username,
-        'type': ret.type,
-        "privilege": ret.privilege,
-        "phone": ret.phone,
-        "email": ret.email,
-        "status": ret.status,
-        "description": ret.description,
-        "last_login_time": strtime_utc_to_local(ret.last_login_time),
-        "created_at": strtime_utc_to_local(ret.created_at),
-        "updated_at": strtime_utc_to_local(ret.updated_at)
-    }
-
-    user_info["role"] = user_role_list(ret.id)
+    user_info = row_to_dict(ret, [f for f in fields if f != 'role'],
+                            _USER_TIME_FIELDS)
+    if 'role' in fields:
+        user_info["role"] = user_role_list(ret.id, use_slave)
     return user_info
 
 
@@ -158,9 +209,10 @@ def user_basic_update(user_id, user_info):
 
 
 def user_role_grant(user_id, rolename):
-    '''update user's role and privilege
+    '''update user's role and privilege, role is looked up on primary since
+    it may be created just before
     '''
-    role_info = get_role_by_rolename(rolename)
+    role_info = get_role_by_rolename(rolename, fields=['id'])
     role_id = role_info['id']
 
     grant_params = {
@@ -197,10 +249,10 @@ def user_role_revoke(user_id, role_id):
                                     )
 
 
-def user_role_list(user_id):
+def user_role_list(user_id, use_slave=False):
     '''return user's role list
     '''
-    ret = db_get_user_role_list(user_id)
+    ret = db_get_user_role_list(user_id, use_slave=use_slave)
     user_role_list = [ r['role'].name for r in ret]
     return user_role_list
 
@@ -211,14 +263,29 @@ def user_password_update(user_id, user_pass):
     if not user_pass:
         raise InvalidRequestFormat('please input the new password for user')
     # check new password strength
-    return _user_update(user_id, {"password": gen_hashed_password(user_pass)})
+    result = _user_update(user_id, {"password": gen_hashed_password(user_pass)})
+    _user_token_revoke_all(user_id)
+    return result
+
+
+def user_status_update(user_id, status):
+    '''enable or disable user, all tokens of user are revoked when disabled
+    '''
+    VALID_USER_STATUS = [USER_STATUS_ACTIVE, USER_STATUS_DISABLED]
+    if status not in VALID_USER_STATUS:
+        raise InvalidRequestFormat('Invalid user status, must be one of %s'
+                                   % VALID_USER_STATUS)
+    result = _user_update(user_id, {'status': status})
+    if status != USER_STATUS_ACTIVE:
+        _user_token_revoke_all(user_id)
+    return result
 
 
 def user_lastlogin_time_update(user_id):
-    '''update user's last login time
+    '''record user's last login time, it is written to database later by
+    write-behind queue so login does not wait for it
     '''
-    last_login_time = utcnow()
-    return _user_update(user_id, {'last_login_time': last_login_time})
+    get_last_login_writer().record(user_id, utcnow())
 
 
 def _user_update(user_id, user_info, valid_params=None):
@@ -242,6 +309,16 @@ def user_delete(user_id):
     '''delete user
     '''
     db_api.resource_delete(RESOURCE_USER, user_id)
+    _user_token_revoke_all(user_id)
+
+
+def _user_token_revoke_all(user_id):
+    '''revoke all tokens of user
+    '''
+    # token resource depends on user resource, import it here
+    from authhub.resources.token import user_token_revoke_all
+    if not user_token_revoke_all(user_id):
+        LOG.error("Failed to revoke tokens of user <%s>" % user_id)
 
 
 def user_password_validate(user_id, input_password):
@@ -256,6 +333,88 @@ def user_password_validate(user_id, input_password):
                                                   {'id': user_id})
     except DBEntryNotExist:
         raise IncorrectUserOrPasswd()
-    user_pass = ret.password
+    _user_password_check(user_id, ret.password, input_password)
+
+
+def _user_password_check(user_id, user_pass, input_password):
+    '''check input password against user's password hash, the hash is
+    updated in background if it has a lower cost factor and hash pool is
+    not busy with other requests
+    '''
     if not validate_hashed_password(input_password, user_pass):
         raise IncorrectUserOrPasswd()
+    if hashed_password_outdated(user_pass) and \
+            get_passwd_hash_pool().idle():
+        _user_password_rehash_async(user_id, input_password, user_pass)
+
+
+def user_authenticate(username, input_password, source_ip=None):
+    '''check username and password of login, user and roles are read with
+    one query. failed logins are throttled per username and source ip
+    :return: user info cached with token
+    :raise LoginLocked: if username or source ip is locked out, password
+                        is not checked then
+    :raise IncorrectUserOrPasswd: if user does not exist or password is
+                                  incorrect
+    :raise ActionPermissionDenied: if user is disabled
+    '''
+    login_throttle_check(username, source_ip)
+    try:
+        ret, roles = db_api.db_get_user_auth_info(username)
+    except DBEntryNotExist:
+        login_failure_record(username, source_ip)
+        raise IncorrectUserOrPasswd()
+    if ret.status != USER_STATUS_ACTIVE:
+        raise ActionPermissionDenied('user has been disabled')
+    try:
+        _user_password_check(ret.id, ret.password, input_password)
+    except IncorrectUserOrPasswd:
+        login_failure_record(username, source_ip)
+        raise
+    login_success_record(username)
+    return {
+        "id": ret.id,
+        "username": ret.username,
+        "type": ret.type,
+        "role": roles,
+        "email": ret.email,
+        "description": ret.description,
+    }
+
+
+# users whose password is being rehashed
+_rehashing_users = set()
+_rehashing_lock = threading.Lock()
+
+
+def _user_password_rehash_async(user_id, password, old_hash):
+    '''rehash user's password with current cost factor in background, login
+    does not wait for it. it is retried on next login if it fails
+    '''
+    with _rehashing_lock:
+        if user_id in _rehashing_users:
+            return
+        _rehashing_users.add(user_id)
+    worker = threading.Thread(target=_user_password_rehash,
+                              args=(user_id, password, old_hash),
+                              name='passwd-rehash')
+    worker.setDaemon(True)
+    worker.start()
+
+
+def _user_password_rehash(user_id, password, old_hash):
+    try:
+        new_hash = rehash_password(password)
+        if new_hash is None:
+            # hash pool is busy with requests, it is retried on next login
+            metrics.incr('passwd_hash.rehash_skipped')
+            return
+        if db_api.db_user_password_rehash(user_id, old_hash, new_hash):
+            metrics.incr('passwd_hash.rehashed')
+    except Exception, e:
+        metrics.incr('passwd_hash.rehash_failed')
+        LOG.error("failed to rehash password of user <%s>: %s"
+                  % (user_id, e))
+    finally:
+        with _rehashing_lock:
+            _rehashing_users.discard(user_id)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''bulk user import from a stream of JSON lines or CSV. rows are checked
+like user_create, passwords of a batch are hashed across hash pool and
+its users are inserted with one multi-row statement. each row gets its own
+result, a failed row does not abort others
+'''
+
+import csv
+from oslo_db import exception as db_exc
+from authhub.db import api as db_api
+from authhub.common.constant import RESOURCE_USER
+from authhub.common.exception import InvalidRequestFormat,\
+    DBEntryAleadyExist
+from authhub.resources.user import user_create_params_check
+from commutils.exception import ZenException
+from commutils.conf.gconf import get_user_import_conf
+from commutils.log import log as logging
+from commutils.utils import jsonutils
+from commutils.utils import metrics
+from commutils.utils.hashpool import gen_hashed_passwords
+
+LOG = logging.getLogger(__name__)
+
+IMPORT_FORMAT_JSONL = 'jsonl'
+IMPORT_FORMAT_CSV = 'csv'
+IMPORT_FORMATS = [IMPORT_FORMAT_JSONL, IMPORT_FORMAT_CSV]
+
+
+def _jsonl_rows(stream):
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            user_info = jsonutils.loads(line)
+        except ValueError, e:
+            yield line_no, InvalidRequestFormat('invalid JSON: %s' % e)
+            continue
+        if not isinstance(user_info, dict):
+            yield line_no, InvalidRequestFormat('user must be a JSON object')
+            continue
+        yield line_no, user_info
+
+
+def _csv_rows(stream):
+    # first line is the header with column names
+    reader = csv.DictReader(stream)
+    try:
+        for row in reader:
+            # empty cells are missing values
+            yield reader.line_num, dict(
+                (k, v.decode('utf-8')) for k, v in row.items()
+                if k and v)
+    except (csv.Error, UnicodeDecodeError), e:
+        yield reader.line_num, InvalidRequestFormat('invalid CSV: %s' % e)
+
+
+def user_import_rows(stream, fmt=IMPORT_FORMAT_JSONL):
+    '''parse users from stream lazily
+    :param fmt str: jsonl, one JSON object per line, or csv with a header
+    :return: iterator of (line number, user info dict or error)
+    '''
+    if fmt not in IMPORT_FORMATS:
+        raise InvalidRequestFormat('import format must be one of %s'
+                                   % IMPORT_FORMATS)
+    if fmt == IMPORT_FORMAT_CSV:
+        return _csv_rows(stream)
+    return _jsonl_rows(stream)
+
+
+def _row_error(line_no, user_info, e):
+    metrics.incr('user_import.failed')
+    result = {'line': line_no, 'error': getattr(e, 'message', None) or
+              str(e)}
+    if isinstance(e, ZenException):
+        result['error_code'] = e.error_code
+    if isinstance(user_info, dict) and user_info.get('username'):
+        result['username'] = user_info['username']
+    return result
+
+
+def _row_created(line_no, username, user_id):
+    metrics.incr('user_import.created')
+    return {'line': line_no, 'username': username, 'id': user_id}
+
+
+def _batch_failed(rows, results, pending, e):
+    '''
+        a failure of the whole batch, like database or hash pool errors,
+        fails its pending rows only, so other batches are still imported
+        @param pending: list of (index of row, user info, create params)
+        @return: results
+    '''
+    LOG.exception("failed to import a batch of %s users: %s"
+                  % (len(pending), e))
+    for i, user_info, _ in pending:
+        results[i] = _row_error(rows[i][0], user_info, e)
+    return results
+
+
+def _user_import_batch(rows):
+    '''
+        @param rows: list of (line number, user info or error)
+        @return: list of row results in the order of rows
+    '''
+    results = [None] * len(rows)
+    valid = []
+    usernames = set()
+    for i, (line_no, user_info) in enumerate(rows):
+        if isinstance(user_info, Exception):
+            results[i] = _row_error(line_no, None, user_info)
+            continue
+        try:
+            for k in ['username', 'password']:
+                if not isinstance(user_info.get(k), basestring):
+                    raise InvalidRequestFormat('%s must be a string' % k)
+            create_params = user_create_params_check(user_info)
+            if create_params['username'] in usernames:
+                raise DBEntryAleadyExist(message='%s already exists'
+                                         % RESOURCE_USER)
+        except ZenException, e:
+            results[i] = _row_error(line_no, user_info, e)
+            continue
+        usernames.add(create_params['username'])
+        valid.append((i, user_info, create_params))
+
+    try:
+        existing = db_api.db_get_user_ids_by_names(list(usernames))
+    except Exception, e:
+        return _batch_failed(rows, results, valid, e)
+    new_users = []
+    for i, user_info, create_params in valid:
+        if create_params['username'] in existing:
+            results[i] = _row_error(rows[i][0], user_info, DBEntryAleadyExist(
+                message='%s already exists' % RESOURCE_USER))
+        else:
+            new_users.append((i, user_info, create_params))
+    if not new_users:
+        return results
+
+    try:
+        hashes = gen_hashed_passwords([u['password']
+                                       for _, u, _ in new_users])
+    except Exception, e:
+        # hash pool is busy or broken, like PasswdHashBusy or a timeout
+        return _batch_failed(rows, results, new_users, e)
+    for (_, _, create_params), hashed in zip(new_users, hashes):
+        create_params['password'] = hashed
+
+    try:
+        user_ids = db_api.db_users_bulk_create(
+            [create_params for _, _, create_params in new_users])
+    except (DBEntryAleadyExist, db_exc.DBError), e:
+        # a user created meanwhile or a bad row fails the whole statement,
+        # insert rows one by one to find it
+        LOG.warning("bulk insert of %s users failed, insert them one by "
+                    "one: %s" % (len(new_users), e))
+        user_ids = {}
+        for i, user_info, create_params in new_users:
+            try:
+                ret = db_api.resource_create(RESOURCE_USER, create_params)
+                user_ids[ret.username] = ret.id
+            except (ZenException, db_exc.DBError), e:
+                results[i] = _row_error(rows[i][0], user_info, e)
+
+    for i, _, create_params in new_users:
+        if results[i] is None:
+            username = create_params['username']
+            results[i] = _row_created(rows[i][0], username,
+                                      user_ids.get(username))
+    return results
+
+
+def user_import(stream, fmt=IMPORT_FORMAT_JSONL, max_rows=None):
+    '''import users from stream in batches
+    :param fmt str: jsonl or csv
+    :param max_rows int: rows after max_rows are not imported
+    :return: iterator of row results, results of a batch are yielded once
+             it is imported
+            ::
+
+                {'line': LINE_NO, 'username': USER_NAME, 'id': USER_ID}
+                {'line': LINE_NO, 'username': USER_NAME,
+                 'error_code': ERROR_CODE, 'error': ERROR_MESSAGE}
+    '''
+    batch_size = get_user_import_conf()['batch_size']
+    batch = []
+    count = 0
+    for line_no, user_info in user_import_rows(stream, fmt):
+        count += 1
+        if max_rows and count > max_rows:
+            error = InvalidRequestFormat('at most %s users can be imported '
+                                         'at a time' % max_rows)
+            batch.append((line_no, error))
+            break
+        batch.append((line_no, user_info))
+        if len(batch) >= batch_size:
+            for result in _user_import_batch(batch):
+                yield result
+            batch = []
+    if batch:
+        for result in _user_import_batch(batch):
+            yield result
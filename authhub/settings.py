@@ -50,6 +50,8 @@ INSTALLED_APPS = (
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    # management commands of authhub
+    'authhub',
 )
 
 MIDDLEWARE_CLASSES = (
@@ -40,3 +40,7 @@ application = get_wsgi_application()
 from commutils.log import log as logging
 from commutils.conf.gconf import get_log_conf
 logging.setup(get_log_conf(), "authhub")
+
+# list bcrypt cost factor in stats before first login
+from commutils.utils.hashpool import get_bcrypt_rounds
+get_bcrypt_rounds()
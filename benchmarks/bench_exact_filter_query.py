@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''python side cost of exact filter lookups (user by id, user by name,
+role by name and login) when query is built and compiled on every call vs
+baked queries which are built once per filter shape. an in memory sqlite
+table of a few rows keeps database time out of it
+
+usage: DJANGO_SETTINGS_MODULE=authhub.settings PYTHONPATH=. \\
+           python benchmarks/bench_exact_filter_query.py [--count N]
+'''
+
+import argparse
+import time
+from oslo_db.sqlalchemy import session as db_session
+from sqlalchemy import and_
+from authhub.common.constant import RESOURCE_USER, RESOURCE_ROLE
+from authhub.db import api as db_api
+from authhub.db import model_base
+from authhub.db.models.authmodel import Users, Roles, UserRole
+
+
+def setup():
+    db_api._ENGINE_FACADE = db_session.EngineFacade('sqlite://')
+    db_api.db_config['db_replicas'] = []
+    engine = db_api.get_engine()
+    model_base.BASE.metadata.create_all(engine)
+    engine.execute(Users.__table__.insert(), [
+        {'username': 'bench%d' % i, 'password': 'x', 'type': 'p2p',
+         'deleted': 0} for i in xrange(10)])
+    engine.execute(Roles.__table__.insert(), [
+        {'name': 'role%d' % i, 'deleted': 0} for i in xrange(3)])
+    engine.execute(UserRole.__table__.insert(), [
+        {'user_id': 1, 'role_id': i, 'deleted': 0} for i in xrange(1, 4)])
+
+
+def unbaked_exact_filter(resource_name, exact_filter):
+    # query building of get_resource_by_exact_filter before baked queries
+    session = db_api.get_session()
+    dbmodel = db_api.get_dbmodel_for_resource(resource_name)
+    return db_api.model_query(dbmodel, session=session).\
+        filter_by(**exact_filter).first()
+
+
+def unbaked_auth_info(username):
+    session = db_api.get_session()
+    return db_api.model_query(Users, session=session,
+                              args=(Users, Roles.name)).\
+        outerjoin(UserRole, and_(UserRole.user_id == Users.id,
+                                 UserRole.deleted == 0)).\
+        outerjoin(Roles, Roles.id == UserRole.role_id).\
+        filter(Users.username == username).\
+        order_by(UserRole.created_at, UserRole.role_id).all()
+
+
+def timed(func, count):
+    func()
+    start = time.time()
+    for _ in xrange(count):
+        func()
+    return (time.time() - start) * 1e6 / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=5000)
+    args = parser.parse_args()
+    setup()
+    cases = [
+        ('user by id',
+         lambda: unbaked_exact_filter(RESOURCE_USER, {'id': 5}),
+         lambda: db_api.get_resource_by_exact_filter(RESOURCE_USER,
+                                                     {'id': 5})),
+        ('user by name',
+         lambda: unbaked_exact_filter(RESOURCE_USER,
+                                      {'username': 'bench5'}),
+         lambda: db_api.get_resource_by_exact_filter(
+             RESOURCE_USER, {'username': 'bench5'})),
+        ('role by name',
+         lambda: unbaked_exact_filter(RESOURCE_ROLE, {'name': 'role1'}),
+         lambda: db_api.get_resource_by_exact_filter(RESOURCE_ROLE,
+                                                     {'name': 'role1'})),
+        ('login',
+         lambda: unbaked_auth_info('bench0'),
+         lambda: db_api.db_get_user_auth_info('bench0')),
+    ]
+    print '%-14s %12s %12s' % ('lookup', 'unbaked us', 'baked us')
+    for name, unbaked, baked in cases:
+        print '%-14s %12.1f %12.1f' % (name, timed(unbaked, args.count),
+                                       timed(baked, args.count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''python side cost of building a user list query from request filters
+with the match filter walkers vs a filter spec compiled at import. the
+query is built and compiled to sql but not executed
+
+usage: DJANGO_SETTINGS_MODULE=authhub.settings PYTHONPATH=. \\
+           python benchmarks/bench_filter_spec.py [--count N]
+'''
+
+import argparse
+import time
+from oslo_db.sqlalchemy import session as db_session
+from authhub.common.constant import RESOURCE_USER
+from authhub.db import api as db_api
+from authhub.resources import user
+
+
+def setup():
+    db_api._ENGINE_FACADE = db_session.EngineFacade('sqlite://')
+    db_api.db_config['db_replicas'] = []
+
+
+def build(filters, **kwargs):
+    query = db_api.get_queryobj_by_all_filters(
+        RESOURCE_USER, dict(filters), sort_keys=['created_at', 'id'],
+        columns=user._USER_LIST_FIELDS, **kwargs)
+    return query.statement.compile()
+
+
+def timed(func, count):
+    func()
+    start = time.time()
+    for _ in xrange(count):
+        func()
+    return (time.time() - start) * 1e6 / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=5000)
+    args = parser.parse_args()
+    setup()
+    cases = [
+        ('none', {}),
+        ('username', {'username': 'bench5'}),
+        ('email in', {'email': ['a@esse.io', 'b@esse.io']}),
+        ('all three', {'username': 'bench5', 'email': 'a@esse.io',
+                       'phone': '^138'}),
+    ]
+    print '%-12s %12s %12s' % ('filters', 'walkers us', 'spec us')
+    for name, filters in cases:
+        walkers = timed(lambda: build(
+            filters, exact_match_filter_names=['username', 'email']),
+            args.count)
+        spec = timed(lambda: build(
+            filters, filter_spec=user._USER_LIST_FILTERS), args.count)
+        print '%-12s %12.1f %12.1f' % (name, walkers, spec)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''percentage of token keys that move to another memcache node when one node
+is added or removed, modulo hashing of python-memcached vs consistent hashing
+
+usage: PYTHONPATH=. python benchmarks/bench_hashring.py [KEY_COUNT]
+'''
+
+import sys
+import memcache
+from commutils.utils import uuidutils
+from commutils.cache.hashring import HashRing
+from commutils.cache.constants import USER_TOKEN_KEY_PREFIX_MEMCACHE
+
+
+def modulo_nodes(nodes, keys):
+    return [nodes[memcache.serverHashFunction(k) % len(nodes)] for k in keys]
+
+
+def ring_nodes(nodes, keys):
+    ring = HashRing(nodes)
+    return [nodes[ring.get_node(k)] for k in keys]
+
+
+def moved_percent(before, after):
+    moved = sum(1 for b, a in zip(before, after) if b != a)
+    return 100.0 * moved / len(before)
+
+
+def main():
+    key_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    keys = ['%s.%s' % (USER_TOKEN_KEY_PREFIX_MEMCACHE, uuidutils.generate_uuid())
+            for _ in xrange(key_count)]
+    nodes = ['10.0.0.%d:11211' % i for i in range(1, 5)]
+    changes = [
+        ('add node (4 -> 5)', nodes, nodes + ['10.0.0.5:11211']),
+        ('remove node (4 -> 3)', nodes, nodes[:-1]),
+    ]
+    print '%-24s %12s %12s' % ('change', 'modulo', 'ketama')
+    for name, before, after in changes:
+        modulo = moved_percent(modulo_nodes(before, keys),
+                               modulo_nodes(after, keys))
+        ketama = moved_percent(ring_nodes(before, keys),
+                               ring_nodes(after, keys))
+        print '%-24s %11.1f%% %11.1f%%' % (name, modulo, ketama)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''time of user list pages at increasing depth, with OFFSET vs keyset
+pagination on (created_at, id). tables are created in the database, use a
+scratch one
+
+usage: DJANGO_SETTINGS_MODULE=authhub.settings PYTHONPATH=. \\
+           python benchmarks/bench_list_pagination.py [--db-url sqlite://] \\
+           [--count N] [--limit L] [--repeat R]
+'''
+
+import argparse
+import datetime
+import time
+from oslo_db.sqlalchemy import session as db_session
+from authhub.common.constant import RESOURCE_USER
+from authhub.db import api as db_api
+from authhub.db import model_base
+from authhub.db.models.authmodel import Users
+
+
+def setup(db_url, count):
+    db_api._ENGINE_FACADE = db_session.EngineFacade(db_url)
+    db_api.db_config['db_replicas'] = []
+    engine = db_api.get_engine()
+    model_base.BASE.metadata.create_all(engine)
+    start = datetime.datetime(2016, 1, 1)
+    rows = [{'username': 'page%07d' % i, 'password': 'x', 'type': 'p2p',
+             'deleted': 0, 'created_at': start + datetime.timedelta(
+                 seconds=i // 2)}
+            for i in xrange(count)]
+    engine.execute(Users.__table__.insert(), rows)
+
+
+def offset_page(limit, pageno):
+    session = db_api.get_session()
+    return session.query(Users).filter(Users.deleted == 0)\
+        .order_by(Users.created_at.desc(), Users.id.desc())\
+        .offset((pageno - 1) * limit).limit(limit).all()
+
+
+def markers(limit, pagenos):
+    '''
+        @return: {page number: marker of that page}
+    '''
+    ret = {1: None}
+    marker = None
+    for pageno in xrange(2, max(pagenos) + 1):
+        _, marker = db_api.get_page_by_all_filters(RESOURCE_USER, {}, limit,
+                                                   marker)
+        if pageno in pagenos:
+            ret[pageno] = marker
+    return ret
+
+
+def timed(func, repeat):
+    start = time.time()
+    for _ in xrange(repeat):
+        func()
+    return (time.time() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-url', default='sqlite://')
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    setup(args.db_url, args.count)
+    last = args.count // args.limit
+    pagenos = sorted(set([1, 2, last // 10, last // 2, last]))
+    page_markers = markers(args.limit, pagenos)
+    print '%8s %12s %12s' % ('page', 'offset ms', 'keyset ms')
+    for pageno in pagenos:
+        offset_ms = timed(lambda: offset_page(args.limit, pageno),
+                          args.repeat)
+        keyset_ms = timed(lambda: db_api.get_page_by_all_filters(
+            RESOURCE_USER, {}, args.limit, page_markers[pageno]),
+            args.repeat)
+        print '%8d %12.2f %12.2f' % (pageno, offset_ms, keyset_ms)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''cpu time and memory per row of user list loading Users model objects vs
+selecting only listed columns as named tuples. each mode runs in its own
+process against a sqlite file, which is filled with --count users if it
+does not exist
+
+usage: DJANGO_SETTINGS_MODULE=authhub.settings PYTHONPATH=. \\
+           python benchmarks/bench_list_projection.py [--db-file PATH] \\
+           [--count N] [--repeat R]
+'''
+
+import argparse
+import datetime
+import gc
+import os
+import resource
+import subprocess
+import sys
+import time
+from oslo_db.sqlalchemy import session as db_session
+from authhub.common.constant import RESOURCE_USER
+from authhub.db import api as db_api
+from authhub.db import model_base
+from authhub.db.models.authmodel import Users
+from authhub.resources import user
+from authhub.resources.fields import row_to_dict
+
+
+def setup(db_file, count):
+    exists = os.path.exists(db_file)
+    db_api._ENGINE_FACADE = db_session.EngineFacade('sqlite:///' + db_file)
+    db_api.db_config['db_replicas'] = []
+    if exists:
+        return
+    engine = db_api.get_engine()
+    model_base.BASE.metadata.create_all(engine)
+    start = datetime.datetime(2016, 1, 1)
+    for base in xrange(0, count, 10000):
+        engine.execute(Users.__table__.insert(), [
+            {'username': 'proj%07d' % i, 'password': 'x' * 60,
+             'type': 'p2p', 'email': 'proj%d@esse.io' % i,
+             'phone': '1380000%04d' % (i % 10000),
+             'description': 'imported user', 'deleted': 0,
+             'created_at': start + datetime.timedelta(seconds=i)}
+            for i in xrange(base, min(base + 10000, count))])
+
+
+def list_users(columns):
+    rows = db_api.get_by_all_filters(RESOURCE_USER, {},
+                                     sort_keys=['created_at', 'id'],
+                                     columns=columns)
+    return rows, [row_to_dict(row, user._USER_LIST_FIELDS,
+                              user._USER_TIME_FIELDS) for row in rows]
+
+
+def run(mode, repeat):
+    columns = user._USER_LIST_FIELDS if mode == 'columns' else None
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rows, items = list_users(columns)
+    # ru_maxrss is in KB on linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    count = len(rows)
+    del rows, items
+    gc.collect()
+    start = time.clock()
+    for _ in xrange(repeat):
+        list_users(columns)
+    cpu = time.clock() - start
+    print '%-8s %8.2f us/row cpu  %8.0f bytes/row' % (
+        mode, cpu * 1e6 / repeat / count, rss * 1024.0 / count)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-file', default='/tmp/bench_list_projection.db')
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--mode', choices=['entities', 'columns'])
+    args = parser.parse_args()
+    setup(args.db_file, args.count)
+    if args.mode:
+        run(args.mode, args.repeat)
+        return
+    for mode in ['entities', 'columns']:
+        subprocess.check_call([sys.executable, __file__, '--db-file',
+                               args.db_file, '--repeat', str(args.repeat),
+                               '--mode', mode])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''peak memory of listing all users in one json response vs streaming
+them in chunks. each mode runs in its own process against a sqlite file,
+which is filled with --count users if it does not exist
+
+usage: DJANGO_SETTINGS_MODULE=authhub.settings PYTHONPATH=. \\
+           python benchmarks/bench_list_stream.py [--db-file PATH] \\
+           [--count N]
+'''
+
+import argparse
+import datetime
+import os
+import resource
+import subprocess
+import sys
+import time
+import django
+from oslo_db.sqlalchemy import session as db_session
+from authhub.db import api as db_api
+from authhub.db import model_base
+from authhub.db.models.authmodel import Users
+
+
+def setup(db_file, count):
+    exists = os.path.exists(db_file)
+    db_api._ENGINE_FACADE = db_session.EngineFacade('sqlite:///' + db_file)
+    db_api.db_config['db_replicas'] = []
+    if exists:
+        return
+    engine = db_api.get_engine()
+    model_base.BASE.metadata.create_all(engine)
+    start = datetime.datetime(2016, 1, 1)
+    for base in xrange(0, count, 10000):
+        engine.execute(Users.__table__.insert(), [
+            {'username': 'stream%07d' % i, 'password': 'x' * 60,
+             'type': 'p2p', 'deleted': 0,
+             'created_at': start + datetime.timedelta(seconds=i)}
+            for i in xrange(base, min(base + 10000, count))])
+
+
+def run(mode):
+    from authhub.common.misc import json_response, streaming_json_response
+    from authhub.resources.user import user_list, user_list_stream
+    start = time.time()
+    if mode == 'all':
+        # all rows in one page, as lists were returned before paging
+        result, _ = user_list({}, 1 << 30)
+        size = len(json_response(result).content)
+    else:
+        response = streaming_json_response(user_list_stream({}))
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    # ru_maxrss is in KB on linux
+    print '%-8s %8.1f MB peak rss  %8.1f MB body  %6.2f s' % (
+        mode, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        size / 1048576.0, time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-file', default='/tmp/bench_list_stream.db')
+    parser.add_argument('--count', type=int, default=500000)
+    parser.add_argument('--mode', choices=['all', 'stream'])
+    args = parser.parse_args()
+    django.setup()
+    setup(args.db_file, args.count)
+    if args.mode:
+        run(args.mode)
+        return
+    for mode in ['all', 'stream']:
+        subprocess.check_call([sys.executable, __file__, '--db-file',
+                               args.db_file, '--mode', mode])
+
+
+if __name__ == '__main__':
+    main()
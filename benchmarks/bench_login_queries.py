@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''database queries and latency of login lookup, the previous flow
+(get_user_by_username, user_password_validate and user_role_list) vs
+user_authenticate, which reads user and roles with one query. token
+creation is not included. bcrypt runs with the cheapest cost factor so
+timings are dominated by queries, --rtt-ms adds network round trip time
+to each statement. tables are created in the database, use a scratch one
+
+usage: DJANGO_SETTINGS_MODULE=authhub.settings PYTHONPATH=. \\
+           python benchmarks/bench_login_queries.py \\
+           [--db-url sqlite://] [--count N] [--rtt-ms MS]
+'''
+
+import argparse
+import time
+from oslo_db.sqlalchemy import session as db_session
+from sqlalchemy import event
+from authhub.db import api as db_api
+from authhub.db import model_base
+from authhub.db.models.authmodel import Users, Roles, UserRole
+from authhub.resources import user
+from commutils.utils import hashpool
+from commutils.utils import secure
+
+USERS = 100
+ROLES = ['supervisor', 'p2p', 'bank']
+
+
+def setup(db_url, rtt_ms):
+    '''
+        @return: list of executed statements, one item per statement
+    '''
+    db_api._ENGINE_FACADE = db_session.EngineFacade(db_url)
+    engine = db_api.get_engine()
+    model_base.BASE.metadata.create_all(engine)
+    statements = []
+
+    def before_execute(conn, cursor, statement, params, context, many):
+        # connection checkout is pinged with SELECT 1, it is a round trip
+        # but not a query of login
+        if statement != 'SELECT 1':
+            statements.append(1)
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000.0)
+    event.listen(engine, 'before_cursor_execute', before_execute)
+
+    hashpool._bcrypt_rounds = hashpool.BCRYPT_MIN_ROUNDS
+    hashed = secure.gen_hashed_password(u'password',
+                                        hashpool.BCRYPT_MIN_ROUNDS)
+    session = db_api.get_session()
+    with session.begin():
+        roles = [Roles(name=name) for name in ROLES]
+        session.add_all(roles)
+        session.flush()
+        for i in range(USERS):
+            row = Users(username='bench%d' % i, password=hashed, type='p2p',
+                        email='bench%d@esse.io' % i, status='ACTIVE')
+            session.add(row)
+            session.flush()
+            for role in roles[:i % len(roles) + 1]:
+                session.add(UserRole(user_id=row.id, role_id=role.id))
+    return statements
+
+
+def login_before(username, password):
+    ret = user.get_user_by_username(username)
+    if ret['status'] != 'ACTIVE':
+        raise Exception('user has been disabled')
+    user.user_password_validate(ret['id'], password)
+    return {
+        "id": ret['id'],
+        "username": ret['username'],
+        "type": ret['type'],
+        "role": user.user_role_list(ret['id']),
+        "email": ret['email'],
+        "description": ret['description'],
+    }
+
+
+def login_after(username, password):
+    return user.user_authenticate(username, password)
+
+
+def bench(name, login, count, statements):
+    del statements[:]
+    latencies = []
+    for i in xrange(count):
+        start = time.time()
+        login('bench%d' % (i % USERS), u'password')
+        latencies.append(time.time() - start)
+    latencies.sort()
+    print '%-7s %4.1f queries/login  p50 %6.2f ms  p99 %6.2f ms' % (
+        name, len(statements) / float(count),
+        latencies[len(latencies) / 2] * 1e3,
+        latencies[int(len(latencies) * 0.99)] * 1e3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-url', default='sqlite://')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--rtt-ms', type=float, default=0)
+    args = parser.parse_args()
+    statements = setup(args.db_url, args.rtt_ms)
+    before = login_before('bench5', u'password')
+    after = login_after('bench5', u'password')
+    # roles granted at the same time are in any order
+    assert sorted(before.pop('role')) == sorted(after.pop('role'))
+    assert before == after
+    bench('before', login_before, args.count, statements)
+    bench('after', login_after, args.count, statements)
+
+
+if __name__ == '__main__':
+    main()
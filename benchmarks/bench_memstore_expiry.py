@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''cost of one expire tick of MemStore timing wheels vs scanning all keys,
+keys expire evenly over TTL seconds
+
+usage: PYTHONPATH=. python benchmarks/bench_memstore_expiry.py [KEYS] [TTL]
+'''
+
+import sys
+import time
+from commutils.cache.memstore import MemStore
+
+
+def main():
+    key_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    ttl = int(sys.argv[2]) if len(sys.argv) > 2 else 3600
+    store = MemStore()
+    store.stop()
+    now = time.time()
+    for i in xrange(key_count):
+        store.set('token%d' % i, 'x', 1 + i * ttl // key_count)
+    print '%d keys, ttl up to %ds' % (len(store), ttl)
+
+    ticks = 10
+    start = time.time()
+    removed = sum(store.expire(now + tick + 1) for tick in range(1, ticks + 1))
+    wheel = (time.time() - start) / ticks
+    print 'timing wheel  %8.2f ms/tick  (%d keys removed)' % (wheel * 1e3,
+                                                             removed)
+
+    start = time.time()
+    for tick in range(1, ticks + 1):
+        for stripe in store._stripes:
+            [k for k, item in stripe.data.iteritems()
+             if item[2] and item[2] <= now + tick + 1]
+    scan = (time.time() - start) / ticks
+    print 'full scan     %8.2f ms/tick' % (scan * 1e3)
+
+
+if __name__ == '__main__':
+    main()
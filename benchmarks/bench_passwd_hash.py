@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''login burst of bcrypt validations in request threads vs in hash pool,
+and latency of cheap requests (dict lookups) served at the same time
+
+usage: PYTHONPATH=. python benchmarks/bench_passwd_hash.py [THREADS] [PROCESSES]
+'''
+
+import sys
+import threading
+import time
+from commutils.utils import secure
+from commutils.utils.hashpool import PasswdHashPool
+
+
+def cheap_request(cache):
+    start = time.time()
+    for i in xrange(1000):
+        cache.get(i % 100)
+    return time.time() - start
+
+
+def run(name, pool, threads, hashed):
+    logins = []
+    stop = threading.Event()
+
+    def login():
+        while not stop.is_set():
+            pool.run(secure.validate_hashed_password, u'password', hashed)
+            logins.append(1)
+
+    workers = [threading.Thread(target=login) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    cache = dict((i, {'id': i}) for i in range(100))
+    latencies = []
+    end = time.time() + 5
+    while time.time() < end:
+        latencies.append(cheap_request(cache))
+        time.sleep(0.001)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    latencies.sort()
+    print '%-8s %6.1f logins/s  cheap request p50 %6.2f ms  p99 %6.2f ms' % (
+        name, len(logins) / 5.0, latencies[len(latencies) / 2] * 1e3,
+        latencies[int(len(latencies) * 0.99)] * 1e3)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    hashed = secure.gen_hashed_password(u'password')
+    run('inline', PasswdHashPool(0, threads, 10), threads, hashed)
+    pool = PasswdHashPool(processes, threads, 10)
+    run('pool', pool, threads, hashed)
+    pool.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''token check against a running memcache, get then set (one pooled call
+each) vs get and touch sent together in one pipeline
+
+usage: PYTHONPATH=. python benchmarks/bench_pipeline.py [HOST:PORT] [COUNT]
+'''
+
+import sys
+import time
+from commutils.cache.mcmodel import McModel
+from commutils.cache.constants import USER_TOKEN_KEY_PREFIX_MEMCACHE
+
+
+def bench(name, count, func):
+    start = time.time()
+    for i in xrange(count):
+        func(i)
+    elapsed = time.time() - start
+    print '%-16s %8.1f us/check' % (name, elapsed * 1e6 / count)
+
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else '127.0.0.1:11211'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    model = McModel([url])
+    prefix = USER_TOKEN_KEY_PREFIX_MEMCACHE
+    token_info = {'id': 1, 'username': 'bench', 'type': 'normal',
+                  'role': 'normal'}
+    model.set_multi(prefix, dict(('bench%d' % i, token_info)
+                                 for i in range(100)))
+
+    def get_set(i):
+        info = model.get(prefix, 'bench%d' % (i % 100))
+        model.set(prefix, 'bench%d' % (i % 100), info)
+
+    def pipelined(i):
+        model.pipeline().get(prefix, 'bench%d' % (i % 100))\
+            .touch(prefix, 'bench%d' % (i % 100)).execute()
+
+    bench('get + set', count, get_set)
+    bench('get | touch', count, pipelined)
+
+
+if __name__ == '__main__':
+    main()
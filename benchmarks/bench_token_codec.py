@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''encode/decode time and stored bytes of uuid token info, pickle as used
+by python-memcached (protocol 0 by default) vs TokenCodec
+
+usage: PYTHONPATH=. python benchmarks/bench_token_codec.py [COUNT]
+'''
+
+import sys
+import timeit
+import cPickle
+from commutils.cache.codec import TokenCodec
+
+TOKEN_INFO = {
+    "id": 10086,
+    "username": u"frank.han",
+    "type": "p2p",
+    "role": [u"supervisor", u"auditor"],
+    "email": u"frank@esse.io",
+    "description": u"operator of p2p platform",
+    "renewed_at": 1476000000,
+    "created_at": 1476000000,
+}
+
+
+def bench(name, count, encode, decode):
+    data = encode(TOKEN_INFO)
+    assert decode(data)['username'] == TOKEN_INFO['username']
+    enc = timeit.timeit(lambda: encode(TOKEN_INFO), number=count)
+    dec = timeit.timeit(lambda: decode(data), number=count)
+    print '%-16s %6d bytes %8.2f us encode %8.2f us decode' % (
+        name, len(data), enc * 1e6 / count, dec * 1e6 / count)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    codec = TokenCodec()
+    bench('pickle proto 0', count,
+          lambda v: cPickle.dumps(v, 0), cPickle.loads)
+    bench('pickle proto 2', count,
+          lambda v: cPickle.dumps(v, 2), cPickle.loads)
+    bench('TokenCodec', count, codec.encode, codec.decode)
+
+
+if __name__ == '__main__':
+    main()
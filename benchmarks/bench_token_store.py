@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''token create/check/revoke throughput of token store backends, check
+gets the token and resets its expire time in one round trip
+
+usage: PYTHONPATH=. python benchmarks/bench_token_store.py \\
+           [--count N] [--memcache HOST:PORT] [--redis HOST:PORT]
+'''
+
+import argparse
+import time
+from commutils.utils import uuidutils
+from commutils.cache.constants import USER_TOKEN_KEY_PREFIX_MEMCACHE
+
+TOKEN_INFO = {
+    "id": 10086,
+    "username": u"frank.han",
+    "type": "p2p",
+    "role": [u"supervisor"],
+    "email": u"frank@esse.io",
+    "description": None,
+}
+
+
+def bench(name, model, count):
+    prefix = USER_TOKEN_KEY_PREFIX_MEMCACHE
+    token_ids = [uuidutils.generate_uuid() for _ in xrange(count)]
+    ops = [
+        ('create', lambda t: model.set(prefix, t, TOKEN_INFO)),
+        ('check', lambda t: model.get_touch(prefix, t)),
+        ('revoke', lambda t: model.delete(prefix, t)),
+    ]
+    result = []
+    for op, func in ops:
+        start = time.time()
+        for token_id in token_ids:
+            func(token_id)
+        result.append('%s %8.0f/s' % (op, count / (time.time() - start)))
+    print '%-10s %s' % (name, '  '.join(result))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--memcache', default='127.0.0.1:11211')
+    parser.add_argument('--redis', default='127.0.0.1:6379')
+    args = parser.parse_args()
+
+    from commutils.cache.mcmodel import McModel
+    from commutils.cache.mem_model import MemModel
+    bench('memory', MemModel(), args.count)
+    bench('memcache', McModel([args.memcache]), args.count)
+    try:
+        from commutils.cache.redis_model import RedisModel
+    except ImportError:
+        print 'redis        skipped, redis module is not installed'
+    else:
+        host, port = args.redis.split(':')
+        bench('redis', RedisModel({'host': host, 'port': int(port)}),
+              args.count)
+
+
+if __name__ == '__main__':
+    main()
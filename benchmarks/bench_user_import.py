@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''creating users one user_create at a time vs bulk user_import, which
+hashes passwords of a batch across hash pool and inserts them with one
+statement. --rtt-ms adds network round trip time to each statement.
+tables are created in the database, use a scratch one
+
+usage: DJANGO_SETTINGS_MODULE=authhub.settings PYTHONPATH=. \\
+           python benchmarks/bench_user_import.py [--db-url sqlite://] \\
+           [--count N] [--rounds R] [--processes P] [--rtt-ms MS]
+'''
+
+import argparse
+import time
+from oslo_db.sqlalchemy import session as db_session
+from sqlalchemy import event
+from authhub.db import api as db_api
+from authhub.db import model_base
+from authhub.resources.user import user_create
+from authhub.resources.user_import import user_import
+from commutils.utils import hashpool
+from commutils.utils import jsonutils
+
+
+def setup(db_url, rtt_ms):
+    '''
+        @return: list of executed statements, one item per statement
+    '''
+    db_api._ENGINE_FACADE = db_session.EngineFacade(db_url)
+    engine = db_api.get_engine()
+    model_base.BASE.metadata.create_all(engine)
+    statements = []
+
+    def before_execute(conn, cursor, statement, params, context, many):
+        if statement != 'SELECT 1':
+            statements.append(1)
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000.0)
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    return statements
+
+
+def users(prefix, count):
+    return [{'username': '%s%06d' % (prefix, i), 'password': u'password',
+             'type': 'p2p', 'email': '%s%d@esse.io' % (prefix, i)}
+            for i in xrange(count)]
+
+
+def bench(name, func, count, statements):
+    del statements[:]
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print '%-8s %8.1f users/s  %6.2f statements/user' % (
+        name, count / elapsed, len(statements) / float(count))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-url', default='sqlite://')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=6)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--rtt-ms', type=float, default=0)
+    args = parser.parse_args()
+    statements = setup(args.db_url, args.rtt_ms)
+    hashpool._bcrypt_rounds = args.rounds
+    hashpool._passwd_hash_pool = hashpool.PasswdHashPool(
+        args.processes, args.processes * 4, 60)
+
+    def create_one_by_one():
+        for user_info in users('one', args.count):
+            user_create(user_info)
+
+    def create_bulk():
+        lines = [jsonutils.dumps(u) for u in users('bulk', args.count)]
+        for result in user_import(iter(lines)):
+            assert 'error' not in result, result
+
+    bench('create', create_one_by_one, args.count, statements)
+    bench('import', create_bulk, args.count, statements)
+    hashpool._passwd_hash_pool.stop()
+
+
+if __name__ == '__main__':
+    main()
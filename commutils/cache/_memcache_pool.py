@@ -28,9 +28,34 @@ class _MemcacheClient(memcache.Client):
     __new__ = object.__new__
     __setattr__ = object.__setattr__
 
+    # consistent hash ring set by pool, None means modulo hashing
+    hash_ring = None
+
     def __del__(self):
         pass
 
+    def _get_server(self, key):
+        if self.hash_ring is None:
+            return memcache.Client._get_server(self, key)
+
+        # (N, key) addresses the Nth distinct node of key on the ring, which
+        # is used to store replicas, it is skipped if that node is dead
+        if isinstance(key, tuple):
+            replica, key = key
+            for i, index in enumerate(self.hash_ring.iter_nodes(key)):
+                if i == replica:
+                    server = self.servers[index]
+                    return (server, key) if server.connect() else (None, None)
+            return None, None
+
+        # plain key goes to the first live node clockwise, so reads fall back
+        # to a replica when primary node is marked dead
+        for index in self.hash_ring.iter_nodes(key):
+            server = self.servers[index]
+            if server.connect():
+                return server, key
+        return None, None
+
 
 _PoolItem = collections.namedtuple('_PoolItem', ['ttl', 'connection'])
 
@@ -157,19 +182,22 @@ class ConnectionPool(queue.Queue):
 
 
 class MemcacheClientPool(ConnectionPool):
-    def __init__(self, urls, arguments, **kwargs):
+    def __init__(self, urls, arguments, hash_ring=None, **kwargs):
         # super() cannot be used here because Queue in stdlib is an
         # old-style class
         ConnectionPool.__init__(self, **kwargs)
         self.urls = urls
         self._arguments = arguments
+        self.hash_ring = hash_ring
         # NOTE(morganfainberg): The host objects expect an int for the
         # deaduntil value. Initialize this at 0 for each host with 0 indicating
         # the host is not dead.
         self._hosts_deaduntil = [0] * len(urls)
 
     def _create_connection(self):
-        return _MemcacheClient(self.urls, **self._arguments)
+        conn = _MemcacheClient(self.urls, **self._arguments)
+        conn.hash_ring = self.hash_ring
+        return conn
 
     def _destroy_connection(self, conn):
         conn.disconnect_all()
@@ -0,0 +1,285 @@
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+from commutils.cache.constants import MEMCACHE_KEY_TIMEOUT
+from commutils.cache.codec import CodecError
+from commutils.log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class ModelPipeline():
+    '''
+        pipeline of prefixed keys, commands are sent in one round trip when
+        execute is called
+    '''
+
+    def __init__(self, model):
+        self.model = model
+        self.pipe = model.mc.pipeline()
+        # prefix of each queued get whose result needs decoding
+        self._get_prefixes = []
+
+    def get(self, prefix, key):
+        self.pipe.get(self.model._full_key_name(prefix, key))
+        self._get_prefixes.append(prefix)
+        return self
+
+    def set(self, prefix, key, value, timeout=None):
+        timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+        self.pipe.set(self.model._full_key_name(prefix, key),
+                      self.model._encode(prefix, value), timeout,
+                      replicated=self.model._replicated(prefix))
+        self._get_prefixes.append(None)
+        return self
+
+    def touch(self, prefix, key, timeout=None):
+        timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+        self.pipe.touch(self.model._full_key_name(prefix, key), timeout,
+                        replicated=self.model._replicated(prefix))
+        self._get_prefixes.append(None)
+        return self
+
+    def delete(self, prefix, key):
+        self.pipe.delete(self.model._full_key_name(prefix, key),
+                         replicated=self.model._replicated(prefix))
+        self._get_prefixes.append(None)
+        return self
+
+    def execute(self):
+        '''
+            @return: list of command results in the order they are queued
+        '''
+        prefixes, self._get_prefixes = self._get_prefixes, []
+        return [self.model._decode(prefix, ret) if prefix else ret
+                for prefix, ret in zip(prefixes, self.pipe.execute())]
+
+
+class CacheModel(object):
+    '''
+        base of cache models which store values for keys with prefix, key
+        timeout is taken from MEMCACHE_KEY_TIMEOUT when not given. subclass
+        sets self.mc to a client whose pipeline() supports get/set/touch/
+        delete and implements set/add/incr/get/set_multi/get_multi/append/
+        cas_update/touch/delete/delete_multi
+    '''
+
+    def __init__(self):
+        self.mc = None
+        # {prefix: ValueCodec}, values of other prefixes are serialized by
+        # cache client
+        self.codecs = {}
+
+    def _full_key_name(self, prefix, key):
+        '''
+            each key has a prefix and key name, prefix will be used to get
+            expire time from MEMCACHE_KEY_TIMEOUT
+        '''
+        return '%s.%s' % (prefix, key)
+
+    def _key_timeout(self, prefix, timeout=None):
+        '''
+            @return: timeout if given, else timeout of prefix, None if prefix
+                     has no timeout
+        '''
+        if not timeout and not MEMCACHE_KEY_TIMEOUT.get(prefix):
+            LOG.error('failed to get timeout value for prefix: %s' % prefix)
+            return None
+        return timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+
+    def _replicated(self, prefix):
+        '''
+            whether keys of prefix are stored on every replica node
+        '''
+        return False
+
+    def register_codec(self, prefix, codec):
+        '''
+            encode values of prefix with codec before they are stored
+        '''
+        self.codecs[prefix] = codec
+
+    def _encode(self, prefix, value):
+        '''
+            encode value with codec of prefix, value is stored as it is if
+            prefix has no codec or codec does not support it
+        '''
+        codec = self.codecs.get(prefix)
+        if codec is None:
+            return value
+        try:
+            return codec.encode(value)
+        except CodecError, e:
+            LOG.warning('store <%s> value without codec: %s' % (prefix, e))
+            return value
+
+    def _decode(self, prefix, value):
+        '''
+            decode value with codec of prefix, values not stored by codec,
+            like pickled values stored before codec is registered, are
+            returned as they are
+            @return: None if value is corrupted
+        '''
+        codec = self.codecs.get(prefix)
+        if codec is None or not isinstance(value, str):
+            return value
+        try:
+            return codec.decode(value)
+        except CodecError, e:
+            LOG.error('failed to decode <%s> value: %s' % (prefix, e))
+            return None
+
+    def _decode_multi(self, prefix, values):
+        '''
+            decode values of get_multi, corrupted values are dropped
+        '''
+        if values is None or prefix not in self.codecs:
+            return values
+        values = dict((k, self._decode(prefix, v)) for k, v in values.items())
+        return dict((k, v) for k, v in values.items() if v is not None)
+
+    def pipeline(self):
+        '''
+            @return: ModelPipeline to send several commands in one round trip
+        '''
+        return ModelPipeline(self)
+
+    def get_touch(self, prefix, key, timeout=None):
+        '''
+            get key value and reset its expire time in one round trip
+            @return: (value, touched), value is None if key does not exist
+        '''
+        return tuple(self.pipeline().get(prefix, key)
+                     .touch(prefix, key, timeout).execute())
+
+
+class KeyValueModel(CacheModel):
+    '''
+        cache model over a key value client, whose methods take full key
+        name and expire time in seconds, like RedisClient and MemStore
+    '''
+
+    def set(self, prefix, key, value, timeout=None):
+        '''
+            set key value
+        '''
+        timeout = self._key_timeout(prefix, timeout)
+        if timeout is None:
+            return False
+        return self.mc.set(self._full_key_name(prefix, key),
+                           self._encode(prefix, value), timeout)
+
+    def add(self, prefix, key, value, timeout=None):
+        '''
+            set key value only if key does not exist
+        '''
+        timeout = self._key_timeout(prefix, timeout)
+        if timeout is None:
+            return False
+        return self.mc.add(self._full_key_name(prefix, key),
+                           self._encode(prefix, value), timeout)
+
+    def touch(self, prefix, key, timeout=None):
+        '''
+            reset expire time of key without rewriting its value
+        '''
+        timeout = self._key_timeout(prefix, timeout)
+        if timeout is None:
+            return False
+        return self.mc.touch(self._full_key_name(prefix, key), timeout)
+
+    def incr(self, prefix, key, delta=1, timeout=None):
+        '''
+            increase counter by delta, counter is created with value delta
+            if it does not exist, timeout only applies when it is created
+            @return: new value, None if failed
+        '''
+        timeout = self._key_timeout(prefix, timeout)
+        if timeout is None:
+            return None
+        return self.mc.incr(self._full_key_name(prefix, key), delta, timeout)
+
+    def get(self, prefix, key):
+        '''
+            get key value
+        '''
+        return self._decode(prefix,
+                            self.mc.get(self._full_key_name(prefix, key)))
+
+    def get_touch(self, prefix, key, timeout=None):
+        '''
+            get key value and reset its expire time with one client call,
+            which is a server side script for redis
+            @return: (value, touched), value is None if key does not exist
+        '''
+        timeout = self._key_timeout(prefix, timeout)
+        if timeout is None:
+            return None, False
+        value = self.mc.get_touch(self._full_key_name(prefix, key), timeout)
+        return self._decode(prefix, value), value is not None
+
+    def set_multi(self, prefix, mapping, timeout=None):
+        '''
+            set multiple key values with same prefix in one round trip
+            @return: True if all keys are stored
+        '''
+        timeout = self._key_timeout(prefix, timeout)
+        if timeout is None:
+            return False
+        return self.mc.set_multi(
+            dict((self._full_key_name(prefix, k), self._encode(prefix, v))
+                 for k, v in mapping.items()), timeout)
+
+    def get_multi(self, prefix, keys):
+        '''
+            get values of multiple keys with same prefix in one round trip
+            @return: dict of {key: value} for keys found, None if failed
+        '''
+        full_keys = dict((self._full_key_name(prefix, k), k) for k in keys)
+        values = self.mc.get_multi(full_keys.keys())
+        if values is None:
+            return None
+        return self._decode_multi(prefix, dict(
+            (full_keys[k], v) for k, v in values.items()))
+
+    def append(self, prefix, key, value, timeout=None):
+        '''
+            append string value to key, key is created with value if it
+            does not exist, timeout only applies when key is created
+        '''
+        timeout = self._key_timeout(prefix, timeout)
+        if timeout is None:
+            return False
+        return self.mc.append(self._full_key_name(prefix, key), value,
+                              timeout)
+
+    def cas_update(self, prefix, key, update_func, timeout=None):
+        '''
+            update key value atomically, update_func is called with current
+            value (None if key does not exist) and returns new value
+            @return: new value, None if failed
+        '''
+        timeout = self._key_timeout(prefix, timeout)
+        if timeout is None:
+            return None
+        return self.mc.cas_update(self._full_key_name(prefix, key),
+                                  update_func, timeout)
+
+    def delete(self, prefix, key):
+        '''
+            delete key from store
+        '''
+        return self.mc.delete(self._full_key_name(prefix, key))
+
+    def delete_multi(self, prefix, keys):
+        '''
+            delete multiple keys with same prefix from store
+        '''
+        return self.mc.delete_multi([self._full_key_name(prefix, k)
+                                     for k in keys])
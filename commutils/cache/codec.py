@@ -0,0 +1,194 @@
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+import codecs
+import struct
+
+
+class CodecError(ValueError):
+    '''
+        value can not be encoded or decoded by codec
+    '''
+    pass
+
+
+class ValueCodec(object):
+    '''
+        codec of values stored in memcache, McModel encodes values of
+        registered prefixes before they are stored and decodes them after
+        they are read, values in other formats are returned unchanged
+    '''
+
+    def encode(self, value):
+        '''
+            @return: encoded str
+            @raise CodecError: if value can not be encoded
+        '''
+        raise NotImplementedError
+
+    def decode(self, data):
+        '''
+            @return: decoded value
+            @raise CodecError: if data is corrupted
+        '''
+        raise NotImplementedError
+
+
+# every encoded token starts with magic and codec version
+_TOKEN_MAGIC = 0xa7
+_TOKEN_VERSION = 1
+
+# strings of user type and role names stored as one byte, index is the id.
+# a table must never change once released, add a new version instead
+_TOKEN_INTERNED = {
+    1: ('supervisor', 'p2p', 'bank'),
+}
+_INLINE_STR = 0xff
+
+# header: magic, version, optional field bitmap, user id
+_HEADER = struct.Struct('!BBBq')
+_TIMESTAMP = struct.Struct('!I')
+_STR_LEN = struct.Struct('!H')
+_pack_str_len = _STR_LEN.pack
+_unpack_str_len = _STR_LEN.unpack_from
+_utf8_encode = codecs.utf_8_encode
+_utf8_decode = codecs.utf_8_decode
+
+# optional fields in bitmap order
+_OPTIONAL_STR_FIELDS = ('email', 'description')
+_OPTIONAL_TIME_FIELDS = ('created_at', 'renewed_at')
+_REQUIRED_FIELDS = ('id', 'username', 'type', 'role')
+_TOKEN_FIELDS = set(_REQUIRED_FIELDS + _OPTIONAL_STR_FIELDS +
+                    _OPTIONAL_TIME_FIELDS)
+
+
+class TokenCodec(ValueCodec):
+    '''
+        compact binary format of uuid token info:
+
+            header    magic(1) version(1) bitmap(1) id(8)
+            username  len(2) utf8
+            type      interned id(1) or 0xff len(2) utf8
+            role      count(1) then interned id(1) or 0xff len(2) utf8 each
+            email, description, created_at, renewed_at when set in bitmap
+
+        email and description are None when omitted, strings are decoded
+        as unicode. decoding only unpacks structs, so corrupted data can not
+        execute code like pickle does.
+    '''
+
+    def __init__(self, version=_TOKEN_VERSION):
+        self.version = version
+        self._intern_ids = dict((s, i) for i, s in
+                                enumerate(_TOKEN_INTERNED[version]))
+
+    def _encode_str(self, value, out):
+        if isinstance(value, unicode):
+            value = _utf8_encode(value)[0]
+        elif not isinstance(value, str):
+            raise CodecError('%r is not a string' % (value, ))
+        if len(value) > 0xffff:
+            raise CodecError('string is too long')
+        out.append(_pack_str_len(len(value)))
+        out.append(value)
+
+    def _encode_interned(self, value, out):
+        intern_id = self._intern_ids.get(value)
+        if intern_id is not None:
+            out.append(chr(intern_id))
+        else:
+            out.append(chr(_INLINE_STR))
+            self._encode_str(value, out)
+
+    def encode(self, value):
+        if not isinstance(value, dict) or \
+                not _TOKEN_FIELDS.issuperset(value):
+            raise CodecError('unsupported token info %r' % (value, ))
+        encode_str = self._encode_str
+        encode_interned = self._encode_interned
+        try:
+            bitmap = 0
+            body = []
+            encode_str(value['username'], body)
+            encode_interned(value['type'], body)
+            roles = value['role']
+            if len(roles) > 0xff:
+                raise CodecError('too many roles')
+            body.append(chr(len(roles)))
+            for role in roles:
+                encode_interned(role, body)
+            bit = 1
+            for field in _OPTIONAL_STR_FIELDS:
+                field_value = value.get(field)
+                if field_value is not None:
+                    bitmap |= bit
+                    encode_str(field_value, body)
+                bit <<= 1
+            for field in _OPTIONAL_TIME_FIELDS:
+                field_value = value.get(field)
+                if field_value is not None:
+                    bitmap |= bit
+                    body.append(_TIMESTAMP.pack(field_value))
+                bit <<= 1
+            header = _HEADER.pack(_TOKEN_MAGIC, self.version, bitmap,
+                                  value['id'])
+        except (KeyError, TypeError, struct.error), e:
+            raise CodecError('failed to encode token info: %s' % e)
+        return header + ''.join(body)
+
+    def _decode_str(self, data, offset):
+        length, = _unpack_str_len(data, offset)
+        offset += 2
+        end = offset + length
+        if end > len(data):
+            raise CodecError('string exceeds data length')
+        return _utf8_decode(data[offset:end], 'strict', True)[0], end
+
+    def _decode_interned(self, data, offset, interned):
+        intern_id = ord(data[offset])
+        if intern_id == _INLINE_STR:
+            return self._decode_str(data, offset + 1)
+        if intern_id >= len(interned):
+            raise CodecError('unknown interned id %d' % intern_id)
+        return interned[intern_id], offset + 1
+
+    def decode(self, data):
+        decode_str = self._decode_str
+        decode_interned = self._decode_interned
+        try:
+            magic, version, bitmap, user_id = _HEADER.unpack_from(data)
+            if magic != _TOKEN_MAGIC or version not in _TOKEN_INTERNED:
+                raise CodecError('unknown token format %x/%d'
+                                 % (magic, version))
+            interned = _TOKEN_INTERNED[version]
+            username, offset = decode_str(data, _HEADER.size)
+            user_type, offset = decode_interned(data, offset, interned)
+            count = ord(data[offset])
+            offset += 1
+            roles = []
+            for _ in xrange(count):
+                role, offset = decode_interned(data, offset, interned)
+                roles.append(role)
+            value = {'id': user_id, 'username': username, 'type': user_type,
+                     'role': roles, 'email': None, 'description': None}
+            bit = 1
+            for field in _OPTIONAL_STR_FIELDS:
+                if bitmap & bit:
+                    value[field], offset = decode_str(data, offset)
+                bit <<= 1
+            for field in _OPTIONAL_TIME_FIELDS:
+                if bitmap & bit:
+                    value[field], = _TIMESTAMP.unpack_from(data, offset)
+                    offset += 4
+                bit <<= 1
+        except (struct.error, IndexError, UnicodeDecodeError), e:
+            raise CodecError('failed to decode token info: %s' % e)
+        if offset != len(data):
+            raise CodecError('unexpected trailing data')
+        return value
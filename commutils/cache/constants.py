@@ -13,7 +13,24 @@ PROJECT_PREFIX = 'AuthHub'
 
 
 USER_TOKEN_KEY_PREFIX_MEMCACHE = ('%s.UserTokenKey' % PROJECT_PREFIX)
+# revoked signed tokens, all entries are kept in one key
+REVOKED_TOKEN_SET_PREFIX_MEMCACHE = ('%s.RevokedTokenSet' % PROJECT_PREFIX)
+# tokens created for each user, used to list and revoke them
+USER_TOKEN_INDEX_PREFIX_MEMCACHE = ('%s.UserTokenIndex' % PROJECT_PREFIX)
+# failed logins of each username and source ip, and their lockouts
+LOGIN_FAILURE_PREFIX_MEMCACHE = ('%s.LoginFailure' % PROJECT_PREFIX)
+LOGIN_LOCKOUT_PREFIX_MEMCACHE = ('%s.LoginLockout' % PROJECT_PREFIX)
 
 MEMCACHE_KEY_TIMEOUT = {
     USER_TOKEN_KEY_PREFIX_MEMCACHE: 10800,  # 3 hours
+    REVOKED_TOKEN_SET_PREFIX_MEMCACHE: 10800,  # 3 hours
+    USER_TOKEN_INDEX_PREFIX_MEMCACHE: 2592000,  # 30 days, max of memcache
+    LOGIN_FAILURE_PREFIX_MEMCACHE: 3600,  # 1 hour
+    LOGIN_LOCKOUT_PREFIX_MEMCACHE: 3600,  # 1 hour
 }
+
+# keys of these prefixes are stored on every replica node when memcache is
+# configured with consistent hashing and replicas
+MEMCACHE_REPLICATED_PREFIXES = (
+    USER_TOKEN_KEY_PREFIX_MEMCACHE,
+)
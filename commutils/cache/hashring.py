@@ -0,0 +1,66 @@
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+import bisect
+import hashlib
+import struct
+
+
+class HashRing():
+    '''
+        ketama style consistent hash ring, each node is placed on the ring at
+        points_per_node points computed from md5 of its name, so adding or
+        removing one node only moves the keys owned by that node
+    '''
+
+    def __init__(self, nodes, points_per_node=160):
+        '''
+            @param nodes: node names, like memcache server urls, the position
+                          of a node in this list is returned as node index
+        '''
+        ring = []
+        for index, node in enumerate(nodes):
+            for i in range(points_per_node / 4):
+                digest = hashlib.md5('%s-%s' % (node, i)).digest()
+                # every md5 digest gives 4 points
+                for point in struct.unpack('<4I', digest):
+                    ring.append((point, index))
+        ring.sort()
+        self._points = [point for point, _ in ring]
+        self._indexes = [index for _, index in ring]
+        self.node_count = len(nodes)
+
+    def _hash(self, key):
+        return struct.unpack('<I', hashlib.md5(key).digest()[:4])[0]
+
+    def iter_nodes(self, key):
+        '''
+            iterate index of distinct nodes clockwise from position of key,
+            the first one is the primary node of key and the following ones
+            are used for replicas or failover
+        '''
+        if not self._points:
+            return
+        pos = bisect.bisect(self._points, self._hash(key))
+        seen = set()
+        for i in xrange(len(self._points)):
+            index = self._indexes[(pos + i) % len(self._points)]
+            if index not in seen:
+                seen.add(index)
+                yield index
+                if len(seen) == self.node_count:
+                    return
+
+    def get_node(self, key):
+        '''
+            @return: index of primary node of key, None if ring is empty
+        '''
+        for index in self.iter_nodes(key):
+            return index
+        return None
@@ -0,0 +1,82 @@
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+import collections
+import threading
+import time
+from commutils.utils import metrics
+from commutils.log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class LocalCache():
+    '''
+        bounded in process cache, entries expire ttl seconds after they are
+        set and least recently used entries are evicted when cache is full.
+        hit/miss/expired/eviction are counted in metrics with name prefix
+    '''
+
+    def __init__(self, name, maxsize=10000, ttl=2):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+            @return: None if key does not exist or has expired
+        '''
+        now = time.time()
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is not None and item[0] > now:
+                # re-insert to mark it as most recently used
+                self._data[key] = item
+        if item is None:
+            metrics.incr('%s.miss' % self.name)
+            return None
+        if item[0] <= now:
+            metrics.incr('%s.expired' % self.name)
+            metrics.incr('%s.miss' % self.name)
+            return None
+        metrics.incr('%s.hit' % self.name)
+        return item[1]
+
+    def set(self, key, value):
+        '''
+            set key value, evict least recently used keys if cache is full
+        '''
+        evicted = 0
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.time() + self.ttl, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics.incr('%s.eviction' % self.name, evicted)
+
+    def delete(self, key):
+        '''
+            delete key from cache
+        '''
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        '''
+            delete all keys from cache
+        '''
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
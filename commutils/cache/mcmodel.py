@@ -7,14 +7,16 @@
 #
 #
 
-from commutils.cache.constants import MEMCACHE_KEY_TIMEOUT
+from commutils.cache.constants import MEMCACHE_KEY_TIMEOUT,\
+    MEMCACHE_REPLICATED_PREFIXES
 from commutils.cache import memclient
+from commutils.cache.basemodel import CacheModel
 from commutils.log import log as logging
 
 LOG = logging.getLogger(__name__)
 
 
-class McModel():
+class McModel(CacheModel):
     '''
         this mc model is used to set value for key with prefix in memcache
     '''
@@ -23,14 +25,11 @@ class McModel():
         '''
             initialize mcmodel with memclient
         '''
+        CacheModel.__init__(self)
         self.mc = memclient.MemcacheClient(url, argument)
 
-    def _full_key_name(self, prefix, key):
-        '''
-            each key has a prefix and key name, prefix will be used to get
-            expire time from MEMCACHE_KEY_TIMEOUT
-        '''
-        return '%s.%s' % (prefix, key)
+    def _replicated(self, prefix):
+        return prefix in MEMCACHE_REPLICATED_PREFIXES
 
     def set(self, prefix, key, value, timeout=None):
         '''
@@ -40,16 +39,122 @@ class McModel():
             LOG.error('failed to get timeout value for prefix: %s' % prefix)
             return False
         timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
-        return self.mc.set(self._full_key_name(prefix, key), value, timeout)
+        return self.mc.set(self._full_key_name(prefix, key),
+                           self._encode(prefix, value), timeout,
+                           replicated=self._replicated(prefix))
+
+    def add(self, prefix, key, value, timeout=None):
+        '''
+            set key value only if key does not exist
+        '''
+        if not timeout and not MEMCACHE_KEY_TIMEOUT.get(prefix):
+            LOG.error('failed to get timeout value for prefix: %s' % prefix)
+            return False
+        timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+        return self.mc.add(self._full_key_name(prefix, key),
+                           self._encode(prefix, value), timeout)
+
+    def touch(self, prefix, key, timeout=None):
+        '''
+            reset expire time of key without rewriting its value
+        '''
+        if not timeout and not MEMCACHE_KEY_TIMEOUT.get(prefix):
+            LOG.error('failed to get timeout value for prefix: %s' % prefix)
+            return False
+        timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+        return self.mc.touch(self._full_key_name(prefix, key), timeout,
+                             replicated=self._replicated(prefix))
+
+    def incr(self, prefix, key, delta=1, timeout=None):
+        '''
+            increase counter by delta, counter is created with value delta
+            if it does not exist, timeout only applies when it is created
+            @return: new value, None if failed
+        '''
+        if not timeout and not MEMCACHE_KEY_TIMEOUT.get(prefix):
+            LOG.error('failed to get timeout value for prefix: %s' % prefix)
+            return None
+        timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+        full_key = self._full_key_name(prefix, key)
+        ret = self.mc.incr(full_key, delta)
+        if ret is not None:
+            return ret
+        if self.mc.add(full_key, delta, timeout):
+            return delta
+        # counter is added by another process meanwhile
+        return self.mc.incr(full_key, delta)
 
     def get(self, prefix, key):
         '''
             get key value
         '''
-        return self.mc.get(self._full_key_name(prefix, key))
+        return self._decode(prefix,
+                            self.mc.get(self._full_key_name(prefix, key)))
+
+    def set_multi(self, prefix, mapping, timeout=None):
+        '''
+            set multiple key values with same prefix in one call
+            @return: True if all keys are stored
+        '''
+        if not timeout and not MEMCACHE_KEY_TIMEOUT.get(prefix):
+            LOG.error('failed to get timeout value for prefix: %s' % prefix)
+            return False
+        timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+        mapping = dict((k, self._encode(prefix, v))
+                       for k, v in mapping.items())
+        return self.mc.set_multi(mapping, timeout,
+                                 key_prefix=self._full_key_name(prefix, ''),
+                                 replicated=self._replicated(prefix))
+
+    def get_multi(self, prefix, keys):
+        '''
+            get values of multiple keys with same prefix in one call
+            @return: dict of {key: value} for keys found, None if failed
+        '''
+        return self._decode_multi(prefix, self.mc.get_multi(
+            keys, key_prefix=self._full_key_name(prefix, '')))
+
+    def append(self, prefix, key, value, timeout=None):
+        '''
+            append string value to key, key is created with value if it
+            does not exist, timeout only applies when key is created
+            @return: False if failed, like value becomes too large
+        '''
+        full_key = self._full_key_name(prefix, key)
+        if self.mc.append(full_key, value):
+            return True
+        if not timeout and not MEMCACHE_KEY_TIMEOUT.get(prefix):
+            LOG.error('failed to get timeout value for prefix: %s' % prefix)
+            return False
+        timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+        # key may be created by others between append and add
+        return (self.mc.add(full_key, value, timeout) or
+                self.mc.append(full_key, value))
+
+    def cas_update(self, prefix, key, update_func, timeout=None):
+        '''
+            update key value atomically, update_func is called with current
+            value (None if key does not exist) and returns new value
+            @return: new value, None if failed
+        '''
+        if not timeout and not MEMCACHE_KEY_TIMEOUT.get(prefix):
+            LOG.error('failed to get timeout value for prefix: %s' % prefix)
+            return None
+        timeout = timeout if timeout else MEMCACHE_KEY_TIMEOUT.get(prefix)
+        return self.mc.cas_update(self._full_key_name(prefix, key),
+                                  update_func, timeout)
 
     def delete(self, prefix, key):
         '''
             delete key from memcache
         '''
-        return self.mc.delete(self._full_key_name(prefix, key))
+        return self.mc.delete(self._full_key_name(prefix, key),
+                              replicated=self._replicated(prefix))
+
+    def delete_multi(self, prefix, keys):
+        '''
+            delete multiple keys with same prefix from memcache
+        '''
+        return self.mc.delete_multi(keys,
+                                    key_prefix=self._full_key_name(prefix, ''),
+                                    replicated=self._replicated(prefix))
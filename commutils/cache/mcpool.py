@@ -1,6 +1,7 @@
 import functools
 from commutils.log import log as logging
 from commutils.cache import _memcache_pool
+from commutils.cache import hashring
 
 LOG = logging.getLogger(__name__)
 
@@ -20,13 +21,20 @@ class ClientProxy(object):
 
 class PooledMemcachedBackend():
     def __init__(self, url, arguments={}):
+        # ketama: consistent hashing, default: modulo hashing of memcache lib
+        self.hash_ring = None
+        if arguments.get('hash') == 'ketama':
+            self.hash_ring = hashring.HashRing(url)
         self.client_pool = _memcache_pool.MemcacheClientPool(
             url,
             # arguments for memcache.Client
             arguments={
                 'dead_retry': arguments.get('dead_retry', 5 * 60),
                 'socket_timeout': arguments.get('socket_timeout', 3),
+                # needed by gets/cas
+                'cache_cas': True,
             },
+            hash_ring=self.hash_ring,
             # arguments for memcache pool
             maxsize=arguments.get('pool_maxsize', 10),
             unused_timeout=arguments.get('pool_unused_timeout', 60),
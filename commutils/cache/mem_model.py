@@ -0,0 +1,25 @@
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+from commutils.cache import memstore
+from commutils.cache.basemodel import KeyValueModel
+
+
+class MemModel(KeyValueModel):
+    '''
+        in process model for single node deployments and load tests, same
+        interface as McModel, tokens are lost when process exits and are
+        not shared between processes
+    '''
+    def __init__(self, conf={}):
+        '''
+            @param conf: stripes, tick and slots of MemStore
+        '''
+        KeyValueModel.__init__(self)
+        self.mc = memstore.MemStore(**conf)
@@ -1,4 +1,5 @@
 from commutils.cache import mcpool
+from commutils.cache.pipeline import Pipeline
 from commutils.log import log as logging
 
 LOG = logging.getLogger(__name__)
@@ -11,11 +12,34 @@ class MemcacheClient():
 
     def __init__(self, url, argument={}):
         self.mcpool = mcpool.PooledMemcachedBackend(url, argument)
+        # replicas can only be placed on distinct nodes of hash ring
+        self.replicas = 1
+        if self.mcpool.hash_ring is not None:
+            self.replicas = min(argument.get('replicas', 1), len(url))
 
-    def set(self, key, val, time=60, min_compress_len=0):
+    def _replica_keys(self, key):
         '''
+            key of every replica in (N, key) format understood by the pool
+            client, which means Nth distinct node of key on hash ring
+        '''
+        return [(i, str(key)) for i in range(self.replicas)]
+
+    def pipeline(self):
+        '''
+            @return: Pipeline which sends queued commands in one write per
+                     server with one pooled connection
+        '''
+        return Pipeline(self.mcpool.client_pool, self.replicas)
+
+    def set(self, key, val, time=60, min_compress_len=0, replicated=False):
+        '''
+            @param replicated: store the key on every replica node
             @return: True if set success
         '''
+        if replicated and self.replicas > 1:
+            return self.set_multi({key: val}, time,
+                                  min_compress_len=min_compress_len,
+                                  replicated=True)
         try:
             ret = self.mcpool.client.set(str(key), val, time, min_compress_len)
             if ret == 0:
@@ -27,17 +51,23 @@ class MemcacheClient():
             return False
         return True
 
-    def set_multi(self, mapping, time=60, key_prefix='', min_compress_len=0):
+    def set_multi(self, mapping, time=60, key_prefix='', min_compress_len=0,
+                  replicated=False):
         '''
+            @param replicated: store every key on every replica node
             @return: True if all mapping are stored to memcached
                      False if not all mapping are stored successfully
         '''
-        mapping_keys = set(mapping.keys())
+        if replicated and self.replicas > 1:
+            mapping = dict((rkey, v) for k, v in mapping.items()
+                           for rkey in self._replica_keys(k))
+        else:
+            mapping = dict((str(k), v) for k, v in mapping.items())
         try:
-            ret = self.mcpool.clientpool.client.set_multi(mapping_keys,
-                                                          time,
-                                                          key_prefix,
-                                                          min_compress_len)
+            ret = self.mcpool.client.set_multi(mapping,
+                                               time,
+                                               key_prefix,
+                                               min_compress_len)
             if len(ret) != 0:
                 LOG.error('Failed to set_multi for <%s>' % mapping)
                 return False
@@ -65,9 +95,10 @@ class MemcacheClient():
             @return: None if failed
         '''
         try:
-            ret = self.mcpool.client.get_multi(keys, key_prefix)
+            ret = self.mcpool.client.get_multi([str(k) for k in keys],
+                                               key_prefix)
         except Exception, e:
-            LOG.error("" % e)
+            LOG.error("memclient failed to get_multi: %s" % e)
             return None
         return ret
 
@@ -83,7 +114,11 @@ class MemcacheClient():
         '''
         try:
             ret = self.mcpool.client.incr(str(key), delta)
-            if ret is None or ret == 0:
+            if ret is None:
+                # key does not exist, callers usually add it then
+                LOG.debug("memcache client incr [%s] missed" % (key))
+                return None
+            if ret == 0:
                 LOG.error("memcache client incr [%s] failed" % (key))
                 return None
         except Exception, e:
@@ -131,13 +166,92 @@ class MemcacheClient():
             return False
         return True
 
-    def delete(self, key, time=0):
+    def append(self, key, val, time=0, min_compress_len=0):
+        ''' append val to the end of existing value of key
+            @param key: key must be str type.
+            @return: True on success and False if key does not
+                     exist or value becomes too large.
+        '''
+        try:
+            ret = self.mcpool.client.append(str(key), val, time,
+                                            min_compress_len)
+            if not ret:
+                LOG.debug("memcache client append [%s] failed" % (key))
+                return False
+        except Exception, e:
+            LOG.error("memcache client append failed: %s" % e)
+            return False
+        return True
+
+    def cas_update(self, key, update_func, time=60, retry=5):
+        ''' update value of key atomically with gets and cas
+            @param update_func: called with current value of key (None if
+                                key does not exist), returns new value
+            @param retry: times to retry when key is changed by others
+            @return: new value on success, None if failed
+        '''
+        key = str(key)
+        try:
+            with self.mcpool.client_pool.acquire() as client:
+                try:
+                    for _ in range(retry):
+                        val = client.gets(key)
+                        new_val = update_func(val)
+                        if val is None:
+                            ret = client.add(key, new_val, time)
+                        else:
+                            ret = client.cas(key, new_val, time)
+                        if ret:
+                            return new_val
+                finally:
+                    client.reset_cas()
+        except Exception, e:
+            LOG.error("memcache client cas_update failed: %s" % e)
+            return None
+        LOG.error("memcache client cas_update [%s] failed after %s retries"
+                  % (key, retry))
+        return None
+
+    def touch(self, key, time=60, replicated=False):
+        ''' update expire time of key without sending its value
+            @param replicated: touch the key on every replica node
+            @return: True on success and False if key does not exist.
+        '''
+        ret = self.pipeline().touch(key, time, replicated).execute()
+        if not ret[0]:
+            LOG.debug("memcache client touch [%s] failed" % (key))
+            return False
+        return True
+
+    def delete_multi(self, keys, time=0, key_prefix='', replicated=False):
+        ''' delete multiple keys in one call
+            @param replicated: delete every key from every replica node
+            @return: True if all keys are deleted, False if failed.
+        '''
+        if replicated and self.replicas > 1:
+            keys = [rkey for k in keys for rkey in self._replica_keys(k)]
+        else:
+            keys = [str(k) for k in keys]
+        try:
+            ret = self.mcpool.client.delete_multi(keys, time, key_prefix)
+            if not ret:
+                LOG.error("memcache client delete_multi failed")
+                return False
+        except Exception, e:
+            LOG.error("memcache client delete_multi failed: %s" % e)
+            return False
+        return True
+
+    def delete(self, key, time=0, replicated=False):
         ''' delete a key
             @param key: key must be str type.
             @param time: number of seconds any subsequent set / update commands
                          should fail. Defaults to None for no delay.
+            @param replicated: delete the key from every replica node
             @return: True on success and False on failed.
         '''
+        if replicated and self.replicas > 1:
+            return self.delete_multi([key], time, replicated=True)
         try:
             ret = self.mcpool.client.delete(str(key), time)
             if ret == 0:
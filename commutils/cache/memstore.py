@@ -0,0 +1,332 @@
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+import atexit
+import cPickle
+import itertools
+import threading
+import time
+from commutils.log import log as logging
+from commutils.utils import metrics
+
+LOG = logging.getLogger(__name__)
+
+
+class TimingWheel(object):
+    '''
+        hashed timing wheel, key expiring at t is put in slot
+        int(t / tick) % slots. each tick only visits the slot of that tick,
+        so expiring keys costs O(1) per key instead of scanning all keys.
+        a key is rescheduled instead of removed when its expire time
+        changes, stale entries are dropped when their slot is visited.
+    '''
+
+    def __init__(self, tick=1, slots=3600, now=None):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        # last tick that has been processed
+        self.current = int((now or time.time()) / tick) - 1
+
+    def schedule(self, key, expire_at):
+        slot = int(expire_at / self.tick) % len(self.slots)
+        self.slots[slot][key] = expire_at
+
+    def advance(self, now):
+        '''
+            visit slots of ticks passed since last advance
+            @return: list of keys whose scheduled expire time <= now
+        '''
+        # only ticks that have fully passed, so every key in their slots
+        # is due unless it is scheduled for a later round
+        target = int(now / self.tick) - 1
+        # every slot is visited at most once when advancing a full round
+        start = max(self.current + 1, target - len(self.slots) + 1)
+        self.current = target
+        expired = []
+        for tick in xrange(start, target + 1):
+            slot = self.slots[tick % len(self.slots)]
+            due = [key for key, expire_at in slot.iteritems()
+                   if expire_at <= now]
+            for key in due:
+                del slot[key]
+            expired.extend(due)
+        return expired
+
+
+class _Stripe(object):
+    '''
+        part of store keys guarded by one lock
+    '''
+
+    def __init__(self, tick, slots):
+        self.lock = threading.Lock()
+        # {key: (data, raw, expire_at, version)}, raw data is str stored as
+        # it is, others are pickled. expire_at 0 means never expire.
+        # version changes on every write, cas_update compares it
+        self.data = {}
+        self.versions = itertools.count(1)
+        self.wheel = TimingWheel(tick, slots)
+
+
+def _dumps(value):
+    # values are copied like they are over network, callers may change
+    # objects they get without affecting stored ones
+    if isinstance(value, str):
+        return value
+    return cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+
+
+def _loads(data, raw):
+    return data if raw else cPickle.loads(data)
+
+
+class MemPipeline(object):
+    '''
+        pipeline interface of MemStore, commands are run when execute is
+        called, results are in the same format as memcache Pipeline
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self._cmds = []
+
+    def __len__(self):
+        return len(self._cmds)
+
+    def get(self, key):
+        self._cmds.append((self.store.get, (key, )))
+        return self
+
+    def set(self, key, val, time=60, replicated=False):
+        self._cmds.append((self.store.set, (key, val, time)))
+        return self
+
+    def delete(self, key, replicated=False):
+        self._cmds.append((self.store.delete, (key, )))
+        return self
+
+    def touch(self, key, time=60, replicated=False):
+        self._cmds.append((self.store.touch, (key, time)))
+        return self
+
+    def execute(self):
+        cmds, self._cmds = self._cmds, []
+        return [func(*args) for func, args in cmds]
+
+
+class MemStore(object):
+    '''
+        in process key value store with the same interface as RedisClient,
+        for single node deployments and load tests. keys are spread over
+        lock striped dicts, expired keys are removed by a timing wheel of
+        each stripe that is advanced every tick by a daemon thread.
+    '''
+
+    def __init__(self, stripes=64, tick=1, slots=3600):
+        '''
+            @param stripes: number of locks, rounded up to power of 2
+            @param tick: seconds between expire runs
+            @param slots: slots of timing wheel
+        '''
+        count = 1
+        while count < stripes:
+            count <<= 1
+        self._mask = count - 1
+        self._stripes = [_Stripe(tick, slots) for _ in range(count)]
+        self.tick = tick
+        self._stopped = threading.Event()
+        self._expirer = threading.Thread(target=self._expire_loop,
+                                         name='memstore-expirer')
+        self._expirer.setDaemon(True)
+        self._expirer.start()
+        atexit.register(self.stop)
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) & self._mask]
+
+    def _expire_loop(self):
+        while not self._stopped.wait(self.tick):
+            try:
+                self.expire()
+            except Exception, e:
+                LOG.error("memstore failed to expire keys: %s" % e)
+
+    def expire(self, now=None):
+        '''
+            remove keys expired before now, called every tick
+            @return: number of keys removed
+        '''
+        now = now or time.time()
+        removed = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                for key in stripe.wheel.advance(now):
+                    item = stripe.data.get(key)
+                    # key is deleted or renewed since it was scheduled
+                    if item is None or not item[2] or item[2] > now:
+                        continue
+                    del stripe.data[key]
+                    removed += 1
+        if removed:
+            metrics.incr('memstore.expired', removed)
+        return removed
+
+    def stop(self):
+        '''stop expire thread
+        '''
+        self._stopped.set()
+        if self._expirer.is_alive():
+            self._expirer.join(self.tick)
+
+    def __len__(self):
+        return sum(len(stripe.data) for stripe in self._stripes)
+
+    def _put(self, stripe, key, value, ep_time):
+        self._put_raw(stripe, key, _dumps(value), isinstance(value, str),
+                      ep_time)
+
+    def _put_raw(self, stripe, key, data, raw, ep_time):
+        expire_at = time.time() + int(ep_time) if ep_time else 0
+        self._store(stripe, key, data, raw, expire_at)
+        if expire_at:
+            stripe.wheel.schedule(key, expire_at)
+
+    def _store(self, stripe, key, data, raw, expire_at):
+        stripe.data[key] = (data, raw, expire_at, next(stripe.versions))
+
+    def _alive(self, stripe, key):
+        '''
+            @return: (data, raw, expire_at, version) of key if not expired
+                     else None
+        '''
+        item = stripe.data.get(key)
+        if item is not None and item[2] and item[2] <= time.time():
+            del stripe.data[key]
+            return None
+        return item
+
+    def pipeline(self):
+        return MemPipeline(self)
+
+    def set(self, key, value, ep_time=0):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            self._put(stripe, key, value, ep_time)
+        return True
+
+    def add(self, key, value, ep_time=0):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            if self._alive(stripe, key) is not None:
+                return False
+            self._put(stripe, key, value, ep_time)
+        return True
+
+    def incr(self, key, delta=1, ep_time=0):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = self._alive(stripe, key)
+            if item is None:
+                self._put(stripe, key, delta, ep_time)
+                return delta
+            value = _loads(item[0], item[1])
+            if not isinstance(value, (int, long)):
+                LOG.error("memstore incr non integer key [%s]" % key)
+                return None
+            value += delta
+            self._store(stripe, key, _dumps(value), False, item[2])
+        return value
+
+    def get(self, key):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = self._alive(stripe, key)
+        return _loads(item[0], item[1]) if item is not None else None
+
+    def touch(self, key, ep_time):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = self._alive(stripe, key)
+            if item is None:
+                return False
+            self._put_raw(stripe, key, item[0], item[1], ep_time)
+        return True
+
+    def get_touch(self, key, ep_time):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = self._alive(stripe, key)
+            if item is None:
+                return None
+            self._put_raw(stripe, key, item[0], item[1], ep_time)
+        return _loads(item[0], item[1])
+
+    def set_multi(self, mapping, ep_time=0):
+        for key, value in mapping.items():
+            self.set(key, value, ep_time)
+        return True
+
+    def get_multi(self, keys):
+        ret = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                ret[key] = value
+        return ret
+
+    def append(self, key, value, ep_time=0):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = self._alive(stripe, key)
+            if item is None:
+                self._put(stripe, key, value, ep_time)
+            elif not item[1]:
+                LOG.error("memstore append to non string key [%s]" % key)
+                return False
+            else:
+                self._store(stripe, key, item[0] + value, True, item[2])
+        return True
+
+    def cas_update(self, key, update_func, ep_time=0, retry=5):
+        '''
+            like memcache gets and cas, update_func is called without stripe
+            lock held, so it may use the store, and new value is stored only
+            if key is not written since it was read
+            @param retry: times to retry when key is changed by others
+            @return: new value on success, None if failed
+        '''
+        stripe = self._stripe(key)
+        try:
+            for _ in xrange(retry):
+                with stripe.lock:
+                    item = self._alive(stripe, key)
+                new_val = update_func(_loads(item[0], item[1])
+                                      if item else None)
+                with stripe.lock:
+                    current = self._alive(stripe, key)
+                    if (current and current[3]) == (item and item[3]):
+                        self._put(stripe, key, new_val, ep_time)
+                        return new_val
+        except Exception, e:
+            LOG.error("memstore cas_update failed: %s" % e)
+            return None
+        LOG.error("memstore cas_update [%s] failed after %s retries"
+                  % (key, retry))
+        return None
+
+    def delete(self, key):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            stripe.data.pop(key, None)
+        return True
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.delete(key)
+        return True
@@ -0,0 +1,177 @@
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+import socket
+import memcache
+from commutils.log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# reply of each command when it succeeds
+_SUCCESS_REPLY = {
+    'set': 'STORED',
+    'delete': 'DELETED',
+    'touch': 'TOUCHED',
+}
+
+
+class Pipeline(object):
+    '''
+        queue get/set/delete/touch commands and send them with one write per
+        memcache server on one pooled connection, then read all replies.
+
+        usage:
+            pipe = mc.pipeline()
+            pipe.get(key)
+            pipe.touch(key, 3600)
+            value, touched = pipe.execute()
+    '''
+
+    def __init__(self, client_pool, replicas=1):
+        '''
+            @param client_pool: MemcacheClientPool connection is acquired from
+            @param replicas: node count of replicated keys on hash ring
+        '''
+        self.client_pool = client_pool
+        self.replicas = replicas
+        self._commands = []
+
+    def __len__(self):
+        return len(self._commands)
+
+    def _queue(self, cmd, key, args, replicated):
+        if replicated and self.replicas > 1:
+            keys = [(i, str(key)) for i in range(self.replicas)]
+        else:
+            keys = [str(key)]
+        self._commands.append((cmd, keys, args))
+        return self
+
+    def get(self, key):
+        '''
+            queue get, result is value or None if key does not exist
+        '''
+        return self._queue('get', key, (), False)
+
+    def set(self, key, val, time=60, min_compress_len=0, replicated=False):
+        '''
+            queue set, result is True if stored
+            @param replicated: store the key on every replica node
+        '''
+        return self._queue('set', key, (val, time, min_compress_len),
+                           replicated)
+
+    def delete(self, key, replicated=False):
+        '''
+            queue delete, result is True if key is deleted
+        '''
+        return self._queue('delete', key, (), replicated)
+
+    def touch(self, key, time=60, replicated=False):
+        '''
+            queue touch which updates expire time of key without sending its
+            value, result is True if key exists
+        '''
+        return self._queue('touch', key, (time,), replicated)
+
+    def execute(self):
+        '''
+            send all queued commands and clear the queue
+            @return: list of command results in queue order, a command fails
+                     (None for get, False for others) if its server is dead
+        '''
+        commands, self._commands = self._commands, []
+        if not commands:
+            return []
+        replies = [[] for _ in commands]
+        try:
+            with self.client_pool.acquire() as client:
+                self._execute(client, commands, replies)
+        except Exception, e:
+            LOG.error("memcache pipeline failed with error: %s" % e)
+        return [self._result(cmd, reply)
+                for (cmd, _, _), reply in zip(commands, replies)]
+
+    def _result(self, cmd, reply):
+        if cmd == 'get':
+            # first live replica that returns the key wins
+            for value in reply:
+                if value is not None:
+                    return value
+            return None
+        # write succeeds if any live replica accepts it
+        return any(reply)
+
+    def _encode(self, client, cmd, key, args):
+        if cmd == 'get':
+            return 'get %s\r\n' % key
+        if cmd == 'delete':
+            return 'delete %s\r\n' % key
+        if cmd == 'touch':
+            return 'touch %s %d\r\n' % (key, args[0])
+        val, time, min_compress_len = args
+        store_info = client._val_to_store_info(val, min_compress_len)
+        if not store_info:
+            return None
+        return 'set %s %d %d %d\r\n%s\r\n' % (key, store_info[0], time,
+                                              store_info[1], store_info[2])
+
+    def _execute(self, client, commands, replies):
+        # {server: [(command index, cmd)]} in the order they are sent
+        server_cmds = {}
+        server_bufs = {}
+        for index, (cmd, keys, args) in enumerate(commands):
+            for key in keys:
+                server, skey = client._get_server(key)
+                if server is None:
+                    continue
+                try:
+                    client.check_key(skey)
+                except memcache.Client.MemcachedKeyError, e:
+                    LOG.error("memcache pipeline skip <%s>: %s" % (skey, e))
+                    continue
+                line = self._encode(client, cmd, skey, args)
+                if line is None:
+                    continue
+                server_cmds.setdefault(server, []).append((index, cmd))
+                server_bufs.setdefault(server, []).append(line)
+
+        # send out all commands on each server before reading anything
+        for server in server_bufs.keys():
+            try:
+                server.send_cmds(''.join(server_bufs[server]))
+            except socket.error, msg:
+                if isinstance(msg, tuple):
+                    msg = msg[1]
+                server.mark_dead(msg)
+                del server_cmds[server]
+
+        for server, cmds in server_cmds.iteritems():
+            try:
+                for index, cmd in cmds:
+                    replies[index].append(self._read_reply(client, server,
+                                                           cmd))
+            except (memcache._Error, memcache._ConnectionDeadError,
+                    socket.error), msg:
+                if isinstance(msg, tuple):
+                    msg = msg[1]
+                server.mark_dead(msg)
+
+    def _read_reply(self, client, server, cmd):
+        line = server.readline(raise_exception=True)
+        if cmd != 'get':
+            return line == _SUCCESS_REPLY[cmd]
+        if line == 'END':
+            return None
+        rkey, flags, rlen = client._expectvalue(server, line)
+        if rkey is None:
+            raise memcache._Error("unexpected get reply '%s'" % line)
+        value = client._recv_value(server, flags, rlen)
+        server.expect('END', raise_exception=True)
+        return value
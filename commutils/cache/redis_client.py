@@ -1,12 +1,136 @@
+import cPickle
 import redis
+from commutils.log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# values are stored with a leading flag like memcache flags, integers are
+# stored as decimal so INCRBY works on them
+_FLAG_STR = '\x00'
+_FLAG_PICKLE = '\x01'
+
+# return value of key and reset its ttl in one round trip
+_GET_TOUCH_SCRIPT = '''
+local value = redis.call('GET', KEYS[1])
+if value then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return value
+'''
+
+# append to existing value, or create key with ttl when it does not exist
+_APPEND_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('APPEND', KEYS[1], ARGV[1])
+else
+    redis.call('SET', KEYS[1], ARGV[2] .. ARGV[1], 'EX', ARGV[3])
+end
+return 1
+'''
+
+# increase counter, and set its ttl when it is created by this increase
+_INCR_SCRIPT = '''
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value == tonumber(ARGV[1]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return value
+'''
+
+
+def _dumps(value):
+    if isinstance(value, str):
+        return _FLAG_STR + value
+    if isinstance(value, (int, long)) and not isinstance(value, bool):
+        return str(value)
+    return _FLAG_PICKLE + cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+
+
+def _loads(data):
+    if data is None:
+        return None
+    if data[:1] == _FLAG_STR:
+        return data[1:]
+    if data[:1] == _FLAG_PICKLE:
+        return cPickle.loads(data[1:])
+    return int(data)
+
+
+class RedisPipeline(object):
+    '''
+        queue get/set/delete/touch commands and send them in one round trip,
+        results are in the same format as memcache Pipeline
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self._cmds = []
+
+    def __len__(self):
+        return len(self._cmds)
+
+    def get(self, key):
+        self._cmds.append(('get', (str(key), )))
+        return self
+
+    def set(self, key, val, time=60, replicated=False):
+        '''
+            @param replicated: ignored, redis keys are not replicated by client
+        '''
+        self._cmds.append(('set', (str(key), _dumps(val), time)))
+        return self
+
+    def delete(self, key, replicated=False):
+        self._cmds.append(('delete', (str(key), )))
+        return self
+
+    def touch(self, key, time=60, replicated=False):
+        self._cmds.append(('expire', (str(key), time)))
+        return self
+
+    def execute(self):
+        '''
+            @return: list of command results in queue order, None for get and
+                     False for others if redis fails
+        '''
+        cmds, self._cmds = self._cmds, []
+        if not cmds:
+            return []
+        try:
+            pipe = self.client.redis.pipeline(transaction=False)
+            for cmd, args in cmds:
+                if cmd == 'set':
+                    pipe.set(args[0], args[1], ex=args[2] or None)
+                else:
+                    getattr(pipe, cmd)(*args)
+            replies = pipe.execute()
+        except redis.RedisError, e:
+            LOG.error("redis pipeline failed with error: %s" % e)
+            return [None if cmd == 'get' else False for cmd, _ in cmds]
+        return [_loads(ret) if cmd == 'get' else bool(ret)
+                for (cmd, _), ret in zip(cmds, replies)]
 
 
 class RedisClient():
-    def __init__(self, host='127.0.0.1', port='6379'):
+    def __init__(self, host='127.0.0.1', port='6379', db=0, password=None,
+                 max_connections=50, socket_timeout=3):
         '''
             set connection pool for this client
         '''
-        self.conntion_pool = redis.ConnectionPool(host=host, port=port, db=0)
+        self.conntion_pool = redis.ConnectionPool(
+            host=host, port=port, db=db, password=password,
+            max_connections=max_connections, socket_timeout=socket_timeout)
+        self.redis = redis.StrictRedis(connection_pool=self.conntion_pool)
+        self._get_touch = self.redis.register_script(_GET_TOUCH_SCRIPT)
+        self._append = self.redis.register_script(_APPEND_SCRIPT)
+        self._incr = self.redis.register_script(_INCR_SCRIPT)
+
+    def pipeline(self):
+        '''
+            @return: RedisPipeline which sends queued commands in one round
+                     trip with one pooled connection
+        '''
+        return RedisPipeline(self)
 
     def set(self, key, value, ep_time=0):
         '''
@@ -15,21 +139,40 @@ class RedisClient():
             @param value: value for the key
             @param ep_time: expire_time(secs) for the key,
                             0 if the key does not expire
-            @return: True if the key exists, False if not
+            @return: True if the key is set, False if not
         '''
+        try:
+            self.redis.set(key, _dumps(value), ex=int(ep_time) or None)
+        except redis.RedisError, e:
+            LOG.error('redis client set failed with error %s' % e)
+            return False
+        return True
 
+    def add(self, key, value, ep_time=0):
+        '''
+            set key/value only if key does not exist
+            @return: True if the key is set, False if not
+        '''
         try:
-            redis_cli = redis.Redis(connection_pool=self.conntion_pool)
-            if ep_time == 0:
-                redis_cli.set(key, value)
-            else:
-                redis_cli.set(key, value, ep_time)
-        except Exception as e:
-            # log exception here
-            print e
+            return bool(self.redis.set(key, _dumps(value),
+                                       ex=int(ep_time) or None, nx=True))
+        except redis.RedisError, e:
+            LOG.error('redis client add failed with error %s' % e)
             return False
 
-        return True
+    def incr(self, key, delta=1, ep_time=0):
+        '''
+            increase counter by delta, counter is created with value delta
+            and expire time ep_time if it does not exist
+            @return: new value, None if failed
+        '''
+        try:
+            if not ep_time:
+                return self.redis.incrby(key, delta)
+            return self._incr(keys=[key], args=[delta, int(ep_time)])
+        except redis.RedisError, e:
+            LOG.error('redis client incr failed with error %s' % e)
+            return None
 
     def get(self, key):
         '''
@@ -37,32 +180,125 @@ class RedisClient():
             @param key: key to get value
             @return: the value of the key, None if key does not exist
         '''
+        try:
+            return _loads(self.redis.get(key))
+        except redis.RedisError, e:
+            LOG.error('redis client get failed with error %s' % e)
+            return None
+
+    def get_touch(self, key, ep_time):
+        '''
+            get value of key and reset its expire time with a server side
+            script in one round trip
+            @return: the value of the key, None if key does not exist
+        '''
+        try:
+            return _loads(self._get_touch(keys=[key], args=[int(ep_time)]))
+        except redis.RedisError, e:
+            LOG.error('redis client get_touch failed with error %s' % e)
+            return None
+
+    def touch(self, key, ep_time):
+        '''
+            @return: True if expire time of key is reset, False if key does
+                     not exist
+        '''
+        try:
+            return bool(self.redis.expire(key, int(ep_time)))
+        except redis.RedisError, e:
+            LOG.error('redis client touch failed with error %s' % e)
+            return False
+
+    def set_multi(self, mapping, ep_time=0):
+        '''
+            @return: True if all mapping are stored
+        '''
+        pipe = self.pipeline()
+        for key, value in mapping.items():
+            pipe.set(key, value, ep_time)
+        return all(pipe.execute())
 
-        ret = None
-        redis_cli = redis.Redis(connection_pool=self.conntion_pool)
+    def get_multi(self, keys):
+        '''
+            @return: dict of {key: value} for keys found, None if failed
+        '''
+        keys = list(keys)
+        if not keys:
+            return {}
         try:
-            ret = redis_cli.get(key)
-        except Exception as e:
-            print e
-            # log exception here
+            values = self.redis.mget(keys)
+        except redis.RedisError, e:
+            LOG.error('redis client get_multi failed with error %s' % e)
             return None
+        return dict((k, _loads(v)) for k, v in zip(keys, values)
+                    if v is not None)
+
+    def append(self, key, value, ep_time=0):
+        '''
+            append string value to key, key is created with ep_time if it
+            does not exist
+            @return: True if success
+        '''
+        try:
+            self._append(keys=[key], args=[value, _FLAG_STR, int(ep_time)])
+        except redis.RedisError, e:
+            LOG.error('redis client append failed with error %s' % e)
+            return False
+        return True
 
-        return ret
+    def cas_update(self, key, update_func, ep_time=0, retry=5):
+        ''' update value of key atomically with WATCH/MULTI
+            @param update_func: called with current value of key (None if
+                                key does not exist), returns new value
+            @return: new value on success, None if failed
+        '''
+        try:
+            with self.redis.pipeline() as pipe:
+                for _ in range(retry):
+                    try:
+                        pipe.watch(key)
+                        new_val = update_func(_loads(pipe.get(key)))
+                        pipe.multi()
+                        pipe.set(key, _dumps(new_val),
+                                 ex=int(ep_time) or None)
+                        pipe.execute()
+                        return new_val
+                    except redis.WatchError:
+                        continue
+        except redis.RedisError, e:
+            LOG.error('redis client cas_update failed with error %s' % e)
+            return None
+        LOG.error('redis client cas_update [%s] failed after %s retries'
+                  % (key, retry))
+        return None
 
     def delete(self, key):
         '''
             @param key: key to delete
             @return: True if key is deleted, False if not
         '''
-        redis_cli = redis.Redis(connection_pool=self.conntion_pool)
         try:
-            redis_cli.delete(key)
-        except Exception as e:
-            print e
+            self.redis.delete(key)
+        except redis.RedisError, e:
+            LOG.error('redis client delete failed with error %s' % e)
             return False
 
         return True
 
+    def delete_multi(self, keys):
+        '''
+            @return: True if keys are deleted, False if not
+        '''
+        keys = list(keys)
+        if not keys:
+            return True
+        try:
+            self.redis.delete(*keys)
+        except redis.RedisError, e:
+            LOG.error('redis client delete_multi failed with error %s' % e)
+            return False
+        return True
+
 if __name__ == '__main__':
     '''
         test for redis module
@@ -7,30 +7,18 @@
 #
 #
 
-from commutils.redis import redis_client
+from commutils.cache import redis_client
+from commutils.cache.basemodel import KeyValueModel
 
 
-class RedisModel():
+class RedisModel(KeyValueModel):
     '''
-        Redis model for application
+        Redis model for application, same interface as McModel
     '''
-    def __init__(self, redis_client):
+    def __init__(self, conf={}):
         '''
-            @param redis_client: The redis client class used
-                                 for communication with redis
+            @param conf: host, port, db, password, max_connections and
+                         socket_timeout of redis connection pool
         '''
-        self.redis_client = redis_client.RedisClient()
-
-    def set(self, key_prefix, key, value, expire_time):
-        '''
-            generate the key with key_prefix+key, and set value for it
-        '''
-        redis_key = key_prefix + '.' + key
-        return self.redis_client.set(redis_key, value, expire_time)
-
-    def get(self, key_prefix, key):
-        '''
-            get the value for key key_prefix + key
-        '''
-        redis_key = key_prefix + '.' + key
-        return self.redis_client.get(redis_key)
+        KeyValueModel.__init__(self)
+        self.mc = redis_client.RedisClient(**conf)
@@ -9,6 +9,7 @@
 #
 #
 
+import multiprocessing
 import threading
 import os
 import time
@@ -127,8 +128,111 @@ def get_memcahce_conf():
         raise e
 
 
+def get_memcache_options():
+    '''get memcache client options, like hash (ketama for consistent
+    hashing), replicas, socket_timeout, dead_retry and pool settings
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    return gconf.get('memcache_options') or {}
+
+
+def get_redis_conf():
+    '''get redis connection pool configuration
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    rediscfg = gconf.get('redis') or {}
+    passwd = rediscfg.get('passwd')
+    return {
+        'host': rediscfg.get('host', '127.0.0.1'),
+        'port': rediscfg.get('port', 6379),
+        'db': rediscfg.get('db', 0),
+        'password': unobfuscate_str(passwd) if passwd else None,
+        'max_connections': rediscfg.get('max_connections', 50),
+        'socket_timeout': rediscfg.get('socket_timeout', 3),
+    }
+
+
+def get_memstore_conf():
+    '''get in process token store configuration, keys are spread over
+    stripes locks and expired by a timing wheel of slots ticks
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    memcfg = gconf.get('memstore') or {}
+    return {
+        'stripes': memcfg.get('stripes', 64),
+        'tick': memcfg.get('tick', 1),
+        'slots': memcfg.get('slots', 3600),
+    }
+
+
+def get_passwd_hash_conf():
+    '''get password hash pool configuration, bcrypt runs in processes
+    worker processes (0 runs it in request thread), requests beyond
+    max_pending fail immediately. new hashes use cost factor rounds, the
+    bcrypt_rounds command picks it for a hash time on a host
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    hashcfg = gconf.get('passwd_hash') or {}
+    processes = hashcfg.get('processes', multiprocessing.cpu_count())
+    return {
+        'processes': processes,
+        'max_pending': hashcfg.get('max_pending', 4 * max(processes, 1)),
+        'timeout': hashcfg.get('timeout', 10),
+        'rounds': hashcfg.get('rounds'),
+    }
+
+
+def get_login_throttle_conf():
+    '''get configuration of failed login throttling, a username or source
+    ip is locked out after max failures within window seconds, lockout is
+    lockout_base seconds and doubles with each further failure up to
+    lockout_max. source ip is taken from X-Forwarded-For only when peer
+    address is one of trusted_proxies
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    throttlecfg = gconf.get('login_throttle') or {}
+    return {
+        'enabled': throttlecfg.get('enabled', False),
+        'user_max_failures': throttlecfg.get('user_max_failures', 5),
+        'ip_max_failures': throttlecfg.get('ip_max_failures', 50),
+        'window': throttlecfg.get('window', 3600),
+        'lockout_base': throttlecfg.get('lockout_base', 30),
+        'lockout_max': throttlecfg.get('lockout_max', 3600),
+        'trusted_proxies': throttlecfg.get('trusted_proxies') or [],
+    }
+
+
+def get_pagination_conf():
+    '''get page size of list apis, limit of a request defaults to
+    default_limit and is capped at max_limit. streamed lists are read from
+    database and written to response stream_chunk_size rows at a time
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    pagecfg = gconf.get('pagination') or {}
+    return {
+        'default_limit': pagecfg.get('default_limit', 100),
+        'max_limit': pagecfg.get('max_limit', 1000),
+        'stream_chunk_size': pagecfg.get('stream_chunk_size', 1000),
+    }
+
+
+def _pg_replicas(replicas):
+    '''
+        @param replicas: list of 'host' or 'host:port'
+        @return: list of (host, port)
+    '''
+    ret = []
+    for replica in replicas or []:
+        host, _, port = str(replica).partition(':')
+        ret.append((host, int(port) if port else 5432))
+    return ret
+
+
 def get_pg_conf():
-    '''get postgresql configuration
+    '''get postgresql configuration, pool options not configured use
+    defaults of sqlalchemy: pool size 5, overflow 10, pool timeout 30s.
+    replicas are read only copies of the database with the same user and
+    password, list and detail reads are spread over them
     '''
     gconf = get_global_conf_manager().get_conf()
     try:
@@ -139,14 +243,18 @@ def get_pg_conf():
             'db_passwd': unobfuscate_str(pgcfg['passwd']),
             'db_host': pgcfg['host'],
             'db_port': 5432,
-            'db_slave_connection': False,
+            'db_replicas': _pg_replicas(pgcfg.get('replicas')),
             'db_sqlite_fk': False,
             'db_autocommit': True,
             'db_expire_on_commit': False,
             'db_mysql_sql_mode': 'TRADITIONAL',
-            'db_idle_timeout': 3600,
+            'db_idle_timeout': pgcfg.get('idle_timeout', 3600),
+            'db_max_pool_size': pgcfg.get('max_pool_size'),
+            'db_max_overflow': pgcfg.get('max_overflow'),
+            'db_pool_timeout': pgcfg.get('pool_timeout'),
+            'db_max_retries': pgcfg.get('max_retries', 10),
             'db_connection_debug': 0,
-            'db_retry_interval': 20
+            'db_retry_interval': pgcfg.get('retry_interval', 20)
         }
 
     except Exception, e:
@@ -164,3 +272,57 @@ def get_common_conf():
     except Exception, e:
         LOG.error("failed to get common config with error %s" % e)
         raise e
+
+
+def get_token_conf():
+    '''get token configuration, token format is either "uuid" (opaque token
+    stored in memcache) or "signed" (HMAC signed token verified in process)
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    tokencfg = gconf.get('token') or {}
+    secret = tokencfg.get('secret')
+    return {
+        # memcache, redis or memory (in process, single node only), where
+        # uuid tokens and token indexes are stored
+        'store': tokencfg.get('store', 'memcache'),
+        'format': tokencfg.get('format', 'uuid'),
+        'secret': unobfuscate_str(secret) if secret else None,
+        'signed_lifetime': tokencfg.get('signed_lifetime', 10800),
+        'revocation_refresh': tokencfg.get('revocation_refresh', 5),
+        # uuid token is renewed only after this fraction of its timeout
+        'renew_threshold': tokencfg.get('renew_threshold', 0.1),
+        # set: rewrite token with renewed_at, touch: reset expire time in
+        # the same pipelined write as token get on every check
+        'renew_mode': tokencfg.get('renew_mode', 'set'),
+        # pickle: default memcache serialization, binary: TokenCodec
+        'codec': tokencfg.get('codec', 'pickle'),
+        # in process cache of checked uuid tokens, ttl 0 disables it
+        'l1_cache_size': tokencfg.get('l1_cache_size', 10000),
+        'l1_cache_ttl': tokencfg.get('l1_cache_ttl', 2),
+    }
+
+
+def get_user_import_conf():
+    '''get configuration of bulk user import, users are checked, hashed
+    and inserted batch_size rows at a time, an import request of api has
+    at most max_api_rows rows
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    importcfg = gconf.get('user_import') or {}
+    return {
+        'batch_size': importcfg.get('batch_size', 500),
+        'max_api_rows': importcfg.get('max_api_rows', 10000),
+    }
+
+
+def get_last_login_conf():
+    '''get configuration of last login time write-behind queue, pending
+    login times are flushed every flush_interval_ms or when
+    flush_max_entries users are pending
+    '''
+    gconf = get_global_conf_manager().get_conf()
+    logincfg = gconf.get('last_login') or {}
+    return {
+        'flush_interval_ms': logincfg.get('flush_interval_ms', 1000),
+        'flush_max_entries': logincfg.get('flush_max_entries', 500),
+    }
@@ -0,0 +1,73 @@
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+import threading
+import unittest
+from commutils.cache.memstore import MemStore
+
+
+class MemStoreCasUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        # one stripe, so every key shares the lock of the updated key
+        self.store = MemStore(stripes=1)
+
+    def tearDown(self):
+        self.store.stop()
+
+    def _cas_update(self, key, update_func, retry=5):
+        result = {}
+
+        def run():
+            result['value'] = self.store.cas_update(key, update_func,
+                                                    retry=retry)
+
+        thread = threading.Thread(target=run)
+        thread.setDaemon(True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive(), 'cas_update deadlocked')
+        return result['value']
+
+    def test_update_func_uses_same_stripe(self):
+        self.store.set('index', 'token,')
+        self.store.set('token', {'id': 1})
+
+        def clear(index):
+            self.store.delete_multi(index.rstrip(',').split(','))
+            return ''
+
+        self.assertEqual(self._cas_update('index', clear), '')
+        self.assertEqual(self.store.get('index'), '')
+        self.assertIsNone(self.store.get('token'))
+
+    def test_key_changed_during_update_is_retried(self):
+        self.store.set('counter', 1)
+        calls = []
+
+        def update(value):
+            calls.append(value)
+            if len(calls) == 1:
+                self.store.set('counter', 10)
+            return value + 1
+
+        self.assertEqual(self._cas_update('counter', update), 11)
+        self.assertEqual(calls, [1, 10])
+
+    def test_gives_up_after_retry(self):
+        def update(value):
+            self.store.set('key', 'other')
+            return 'mine'
+
+        self.assertIsNone(self._cas_update('key', update, retry=3))
+        self.assertEqual(self.store.get('key'), 'other')
+
+
+if __name__ == '__main__':
+    unittest.main()
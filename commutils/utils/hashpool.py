@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''bcrypt hashing in a bounded process pool, so a burst of logins does
+not pin request threads that also serve cheap token checks
+'''
+
+import atexit
+import collections
+import multiprocessing
+import signal
+import threading
+import time
+from commutils.log import log as logging
+from commutils.utils import metrics
+from commutils.utils import secure
+from commutils.conf.gconf import get_passwd_hash_conf
+from authhub.common.exception import PasswdHashBusy, InternalServerFailure
+
+LOG = logging.getLogger(__name__)
+
+# cost factor limits of bcrypt and its default one
+BCRYPT_MIN_ROUNDS = 4
+BCRYPT_MAX_ROUNDS = 31
+BCRYPT_DEFAULT_ROUNDS = 12
+# cost measured by calibration, slow enough that timer resolution does
+# not matter
+_CALIBRATE_ROUNDS = 8
+
+
+def _hash_time(rounds, repeat):
+    '''best time in ms of hashing a password with cost factor rounds
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        secure.gen_hashed_password('calibrate', rounds)
+        elapsed = (time.time() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def calibrate_rounds(target_ms, repeat=10):
+    '''pick the highest bcrypt cost factor whose hash time on this host
+    does not exceed target_ms. each extra round doubles the work, so the
+    time of one measured cost factor is scaled by powers of 2. it is run
+    by the bcrypt_rounds command on an idle host and its result is
+    configured as rounds, so all processes hash with the same cost factor
+    '''
+    rounds = _CALIBRATE_ROUNDS
+    elapsed = _hash_time(rounds, repeat)
+    while rounds < BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_ms:
+        rounds += 1
+        elapsed *= 2
+    while rounds > BCRYPT_MIN_ROUNDS and elapsed > target_ms:
+        rounds -= 1
+        elapsed /= 2
+    return rounds
+
+
+def _worker_init():
+    # worker is stopped by pool, not by ctrl-c of parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class PasswdHashPool(object):
+    '''
+        run password hash functions in worker processes, at most
+        max_pending calls are running or waiting at the same time
+    '''
+
+    def __init__(self, processes, max_pending, timeout):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        if processes > 0:
+            self._pool = multiprocessing.Pool(processes, _worker_init)
+
+    def idle(self):
+        '''whether less than half of max_pending calls are in progress,
+        background work only runs then so it leaves room for requests
+        '''
+        return self._pending < self.max_pending / 2
+
+    def _acquire(self, background=False):
+        with self._lock:
+            if background and not self.idle():
+                raise PasswdHashBusy()
+            if self._pending >= self.max_pending:
+                metrics.incr('passwd_hash.rejected')
+                LOG.error("password hash queue is full with %s requests"
+                          % self._pending)
+                raise PasswdHashBusy()
+            self._pending += 1
+            metrics.set_gauge('passwd_hash.queue_depth', self._pending)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            metrics.set_gauge('passwd_hash.queue_depth', self._pending)
+
+    def run(self, func, *args):
+        '''
+            run func(*args) in pool and wait for its result
+            @raise PasswdHashBusy: if max_pending calls are in progress
+        '''
+        return self._run(func, args)
+
+    def run_background(self, func, *args):
+        '''
+            run func(*args) in pool like run, for work no request waits for
+            @raise PasswdHashBusy: if pool is not idle
+        '''
+        return self._run(func, args, background=True)
+
+    def _run(self, func, args, background=False):
+        self._acquire(background)
+        start = time.time()
+        try:
+            if self._pool is None:
+                return func(*args)
+            return self._pool.apply_async(func, args).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            LOG.error("password hash did not finish in %ss" % self.timeout)
+            raise InternalServerFailure(reason='password hash timed out')
+        finally:
+            self._release()
+            metrics.observe('passwd_hash.latency_ms',
+                            int((time.time() - start) * 1000))
+
+    def run_many(self, func, args_list):
+        '''
+            run func(*args) for each args in pool, at most one call per
+            worker process is queued at a time, so requests coming meanwhile
+            wait for one call instead of the whole list
+            @return: results in the order of args_list
+            @raise PasswdHashBusy: if max_pending calls are in progress
+        '''
+        self._acquire()
+        try:
+            if self._pool is None:
+                return [func(*args) for args in args_list]
+            results = []
+            queued = collections.deque()
+            for args in args_list:
+                queued.append(self._pool.apply_async(func, args))
+                if len(queued) >= self.processes:
+                    results.append(queued.popleft().get(self.timeout))
+            results.extend(ret.get(self.timeout) for ret in queued)
+            return results
+        except multiprocessing.TimeoutError:
+            LOG.error("password hash did not finish in %ss" % self.timeout)
+            raise InternalServerFailure(reason='password hash timed out')
+        finally:
+            self._release()
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+
+
+_passwd_hash_pool = None
+_passwd_hash_pool_lock = threading.Lock()
+
+
+def get_passwd_hash_pool():
+    '''get the process wide password hash pool, worker processes are
+    forked on first use
+    '''
+    global _passwd_hash_pool
+    if _passwd_hash_pool is None:
+        with _passwd_hash_pool_lock:
+            if _passwd_hash_pool is None:
+                conf = get_passwd_hash_conf()
+                pool = PasswdHashPool(conf['processes'], conf['max_pending'],
+                                      conf['timeout'])
+                atexit.register(pool.stop)
+                _passwd_hash_pool = pool
+    return _passwd_hash_pool
+
+
+_bcrypt_rounds = None
+_bcrypt_rounds_lock = threading.Lock()
+
+
+def get_bcrypt_rounds():
+    '''get bcrypt cost factor of new hashes, it is configured rather than
+    picked by each process, so all processes agree on outdated hashes
+    '''
+    global _bcrypt_rounds
+    if _bcrypt_rounds is None:
+        with _bcrypt_rounds_lock:
+            if _bcrypt_rounds is None:
+                rounds = get_passwd_hash_conf()['rounds'] or \
+                    BCRYPT_DEFAULT_ROUNDS
+                metrics.set_gauge('passwd_hash.rounds', rounds)
+                _bcrypt_rounds = rounds
+    return _bcrypt_rounds
+
+
+def gen_hashed_password(password):
+    '''Hash a password with a randomly-generated salt in hash pool, with
+    the cost factor of this deployment
+    '''
+    return get_passwd_hash_pool().run(secure.gen_hashed_password, password,
+                                      get_bcrypt_rounds())
+
+
+def gen_hashed_passwords(passwords):
+    '''Hash passwords in hash pool, for bulk user creation
+    :returns: list of hashed passwords in the order of passwords
+    '''
+    rounds = get_bcrypt_rounds()
+    return get_passwd_hash_pool().run_many(
+        secure.gen_hashed_password, [(p, rounds) for p in passwords])
+
+
+def rehash_password(password):
+    '''Hash a password again with the cost factor of this deployment, only
+    when hash pool is idle, so rehashes do not fail logins as busy
+    :returns: hashed password, None if hash pool is not idle
+    '''
+    try:
+        return get_passwd_hash_pool().run_background(
+            secure.gen_hashed_password, password, get_bcrypt_rounds())
+    except PasswdHashBusy:
+        return None
+
+
+def validate_hashed_password(password, hashed):
+    '''Check password against hashed one in hash pool
+    :returns: True if passwd match, else False
+    '''
+    return get_passwd_hash_pool().run(secure.validate_hashed_password,
+                                      password, hashed)
+
+
+def hashed_password_outdated(hashed):
+    '''Check whether hashed password has a lower cost factor than new
+    hashes of this deployment, hashes are never rehashed to a lower one
+    :returns: True if it should be rehashed
+    '''
+    rounds = secure.hashed_password_rounds(hashed)
+    return rounds is not None and rounds < get_bcrypt_rounds()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+#
+# Licensed Materials - Property of esse.io
+#
+# (C) Copyright esse.io. 2016 All Rights Reserved
+#
+# Author: Frank Han (frank@esse.io)
+#
+#
+
+'''process local counters used to expose runtime statistics
+'''
+
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+# {name: function returning current value}, called when stats are read
+_gauge_funcs = {}
+
+
+def incr(name, delta=1):
+    '''increase counter name by delta
+    '''
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + delta
+
+
+def set_gauge(name, value):
+    '''set counter name to current value, like queue depth
+    '''
+    with _lock:
+        _counters[name] = value
+
+
+def register_gauge(name, func):
+    '''read gauge name by calling func when stats are read, for values kept
+    by other objects like size of a pool
+    '''
+    with _lock:
+        _gauge_funcs[name] = func
+
+
+def observe(name, value):
+    '''record one sample of name, like latency, as name.count, name.sum
+    and name.max
+    '''
+    with _lock:
+        _counters[name + '.count'] = _counters.get(name + '.count', 0) + 1
+        _counters[name + '.sum'] = _counters.get(name + '.sum', 0) + value
+        _counters[name + '.max'] = max(_counters.get(name + '.max', 0), value)
+
+
+def observe_histogram(name, value, buckets):
+    '''record one sample of name like observe, and count it in cumulative
+    buckets name.le_<bound> for each bound >= value, and name.le_inf
+    :param buckets list: ascending upper bounds of buckets
+    '''
+    with _lock:
+        _counters[name + '.count'] = _counters.get(name + '.count', 0) + 1
+        _counters[name + '.sum'] = _counters.get(name + '.sum', 0) + value
+        _counters[name + '.max'] = max(_counters.get(name + '.max', 0), value)
+        for bound in buckets:
+            key = '%s.le_%s' % (name, bound)
+            _counters[key] = _counters.get(key, 0) + (value <= bound)
+        _counters[name + '.le_inf'] = _counters.get(name + '.le_inf', 0) + 1
+
+
+def get_stats(prefix=None):
+    '''get snapshot of counters
+    :param prefix str: only return counters whose name starts with prefix
+    :return: dict of {name: value}
+    '''
+    with _lock:
+        stats = dict((name, value) for name, value in _counters.items()
+                     if prefix is None or name.startswith(prefix))
+        gauge_funcs = [(name, func) for name, func in _gauge_funcs.items()
+                       if prefix is None or name.startswith(prefix)]
+    for name, func in gauge_funcs:
+        stats[name] = func()
+    return stats
@@ -10,15 +10,30 @@
 #
 
 import base64
+import hashlib
+import hmac
 import bcrypt
 from commutils.log import log as logging
+from commutils.utils import jsonutils
 LOG = logging.getLogger(__name__)
 
 
-def gen_hashed_password(password):
+def gen_hashed_password(password, rounds=None):
     '''Hash a password with a randomly-generated salt
+    :param rounds int: bcrypt cost factor, bcrypt default if None
     '''
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    salt = bcrypt.gensalt(rounds) if rounds else bcrypt.gensalt()
+    return bcrypt.hashpw(password.encode('utf-8'), salt)
+
+
+def hashed_password_rounds(hashed):
+    '''get cost factor of a bcrypt hash in format "$2b$<cost>$<salt+hash>"
+    :returns: cost factor, None if hashed is not a bcrypt hash
+    '''
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
 
 
 def validate_hashed_password(password, hashed):
@@ -33,6 +48,52 @@ def validate_hashed_password(password, hashed):
         return False
 
 
+def _b64url_encode(stream):
+    '''urlsafe base64 encoding without trailing padding
+    '''
+    return base64.urlsafe_b64encode(stream).rstrip('=')
+
+
+def _b64url_decode(stream):
+    '''decode urlsafe base64 string whose padding has been stripped
+    '''
+    stream = str(stream)
+    return base64.urlsafe_b64decode(stream + '=' * (-len(stream) % 4))
+
+
+def _hmac_digest(secret, message):
+    if isinstance(secret, unicode):
+        secret = secret.encode('utf-8')
+    return hmac.new(secret, message, hashlib.sha256).digest()
+
+
+def sign_payload(payload, secret):
+    '''serialize payload into json and sign it with HMAC-SHA256
+    :param payload dict: json serializable claims
+    :param secret str: key used for signing
+    :return: signed string in format "<payload>.<signature>"
+    '''
+    body = _b64url_encode(jsonutils.dumps(payload, separators=(',', ':')))
+    signature = _b64url_encode(_hmac_digest(secret, body))
+    return '%s.%s' % (body, signature)
+
+
+def verify_signed_payload(signed_str, secret):
+    '''check signature of string generated by sign_payload
+    :param signed_str str: signed string in format "<payload>.<signature>"
+    :param secret str: key used for signing
+    :return: payload dict if signature matches, else None
+    '''
+    try:
+        body, signature = str(signed_str).split('.', 1)
+        expected = _hmac_digest(secret, body)
+        if not hmac.compare_digest(expected, _b64url_decode(signature)):
+            return None
+        return jsonutils.loads(_b64url_decode(body))
+    except Exception:
+        return None
+
+
 def obfuscate_str(stream):
     '''obfuscate string with base64 and rot13 encoding
     '''